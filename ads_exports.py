@@ -0,0 +1,430 @@
+"""On-demand, background generation of the Raw Dump downloads"""
+import io
+import logging
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows serialized between progress updates
+EXPORT_CHUNK_ROWS = 100000
+
+
+def _with_virtual_columns(chunk, virtual_columns):
+    """`chunk` with each virtual column (name -> function of the rows) appended at the end"""
+    if not virtual_columns:
+        return chunk
+    return chunk.assign(**{name: build(chunk) for name, build in virtual_columns.items()})
+
+
+def _chunks(frame, chunk_rows, virtual_columns=None):
+    for start in range(0, max(len(frame), 1), chunk_rows):
+        yield start, _with_virtual_columns(frame.iloc[start:start + chunk_rows], virtual_columns)
+
+
+def write_csv(frame, progress=None, chunk_rows=EXPORT_CHUNK_ROWS, compression=None, virtual_columns=None):
+    """
+    CSV bytes of `frame`, serialized in row chunks so `progress(fraction)` can be reported.
+
+    `compression` ("gzip" or "zstd") streams the chunks through that codec.
+    `virtual_columns` (name -> function of a chunk's rows returning text) are
+    computed chunk by chunk and written after the frame's own columns.
+    """
+    sink = pa.BufferOutputStream()
+    stream = pa.CompressedOutputStream(sink, compression) if compression else sink
+    for start, chunk in _chunks(frame, chunk_rows, virtual_columns):
+        stream.write(chunk.to_csv(index=False, header=start == 0).encode("utf-8"))
+        if progress is not None:
+            progress(min(start + chunk_rows, len(frame)) / max(len(frame), 1))
+    if compression:
+        stream.close()
+    return sink.getvalue().to_pybytes()
+
+
+def write_parquet(frame, progress=None, chunk_rows=EXPORT_CHUNK_ROWS, compression="zstd", metadata=None,
+                  virtual_columns=None):
+    """
+    Parquet bytes of `frame`, one row group per chunk so `progress(fraction)` can be reported.
+
+    Categorical columns are written dictionary encoded straight from their
+    codes, and read back as categoricals by pandas. `metadata` (str -> str)
+    is stored in the file's schema metadata; `virtual_columns` are text
+    columns computed chunk by chunk as in write_csv.
+    """
+    # Column types come from the whole frame so a chunk that is all missing in a column still fits
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    for name in virtual_columns or {}:
+        schema = schema.append(pa.field(name, pa.string()))
+    sink = pa.BufferOutputStream()
+    writer = None
+    try:
+        for start, chunk in _chunks(frame, chunk_rows, virtual_columns):
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                file_schema = table.schema.with_metadata({
+                    **(table.schema.metadata or {}),
+                    **{key.encode("utf-8"): value.encode("utf-8") for key, value in (metadata or {}).items()},
+                })
+                writer = pq.ParquetWriter(sink, file_schema, compression=compression)
+            writer.write_table(table.replace_schema_metadata(writer.schema.metadata))
+            if progress is not None:
+                progress(min(start + chunk_rows, len(frame)) / max(len(frame), 1))
+    finally:
+        if writer is not None:
+            writer.close()
+    return sink.getvalue().to_pybytes()
+
+
+# Excel's hard per-sheet row limit, header row included
+EXCEL_MAX_ROWS = 1048576
+
+# Rows turned into worksheet XML at a time; bounds the writer's working memory
+XLSX_CHUNK_ROWS = 10000
+
+# Excel keeps 15 significant digits, so integers this large (e.g. ad_id) are written as text
+EXCEL_MAX_EXACT_INTEGER = 10 ** 15
+
+# Days between Excel's serial date epoch and 1970-01-01
+_EXCEL_EPOCH_OFFSET_DAYS = 25569
+
+# Characters XML 1.0 does not allow, even escaped
+_ILLEGAL_XML_CHARS = r"[\x00-\x08\x0b\x0c\x0e-\x1f]"
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}</Types>'
+)
+_XLSX_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{index}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}<Relationship Id="rIdStyles" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/></Relationships>'
+)
+# Cell styles: 0 general, 1 date, 2 date and time
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_XLSX_SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_XLSX_SHEET_FOOTER = '</sheetData></worksheet>'
+
+_STRING_CELL = '<c r="{}{}" t="inlineStr"><is><t xml:space="preserve">{}</t></is></c>'
+_NUMBER_CELL = '<c r="{}{}"><v>{}</v></c>'
+_BOOLEAN_CELL = '<c r="{}{}" t="b"><v>{}</v></c>'
+_DATE_CELL = '<c r="{}{}" s="{}"><v>{}</v></c>'
+
+
+def _column_letter(index):
+    """Excel column letters for a 0-based column index"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _escape_xml(values):
+    """XML-escaped text of a string Series, with characters XML cannot carry removed"""
+    return (
+        values.str.replace(_ILLEGAL_XML_CHARS, "", regex=True)
+        .str.replace("&", "&amp;", regex=False)
+        .str.replace("<", "&lt;", regex=False)
+        .str.replace(">", "&gt;", regex=False)
+    )
+
+
+class _XlsxColumn:
+    """How one column is turned into cells, decided once for the whole frame"""
+
+    def __init__(self, index, series):
+        self.letter = _column_letter(index)
+        self.categories = None
+        self.style = 0
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            self.kind = "category"
+            # Escape each distinct value once; cells just look their code up
+            escaped = _escape_xml(pd.Series(dtype.categories.astype(str), dtype=object)).to_numpy(dtype=object)
+            self.categories = np.append(escaped, None)
+        elif pd.api.types.is_bool_dtype(dtype):
+            self.kind = "boolean"
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            self.kind = "datetime"
+            values = series.dropna()
+            if getattr(dtype, "tz", None) is not None:
+                values = values.dt.tz_localize(None)
+            self.style = 1 if (values == values.dt.normalize()).all() else 2
+        elif pd.api.types.is_integer_dtype(dtype) and (series.abs() >= EXCEL_MAX_EXACT_INTEGER).any():
+            self.kind = "string"
+        elif pd.api.types.is_numeric_dtype(dtype):
+            self.kind = "number"
+        else:
+            self.kind = "string"
+
+    def cells(self, values, rows):
+        """Cell XML for a chunk of this column; missing values produce no cell"""
+        letter = self.letter
+        if self.kind == "category":
+            text = self.categories[values.cat.codes.to_numpy()]
+            return [_STRING_CELL.format(letter, r, v) if v is not None else "" for r, v in zip(rows, text)]
+
+        if self.kind == "number":
+            numbers = pd.to_numeric(values)
+            missing = ~np.isfinite(numbers.to_numpy(dtype="float64", na_value=np.nan))
+            text = numbers.astype(str).to_numpy(dtype=object)
+            return [_NUMBER_CELL.format(letter, r, v) if not m else "" for r, v, m in zip(rows, text, missing)]
+
+        missing = values.isna().to_numpy()
+        if self.kind == "boolean":
+            text = np.where(values.fillna(False).to_numpy(dtype=bool), "1", "0")
+            return [_BOOLEAN_CELL.format(letter, r, v) if not m else "" for r, v, m in zip(rows, text, missing)]
+
+        if self.kind == "datetime":
+            if getattr(values.dtype, "tz", None) is not None:
+                values = values.dt.tz_localize(None)
+            nanoseconds = values.to_numpy(dtype="datetime64[ns]").astype("int64")
+            serial = (nanoseconds / 86400e9 + _EXCEL_EPOCH_OFFSET_DAYS).astype(str)
+            style = self.style
+            return [_DATE_CELL.format(letter, r, style, v) if not m else "" for r, v, m in zip(rows, serial, missing)]
+
+        text = np.full(len(values), None, dtype=object)
+        text[~missing] = _escape_xml(values[~missing].astype(str)).to_numpy(dtype=object)
+        return [_STRING_CELL.format(letter, r, v) if v is not None else "" for r, v in zip(rows, text)]
+
+
+def _write_sheet(archive, index, frame, progress=None, chunk_rows=XLSX_CHUNK_ROWS, virtual_columns=None):
+    """Stream one worksheet part: a header row, then `frame` (plus any virtual text columns) in row chunks"""
+    virtual_columns = virtual_columns or {}
+    names = list(frame.columns) + list(virtual_columns)
+    columns = [_XlsxColumn(i, frame.iloc[:, i]) for i in range(frame.shape[1])] + [
+        _XlsxColumn(i, pd.Series(dtype=object)) for i in range(frame.shape[1], len(names))
+    ]
+    with archive.open(f"xl/worksheets/sheet{index}.xml", "w", force_zip64=True) as part:
+        part.write(_XLSX_SHEET_HEADER.encode("utf-8"))
+        header = _escape_xml(pd.Series([str(name) for name in names], dtype=object))
+        part.write(
+            ('<row r="1">' + "".join(
+                _STRING_CELL.format(column.letter, 1, name) for column, name in zip(columns, header)
+            ) + "</row>").encode("utf-8")
+        )
+        for start in range(0, len(frame), chunk_rows):
+            chunk = _with_virtual_columns(frame.iloc[start:start + chunk_rows], virtual_columns)
+            rows = [str(row) for row in range(start + 2, start + 2 + len(chunk))]
+            cells = [column.cells(chunk.iloc[:, i], rows) for i, column in enumerate(columns)]
+            part.write("".join(
+                f'<row r="{row}">' + "".join(row_cells) + "</row>" for row, *row_cells in zip(rows, *cells)
+            ).encode("utf-8"))
+            if progress is not None:
+                progress(len(chunk))
+        part.write(_XLSX_SHEET_FOOTER.encode("utf-8"))
+
+
+def _sheet_title(name, taken):
+    """A unique worksheet name Excel accepts: at most 31 characters, none of []:*?/\\"""
+    title = "".join("_" if ch in '[]:*?/\\' else ch for ch in str(name))[:31] or "Sheet"
+    candidate, n = title, 2
+    while candidate.lower() in taken:
+        suffix = f" ({n})"
+        candidate, n = title[:31 - len(suffix)] + suffix, n + 1
+    taken.add(candidate.lower())
+    return candidate
+
+
+def write_excel(frame, progress=None, chunk_rows=XLSX_CHUNK_ROWS, sheet_name="Ads Data",
+                summary_sheets=None, max_rows_per_sheet=EXCEL_MAX_ROWS - 1, virtual_columns=None):
+    """
+    XLSX bytes of `frame`, streamed sheet by sheet without building a workbook in memory.
+
+    Rows are serialized chunk by chunk straight into the zipped worksheet XML
+    (inline strings, no shared string table), so memory stays bounded by the
+    chunk size and the compressed output. Frames longer than Excel's row limit
+    continue on "<sheet_name> (2)", "(3)", ... and `summary_sheets`, a dict of
+    sheet name -> DataFrame such as the grouped tables, are appended after the
+    data with any meaningful index written as columns. `virtual_columns` are
+    computed chunk by chunk for the data sheets only, as in write_csv.
+    `progress(fraction)` is reported as rows are written.
+    """
+    summary_sheets = summary_sheets or {}
+    sheets = []
+    taken = set()
+    for part, start in enumerate(range(0, max(len(frame), 1), max_rows_per_sheet)):
+        name = sheet_name if part == 0 else f"{sheet_name} ({part + 1})"
+        sheets.append((_sheet_title(name, taken), frame.iloc[start:start + max_rows_per_sheet], virtual_columns))
+    for name, table in summary_sheets.items():
+        if not isinstance(table.index, pd.RangeIndex) or table.index.name is not None:
+            table = table.reset_index()
+        sheets.append((_sheet_title(name, taken), table, None))
+
+    total_rows = max(sum(len(table) for _, table, _ in sheets), 1)
+    written = [0]
+
+    def report(rows):
+        written[0] += rows
+        if progress is not None:
+            progress(min(written[0] / total_rows, 1.0))
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for index, (_, table, sheet_virtual_columns) in enumerate(sheets, start=1):
+            _write_sheet(archive, index, table, report, chunk_rows, sheet_virtual_columns)
+
+        archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES.format(sheets="".join(
+            _XLSX_SHEET_CONTENT_TYPE.format(index=index) for index in range(1, len(sheets) + 1)
+        )))
+        archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK.format(sheets="".join(
+            f'<sheet name="{_escape_xml(pd.Series([name])).iloc[0]}" sheetId="{index}" r:id="rId{index}"/>'
+            for index, (name, _, _) in enumerate(sheets, start=1)
+        )))
+        archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS.format(sheets="".join(
+            f'<Relationship Id="rId{index}" '
+            f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{index}.xml"/>'
+            for index in range(1, len(sheets) + 1)
+        )))
+        archive.writestr("xl/styles.xml", _XLSX_STYLES)
+    return buffer.getvalue()
+
+
+class ExportJob:
+    """One export being generated: `progress` in [0, 1], then `data` bytes or an `error`"""
+
+    def __init__(self, key):
+        self.key = key
+        self.progress = 0.0
+        self.data = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.finished = threading.Event()
+
+    @property
+    def running(self):
+        return not self.finished.is_set()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+
+class ExportManager:
+    """
+    Generates downloads on a small worker pool and keeps the finished files.
+
+    Nothing is serialized until a user asks for an export. Jobs are keyed by
+    the caller (dataset version, filter state and format), so every session
+    asking for the same export shares one job and repeat downloads are served
+    from memory. Finished exports are evicted least recently used beyond
+    `max_entries` or `max_bytes`, except the one that just finished, so even
+    an export larger than `max_bytes` stays until the next one completes;
+    failed jobs are dropped so they can be retried.
+    """
+
+    def __init__(self, max_workers=2, max_entries=8, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self.stats = {"submitted": 0, "served": 0, "failed": 0, "evicted": 0}
+
+    def get(self, key):
+        """The job for `key` if one is running or finished, else None"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+                if not job.running:
+                    self.stats["served"] += 1
+            return job
+
+    def submit(self, key, build):
+        """Start `build(progress)` -> bytes for `key` in the background, unless it is already running or done"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+                return job
+            job = ExportJob(key)
+            self._jobs[key] = job
+            self.stats["submitted"] += 1
+        self._executor.submit(self._run, job, build)
+        return job
+
+    def _run(self, job, build):
+        def report(fraction):
+            job.progress = max(job.progress, min(fraction, 1.0))
+
+        try:
+            job.data = build(report)
+            job.progress = 1.0
+            logging.info(f"Export {job.key} finished: {len(job.data):,} bytes in {time.time() - job.started_at:.1f}s")
+        except Exception as e:
+            job.error = str(e)
+            self.stats["failed"] += 1
+            logging.error(f"Export {job.key} failed: {str(e)}")
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+        finally:
+            job.finished_at = time.time()
+            job.finished.set()
+            self._evict(keep=job.key)
+
+    def _evict(self, keep=None):
+        with self._lock:
+            finished = [key for key, job in self._jobs.items() if not job.running and key != keep]
+            if keep in self._jobs:
+                # The job just finished counts toward the budget but is never evicted itself
+                finished.append(keep)
+            total_bytes = sum(len(self._jobs[key].data or b"") for key in finished)
+            while len(finished) > 1 and (len(finished) > self.max_entries or total_bytes > self.max_bytes):
+                key = finished.pop(0)
+                total_bytes -= len(self._jobs.pop(key).data or b"")
+                self.stats["evicted"] += 1
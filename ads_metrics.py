@@ -0,0 +1,275 @@
+"""Vectorized aggregations behind the dashboard tables"""
+import numpy as np
+import pandas as pd
+
+from ads_store import NO_DAY, date_to_day, day_to_date, to_day_numbers, to_utc_nanoseconds
+
+# Reporting windows counted by window_counts, each as published_<window> and rejected_<window>
+WINDOWS = ['lifetime', 'last_30_days', 'last_month', 'current_month', 'yesterday', 'today']
+
+SUMMARY_COLUMNS = [
+    'BUID',
+    'Ad Account ID',
+    'Ads Published - Lifetime',
+    'Ads Rejected - Lifetime',
+    'Ads Published - Last Month',
+    'Ads Rejected - Last Month',
+    'Ads Published - Current Month',
+    'Ads Rejected - Current Month',
+    'Ads Published - Yesterday',
+    'Ads Rejected - Yesterday',
+]
+
+# Keys of the disapproval cube behind the Grouped Analysis tables
+CUBE_KEYS = ['ad_account_id', 'status_change_day', 'error_type']
+
+# Keys of the recent disapproval table behind the Hourly Update tab
+BUCKET_KEYS = ['buckets_ago', 'bucket', 'ad_account_id', 'error_type']
+
+# Summary tab column -> window_counts column
+SUMMARY_WINDOW_COLUMNS = {
+    'Ads Published - Lifetime': 'published_lifetime',
+    'Ads Rejected - Lifetime': 'rejected_lifetime',
+    'Ads Published - Last Month': 'published_last_month',
+    'Ads Rejected - Last Month': 'rejected_last_month',
+    'Ads Published - Current Month': 'published_current_month',
+    'Ads Rejected - Current Month': 'rejected_current_month',
+    'Ads Published - Yesterday': 'published_yesterday',
+    'Ads Rejected - Yesterday': 'rejected_yesterday',
+}
+
+
+def _day_numbers(frame, date_column, day_column):
+    """Precomputed day numbers of a date column, deriving them if the frame lacks them"""
+    if day_column in frame.columns:
+        return frame[day_column].to_numpy()
+    return to_day_numbers(frame[date_column])
+
+
+def _window_buckets(today):
+    """
+    Day buckets and the bucket range [start, stop) of every window.
+
+    Bucket 0 holds days before the earliest window (and missing dates),
+    buckets 1.. one day each up to `today`, and the last bucket anything later.
+    """
+    today_day = date_to_day(today)
+    yesterday = today_day - 1
+    thirty_days_ago = today_day - 30
+    current_month_start = date_to_day(pd.Timestamp(today).replace(day=1))
+    base = min(thirty_days_ago, current_month_start)
+    n_buckets = today_day - base + 3
+
+    def bucket(day):
+        return day - base + 1
+
+    ranges = {
+        'lifetime': (0, n_buckets),
+        'last_30_days': (bucket(thirty_days_ago), n_buckets),
+        'last_month': (bucket(thirty_days_ago), bucket(current_month_start)),
+        'current_month': (bucket(current_month_start), n_buckets),
+        'yesterday': (bucket(yesterday), bucket(yesterday) + 1),
+        'today': (bucket(today_day), bucket(today_day) + 1),
+    }
+    return base, n_buckets, ranges
+
+
+def _group_codes(values):
+    """Integer group codes (-1 for missing) and the group labels they index"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    return pd.factorize(values, sort=True)
+
+
+def window_counts(frame, today=None, by=None, positions=None):
+    """
+    Published and rejected ad counts for every reporting window in one pass.
+
+    Each row is bucketed once by created_day (published) and status_change_day
+    (rejected) relative to `today` and counted with a single bincount, per `by`
+    group when given; every window is then a range sum over those buckets.
+    `positions` restricts the count to those rows without materializing them.
+
+    Returns a Series of published_<window>/rejected_<window> counts, or with
+    `by` a DataFrame of them indexed by the observed group values.
+    """
+    today = pd.Timestamp(today or pd.Timestamp.now().date())
+    base, n_buckets, ranges = _window_buckets(today)
+
+    created_day = _day_numbers(frame, 'created_at', 'created_day')
+    status_change_day = _day_numbers(frame, 'status_change_date', 'status_change_day')
+    rejected = (frame['ad_status'] == 'DISAPPROVED').to_numpy()
+    if by is None:
+        codes, groups = np.zeros(len(frame), dtype=np.int64), None
+    else:
+        codes, groups = _group_codes(frame[by])
+    if positions is not None:
+        created_day, status_change_day = created_day[positions], status_change_day[positions]
+        rejected, codes = rejected[positions], codes[positions]
+
+    n_groups = 1 if groups is None else len(groups)
+    # Rows without a group are counted in an extra trailing group that is dropped below
+    offsets = np.where(codes < 0, n_groups, codes).astype(np.int64) * n_buckets
+    size = (n_groups + 1) * n_buckets
+
+    def cumulative_counts(days, mask=None):
+        cells = offsets + np.clip(days.astype(np.int64) - base + 1, 0, n_buckets - 1)
+        if mask is not None:
+            cells = cells[mask]
+        counts = np.bincount(cells, minlength=size).reshape(n_groups + 1, n_buckets)[:n_groups]
+        return np.concatenate([np.zeros((n_groups, 1), dtype=np.int64), counts.cumsum(axis=1)], axis=1)
+
+    columns = {}
+    for prefix, cumulative in (
+        ('published', cumulative_counts(created_day)),
+        ('rejected', cumulative_counts(status_change_day, rejected)),
+    ):
+        for window in WINDOWS:
+            start, stop = ranges[window]
+            columns[f'{prefix}_{window}'] = cumulative[:, stop] - cumulative[:, start]
+
+    if groups is None:
+        return pd.Series({name: int(values[0]) for name, values in columns.items()})
+    counts = pd.DataFrame(columns, index=pd.Index(groups, name=by))
+    return counts[counts['published_lifetime'] > 0]
+
+
+def top_group(counts, column):
+    """(label, count) of the group with the highest non-zero `column`, or ("None", 0)"""
+    ranked = counts[column].sort_values(ascending=False, kind='stable')
+    if len(ranked) == 0 or ranked.iloc[0] == 0:
+        return "None", 0
+    return ranked.index[0], int(ranked.iloc[0])
+
+
+def build_account_summary(frame, today=None):
+    """
+    Per-account publishing and rejection counts for the Summary tab.
+
+    The counts come from one per-account window_counts pass. Rows come out in
+    first-appearance order of (ad_account_id, buid), one row per pair,
+    matching the original iterrows table.
+    """
+    counts = window_counts(frame, today, by='ad_account_id')
+    counts = counts[list(SUMMARY_WINDOW_COLUMNS.values())].rename(
+        columns={window: column for column, window in SUMMARY_WINDOW_COLUMNS.items()}
+    )
+
+    accounts = frame[['ad_account_id', 'buid']].drop_duplicates().dropna()
+    summary = accounts.merge(counts, left_on='ad_account_id', right_index=True, how='left')
+    summary = summary.rename(columns={'ad_account_id': 'Ad Account ID', 'buid': 'BUID'})
+    return summary[SUMMARY_COLUMNS].reset_index(drop=True)
+
+
+def disapproval_cube(frame, positions=None):
+    """
+    Disapproved ad counts per (ad_account_id, status_change_day, error_type).
+
+    Missing accounts and error types are kept as NaN and missing dates as
+    NO_DAY, so every rollup can drop exactly the rows a direct groupby on its
+    own keys would. `positions` restricts the cube to those rows.
+    """
+    rows = np.flatnonzero((frame['ad_status'] == 'DISAPPROVED').to_numpy())
+    if positions is not None:
+        rows = np.intersect1d(rows, positions, assume_unique=True)
+
+    account_codes, accounts = _group_codes(frame['ad_account_id'])
+    error_codes, error_types = _group_codes(frame['error_type'])
+    keys = pd.DataFrame({
+        'ad_account_id': account_codes[rows],
+        'status_change_day': _day_numbers(frame, 'status_change_date', 'status_change_day')[rows],
+        'error_type': error_codes[rows],
+    })
+    cube = keys.groupby(CUBE_KEYS, sort=False).size().rename('no_of_ads').reset_index()
+    cube['ad_account_id'] = pd.Categorical.from_codes(cube['ad_account_id'], categories=pd.Index(accounts))
+    cube['error_type'] = pd.Categorical.from_codes(cube['error_type'], categories=pd.Index(error_types))
+    return cube
+
+
+def filter_disapproval_cube(cube, ad_account_id=None, day_range=None, error_types=None):
+    """Cube cells matching the account, status change day range and error type filters"""
+    mask = np.ones(len(cube), dtype=bool)
+    if ad_account_id:
+        mask &= (cube['ad_account_id'] == ad_account_id).to_numpy()
+    if day_range is not None:
+        start, end = day_range
+        days = cube['status_change_day'].to_numpy()
+        mask &= (days >= start) & (days <= end)
+    if error_types:
+        mask &= cube['error_type'].isin(error_types).to_numpy()
+    return cube[mask]
+
+
+def rollup_disapprovals(cube, keys):
+    """
+    Roll the cube up to disapproved ad counts by `keys`, like groupby(keys).agg(no_of_ads=...).
+
+    Use 'status_change_date' to group by day; it is labelled with datetime.date
+    values. Results are sorted by the keys.
+    """
+    columns = ['status_change_day' if key == 'status_change_date' else key for key in keys]
+    cells = cube.dropna(subset=[c for c in columns if c != 'status_change_day'])
+    if 'status_change_day' in columns:
+        cells = cells[cells['status_change_day'] != NO_DAY]
+
+    counts = cells.groupby(columns, observed=True)[['no_of_ads']].sum()
+    if 'status_change_day' in columns:
+        level = columns.index('status_change_day')
+        days = counts.index.get_level_values(level)
+        labels = pd.Index([day_to_date(day) for day in days], name='status_change_date')
+        if len(columns) == 1:
+            counts.index = labels
+        else:
+            counts.index = counts.index.set_levels(
+                [day_to_date(day) for day in counts.index.levels[level]], level=level
+            ).set_names('status_change_date', level=level)
+    return counts
+
+
+def recent_disapprovals(frame, now, window=pd.Timedelta(hours=4), bucket=pd.Timedelta(hours=1), time_index=None):
+    """
+    Disapproved ad counts per (buckets_ago, bucket, ad_account_id, error_type) around the last `window`.
+
+    Selects the disapprovals from `window` before `now` to the end of now's
+    clock-aligned bucket, through `time_index` (a TimeIndex on
+    status_change_date) with two binary searches when given, else with one
+    pass over the column. `bucket` is the change time floored to the bucket
+    size and `buckets_ago` the rolling bucket before `now` it falls in:
+    i for [now - (i+1)*bucket, now - i*bucket), -1 at exactly `now` and -2
+    after it. Every rolling window and clock-aligned trend is a sum over this
+    small table. `first_row` is the position of each cell's first row in
+    `frame`, for looking up per-account attributes such as buid.
+    """
+    now = pd.Timestamp(now)
+    now = now.tz_localize('UTC') if now.tz is None else now.tz_convert('UTC')
+    bucket_ns = pd.Timedelta(bucket).value
+    now_ns = now.value
+    span_start = now_ns - pd.Timedelta(window).value
+    span_end = now_ns - now_ns % bucket_ns + bucket_ns
+
+    if time_index is not None:
+        rows = np.sort(time_index.between(span_start, span_end))
+        changed_ns = to_utc_nanoseconds(frame['status_change_date'].iloc[rows])
+    else:
+        changed_ns = to_utc_nanoseconds(frame['status_change_date'])
+        # NaT is the minimum int64 and never falls inside the span
+        rows = np.flatnonzero((changed_ns >= span_start) & (changed_ns < span_end))
+        changed_ns = changed_ns[rows]
+    disapproved = (frame['ad_status'].iloc[rows] == 'DISAPPROVED').to_numpy()
+    rows, changed_ns = rows[disapproved], changed_ns[disapproved]
+
+    offset = now_ns - changed_ns
+    account_codes, accounts = _group_codes(frame['ad_account_id'].iloc[rows])
+    error_codes, error_types = _group_codes(frame['error_type'].iloc[rows])
+    keys = pd.DataFrame({
+        'buckets_ago': np.where(offset < 0, -2, (offset - 1) // bucket_ns),
+        'bucket': changed_ns - changed_ns % bucket_ns,
+        'ad_account_id': account_codes,
+        'error_type': error_codes,
+        'row': rows,
+    })
+    table = keys.groupby(BUCKET_KEYS, sort=False).agg(no_of_ads=('row', 'size'), first_row=('row', 'min')).reset_index()
+    table['bucket'] = pd.to_datetime(table['bucket'], utc=True)
+    table['ad_account_id'] = pd.Categorical.from_codes(table['ad_account_id'], categories=pd.Index(accounts))
+    table['error_type'] = pd.Categorical.from_codes(table['error_type'], categories=pd.Index(error_types))
+    return table
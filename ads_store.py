@@ -0,0 +1,1149 @@
+"""In-process storage and refresh logic for the ads dataset"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Low-cardinality string columns stored as pandas categoricals (dictionary encoded)
+ADS_CATEGORICAL_COLUMNS = ['ad_status', 'effective_status', 'error_type', 'error_description', 'ad_account_id', 'buid']
+# ad_id text that converts to an integer and back unchanged: no sign, leading zeros, spaces or decimals
+AD_ID_INTEGER_PATTERN = r'0|[1-9][0-9]*'
+
+
+def _integer_ad_ids(ad_ids):
+    """ad_id as the smallest signed integer dtype, or None if any id is not an integer within int64"""
+    if not pd.api.types.is_integer_dtype(ad_ids.dtype):
+        if not ad_ids.astype(str).str.fullmatch(AD_ID_INTEGER_PATTERN).all():
+            return None
+        ad_ids = pd.to_numeric(ad_ids.astype(str))
+    # Past int64 pandas parses to uint64 or Python ints; those ids stay text
+    if not pd.api.types.is_signed_integer_dtype(ad_ids.dtype):
+        return None
+    return pd.to_numeric(ad_ids, downcast='integer')
+
+
+def apply_ads_schema(frame):
+    """Dictionary-encode low-cardinality string columns and store ad_id as a compact integer when every id fits"""
+    for column in ADS_CATEGORICAL_COLUMNS:
+        if column in frame.columns:
+            frame[column] = frame[column].astype('category')
+    if 'ad_id' in frame.columns and frame['ad_id'].notna().all():
+        ad_ids = _integer_ad_ids(frame['ad_id'])
+        if ad_ids is None:
+            logging.warning("Keeping ad_id as text: not every id is an integer within int64")
+        else:
+            frame['ad_id'] = ad_ids
+    return frame
+
+
+# Ads Manager URL of one ad; account_id is the ad account id without its 'act_' prefix
+AD_LINK_TEMPLATE = (
+    "https://adsmanager.facebook.com/adsmanager/manage/ads/edit/standalone?act={account_id}&columns=name%2Cdelivery%2Crecommendations_guidance%2Ccampaign_name%2Cbid%2Cbudget%2Clast_significant_edit%2Cattribution_setting%2Cresults%2Creach%2Cimpressions%2Ccost_per_result%2Cquality_score_organic%2Cquality_score_ectr%2Cquality_score_ecvr%2Cspend%2Cend_time%2Cschedule%2Ccpm%2Cpurchase_roas%3Aomni_purchase%2Cfrequency%2Cactions%3Aomni_purchase%2Ccreated_time&attribution_windows=default&filter_set=CAMPAIGN_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]%1DCAMPAIGN_GROUP_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]%1DADGROUP_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]&selected_ad_ids={ad_id}&sort=created_time~0&current_step=0&ads_manager_write_regions=true&nav_source=no_referrer#"
+)
+
+
+def ad_links(frame):
+    """
+    Ads Manager URL of every row of `frame`, built from AD_LINK_TEMPLATE without a per-row format call.
+
+    The URL up to the ad id is formatted once per distinct account and joined
+    to the ad ids in one vectorized pass; rows missing either get None. The
+    dashboards keep no ad_link column and call this only for the rows they
+    display or export.
+    """
+    head, tail = AD_LINK_TEMPLATE.split('{ad_id}')
+    links = np.full(len(frame), None, dtype=object)
+    if frame.empty:
+        return pd.Series(links, index=frame.index, name='ad_link')
+
+    codes, accounts = pd.factorize(frame['ad_account_id'])
+    heads = np.array([
+        head.format(account_id=account.replace('act_', '') if account.startswith('act_') else account)
+        for account in map(str, accounts)
+    ] + [None], dtype=object)
+    ad_ids = frame['ad_id']
+    present = (codes >= 0) & ad_ids.notna().to_numpy()
+    # Join the short ad id part first so each long URL string is allocated only once
+    links[present] = heads[codes[present]] + (ad_ids[present].astype(str).to_numpy(dtype=object) + tail)
+    return pd.Series(links, index=frame.index, name='ad_link')
+
+
+# Integer day numbers (days since 1970-01-01) precomputed next to each date column
+DAY_COLUMNS = {'created_at': 'created_day', 'status_change_date': 'status_change_day'}
+# Day number stored for missing dates; it fails every lower-bounded window check
+NO_DAY = np.iinfo(np.int32).min
+
+
+def date_to_day(value):
+    """Day number of a date, datetime or Timestamp"""
+    return int(np.datetime64(pd.Timestamp(value).date(), 'D').astype('int64'))
+
+
+def day_to_date(day):
+    """datetime.date for a day number"""
+    return np.datetime64(int(day), 'D').astype(object)
+
+
+def to_day_numbers(values):
+    """int32 day numbers for a datetime-like Series, NO_DAY where the date is missing"""
+    values = pd.to_datetime(values)
+    if values.dt.tz is not None:
+        values = values.dt.tz_localize(None)
+    days = values.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    return np.where(np.isnat(days), NO_DAY, days.astype('int64')).astype(np.int32)
+
+
+def day_bounds(days):
+    """(first, last) datetime.date covered by a day number column, ignoring missing dates"""
+    days = np.asarray(days)
+    days = days[days != NO_DAY]
+    if len(days) == 0:
+        return None, None
+    return day_to_date(days.min()), day_to_date(days.max())
+
+
+def normalize_ads_dates(frame):
+    """Parse the date columns to datetime64 once and add their integer day numbers"""
+    for column, day_column in DAY_COLUMNS.items():
+        if column in frame.columns:
+            frame[column] = pd.to_datetime(frame[column])
+            frame[day_column] = to_day_numbers(frame[column])
+    return frame
+
+
+def to_utc_nanoseconds(values):
+    """int64 nanoseconds since the epoch (UTC) of a datetime Series; naive values are taken as UTC, NaT is the int64 minimum"""
+    if values.dt.tz is not None:
+        values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+    return values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def memory_report(usage_before, usage_after):
+    """Per-column memory (MB) before and after a schema step, from DataFrame.memory_usage(deep=True)"""
+    report = pd.DataFrame({
+        'before_mb': usage_before / 2**20,
+        'after_mb': usage_after.reindex(usage_before.index.union(usage_after.index)) / 2**20,
+    })
+    report.loc['total'] = report.sum()
+    report['reduction'] = 1 - report['after_mb'] / report['before_mb']
+    return report.round(2)
+
+
+def upsert_by_key(base, delta, key="ad_id"):
+    """Replace rows of `base` whose `key` appears in `delta` and append the new ones"""
+    if delta is None or delta.empty:
+        return base
+    if base is None or base.empty:
+        return delta.reset_index(drop=True)
+    kept = base[~base[key].isin(delta[key])]
+    delta = delta[base.columns]
+    for column in base.columns:
+        # concat only keeps a categorical when both sides share its categories
+        if isinstance(base[column].dtype, pd.CategoricalDtype):
+            categories = base[column].cat.categories.union(pd.Index(delta[column].dropna().unique()))
+            kept = kept.assign(**{column: kept[column].cat.set_categories(categories)})
+            delta = delta.assign(**{column: delta[column].astype(pd.CategoricalDtype(categories))})
+    return pd.concat([kept, delta], ignore_index=True)
+
+
+def query_hash(query):
+    """Short, stable fingerprint of a SQL query used to validate snapshots"""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()[:16]
+
+
+def write_snapshot(frame, path, metadata):
+    """Atomically write `frame` as an uncompressed Arrow IPC file with string metadata"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    schema_metadata = dict(table.schema.metadata or {})
+    schema_metadata.update({f"ads.{key}".encode(): str(value).encode() for key, value in metadata.items()})
+    table = table.replace_schema_metadata(schema_metadata)
+
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """
+    Read an Arrow snapshot and return (frame, metadata), or None if unreadable.
+
+    The file is memory-mapped so Arrow reads it without a buffered copy, but
+    to_pandas still copies every column into the returned frame.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        metadata = {
+            key.decode()[len("ads."):]: value.decode()
+            for key, value in (table.schema.metadata or {}).items()
+            if key.startswith(b"ads.")
+        }
+        return table.to_pandas(), metadata
+    except (pa.ArrowInvalid, OSError) as e:
+        logging.warning(f"Ignoring unreadable snapshot {path}: {str(e)}")
+        return None
+
+
+class IncrementalAdsCache:
+    """
+    Keeps the last loaded ads frame plus a `status_change_date` watermark.
+
+    Once `ttl` seconds have passed, only ads edited on or after the watermark
+    are fetched and upserted by `ad_id`. A full reload still happens every
+    `full_refresh_after` seconds so rows that drop out of the source are purged.
+
+    With a `snapshot_path`, every refresh is persisted to disk and a fresh
+    process starts from that snapshot, refreshing it in the background.
+    """
+
+    def __init__(self, ttl=3600, full_refresh_after=24 * 3600, key="ad_id", watermark_column="status_change_date",
+                 snapshot_path=None, query=None):
+        self.ttl = ttl
+        self.full_refresh_after = full_refresh_after
+        self.key = key
+        self.watermark_column = watermark_column
+        self.snapshot_path = snapshot_path
+        self.query_hash = query_hash(query) if query else None
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._snapshot_checked = False
+        self.frame = None
+        self.watermark = None
+        self.loaded_at = None
+        self.full_loaded_at = None
+
+    def _compute_watermark(self, frame):
+        if frame is None or frame.empty or self.watermark_column not in frame.columns:
+            return None
+        watermark = frame[self.watermark_column].dropna().max()
+        return None if pd.isna(watermark) else watermark
+
+    def _is_fresh(self):
+        return self.frame is not None and time.time() - self.loaded_at < self.ttl
+
+    def _load_snapshot(self):
+        self._snapshot_checked = True
+        if not self.snapshot_path:
+            return
+        snapshot = read_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return
+        frame, metadata = snapshot
+        if metadata.get("query_hash") != self.query_hash:
+            logging.info("Snapshot was built from a different query, ignoring it")
+            return
+        self.frame = frame
+        self.watermark = self._compute_watermark(frame)
+        self.loaded_at = float(metadata.get("loaded_at", 0))
+        self.full_loaded_at = float(metadata.get("full_loaded_at", 0))
+        logging.info(f"Loaded ads snapshot with {len(frame)} rows from {self.snapshot_path}")
+
+    def _save_snapshot(self):
+        if not self.snapshot_path or self.frame is None:
+            return
+        try:
+            write_snapshot(self.frame, self.snapshot_path, {
+                "loaded_at": self.loaded_at,
+                "full_loaded_at": self.full_loaded_at,
+                "watermark": self.watermark,
+                "query_hash": self.query_hash,
+            })
+        except (pa.ArrowException, OSError) as e:
+            logging.warning(f"Could not write ads snapshot: {str(e)}")
+
+    def refresh(self, load_full, load_delta):
+        """Run one full or delta refresh; concurrent callers wait for the running one"""
+        with self._refresh_lock:
+            with self._lock:
+                if self._is_fresh():
+                    return self.frame
+                frame, watermark, full_loaded_at = self.frame, self.watermark, self.full_loaded_at
+
+            now = time.time()
+            needs_full = (
+                frame is None
+                or watermark is None
+                or now - full_loaded_at >= self.full_refresh_after
+            )
+
+            if needs_full:
+                loaded = load_full()
+                if loaded is None:
+                    return frame
+                full_loaded_at = now
+                logging.info(f"Full ads load: {len(loaded)} rows")
+            else:
+                delta = load_delta(watermark)
+                if delta is None:
+                    logging.warning("Delta ads load failed, serving previous data")
+                    return frame
+                loaded = upsert_by_key(frame, delta, key=self.key)
+                logging.info(f"Delta ads load since {watermark}: {len(delta)} rows upserted")
+
+            with self._lock:
+                self.frame = loaded
+                self.watermark = self._compute_watermark(loaded)
+                self.loaded_at = now
+                self.full_loaded_at = full_loaded_at
+            self._save_snapshot()
+            return loaded
+
+    def refresh_in_background(self, load_full, load_delta):
+        """Start a refresh on a daemon thread unless one is already running"""
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self.refresh, args=(load_full, load_delta), daemon=True, name="ads-refresh").start()
+
+    def get(self, load_full, load_delta):
+        """
+        Return the current frame, refreshing it first if the TTL has expired.
+
+        `load_full()` returns the complete dataset; `load_delta(watermark)` returns
+        ads edited on or after `watermark`. Either may return None on failure, in
+        which case the previous frame is served and the refresh is retried later.
+        A frame restored from the on-disk snapshot is served immediately while it
+        is refreshed in the background.
+        """
+        with self._lock:
+            if not self._snapshot_checked:
+                self._load_snapshot()
+                if self.frame is not None and not self._is_fresh():
+                    self.refresh_in_background(load_full, load_delta)
+                    return self.frame
+            if self._is_fresh():
+                return self.frame
+            if self.frame is not None and self._refresh_lock.locked():
+                # Another thread is already refreshing; keep serving the current frame
+                return self.frame
+
+        return self.refresh(load_full, load_delta)
+
+
+class PartitionedAdsStore:
+    """
+    On-disk ads cache split into one Arrow file per `status_change_date` day.
+
+    Partitions older than `hot_days` are frozen: they are never re-queried,
+    only pruned of ads that were edited again and moved to a newer day. Each
+    refresh re-fetches just the hot days through `load_range(since)`, where
+    `since=None` means the full history. A full rebuild still happens every
+    `full_refresh_after` seconds.
+
+    Every refresh writes its partitions to new files named after its
+    generation and only then swaps the manifest, so a `load` never sees a
+    half-written refresh. Files the new manifest no longer references are
+    deleted once the loads still reading the previous generation finish.
+    """
+
+    NULL_PARTITION = "null"
+
+    def __init__(self, root, hot_days=7, ttl=3600, full_refresh_after=7 * 24 * 3600, key="ad_id",
+                 partition_column="status_change_date", query=None):
+        self.root = root
+        self.hot_days = hot_days
+        self.ttl = ttl
+        self.full_refresh_after = full_refresh_after
+        self.key = key
+        self.partition_column = partition_column
+        self.query_hash = query_hash(query) if query else None
+
+        self._lock = threading.Lock()
+        self._readers_done = threading.Condition(self._lock)
+        self._readers = {}  # manifest generation -> loads reading its files
+        self._refresh_lock = threading.Lock()
+        self._frame = None
+        self.manifest = self._read_manifest()
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def _partition_file(self, day, generation):
+        return f"{self.partition_column}={day}.{generation}.arrow"
+
+    def _partition_path(self, day, manifest):
+        # Manifests written before partition files carried a generation name them by day only
+        files = manifest.get("files") or {}
+        return os.path.join(self.root, files.get(day, f"{self.partition_column}={day}.arrow"))
+
+    def _remove_unreferenced(self, manifest):
+        """Delete partition files the manifest does not reference, e.g. superseded or left by an interrupted refresh"""
+        referenced = {os.path.basename(self._partition_path(day, manifest)) for day in manifest["partitions"]}
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith(f"{self.partition_column}=") and name not in referenced:
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    pass
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("query_hash") != self.query_hash:
+            logging.info("Partitioned cache was built from a different query, ignoring it")
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest):
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _day_keys(self, frame):
+        days = pd.to_datetime(frame[self.partition_column]).dt.strftime("%Y-%m-%d")
+        return days.fillna(self.NULL_PARTITION)
+
+    def _read_partition(self, day, manifest, columns=None):
+        snapshot = read_snapshot(self._partition_path(day, manifest))
+        if snapshot is None:
+            return None
+        frame = snapshot[0]
+        return frame[columns] if columns else frame
+
+    def _is_fresh(self):
+        return self.manifest is not None and time.time() - self.manifest["refreshed_at"] < self.ttl
+
+    def refresh(self, load_range, today=None):
+        """Re-fetch the hot partitions (or everything, when a rebuild is due) and rewrite them"""
+        with self._refresh_lock:
+            if self._is_fresh():
+                return True
+            today = today or date.today()
+            hot_start = (today - timedelta(days=self.hot_days)).isoformat()
+            now = time.time()
+            generation = time.time_ns()
+            manifest = self.manifest
+            full = manifest is None or now - manifest["full_loaded_at"] >= self.full_refresh_after
+
+            fetched = load_range(None if full else date.fromisoformat(hot_start))
+            if fetched is None:
+                logging.warning("Partition refresh failed, serving previous data")
+                return False
+
+            os.makedirs(self.root, exist_ok=True)
+            fetched_days = self._day_keys(fetched)
+            written = {}
+            files = {}
+            for day, partition in fetched.groupby(fetched_days, sort=False):
+                files[day] = self._partition_file(day, generation)
+                write_snapshot(partition.reset_index(drop=True), os.path.join(self.root, files[day]), {"fetched_at": now})
+                written[day] = len(partition)
+
+            old_partitions = manifest["partitions"] if manifest else {}
+            partitions = {}
+            for day, rows in old_partitions.items():
+                if day in written:
+                    continue
+                if full or (day != self.NULL_PARTITION and day >= hot_start):
+                    # Replaced by this refresh and no longer holds any ads; its file goes after the swap
+                    continue
+                partitions[day] = rows
+                files[day] = os.path.basename(self._partition_path(day, manifest))
+
+            if not full:
+                # Ads re-edited since they were frozen now live in a hot partition
+                moved_ids = set(fetched[self.key])
+                for day in list(partitions):
+                    ids = self._read_partition(day, manifest, columns=[self.key])
+                    if ids is None or not ids[self.key].isin(moved_ids).any():
+                        continue
+                    frozen = self._read_partition(day, manifest)
+                    frozen = frozen[~frozen[self.key].isin(moved_ids)].reset_index(drop=True)
+                    if frozen.empty:
+                        del partitions[day]
+                        del files[day]
+                        continue
+                    files[day] = self._partition_file(day, generation)
+                    write_snapshot(frozen, os.path.join(self.root, files[day]), {"fetched_at": now})
+                    partitions[day] = len(frozen)
+
+            partitions.update(written)
+            previous_generation = manifest.get("generation") if manifest else None
+            manifest = {
+                "query_hash": self.query_hash,
+                "generation": generation,
+                "refreshed_at": now,
+                "full_loaded_at": now if full else manifest["full_loaded_at"],
+                "hot_start": hot_start,
+                "partitions": partitions,
+                "files": files,
+            }
+            self._write_manifest(manifest)
+            with self._lock:
+                self.manifest = manifest
+                self._frame = None
+                # Loads that started from the previous manifest may still be opening its files
+                self._readers_done.wait_for(lambda: not self._readers.get(previous_generation))
+            self._remove_unreferenced(manifest)
+            logging.info(
+                f"{'Full' if full else 'Hot'} partition refresh: {len(fetched)} rows fetched, "
+                f"{len(written)} partitions written, {len(partitions)} partitions total"
+            )
+            return True
+
+    def load(self, start=None, end=None):
+        """Assemble only the partitions whose day falls inside [start, end]"""
+        with self._lock:
+            manifest = self.manifest
+            if manifest is None:
+                return None
+            generation = manifest.get("generation")
+            self._readers[generation] = self._readers.get(generation, 0) + 1
+        try:
+            start = start.isoformat() if start is not None else None
+            end = end.isoformat() if end is not None else None
+            frames = []
+            for day in sorted(manifest["partitions"]):
+                if day == self.NULL_PARTITION:
+                    if start is not None or end is not None:
+                        continue
+                elif (start is not None and day < start) or (end is not None and day > end):
+                    continue
+                frame = self._read_partition(day, manifest)
+                if frame is None:
+                    logging.warning(f"Partition {day} listed in the manifest could not be read, it is missing from this load")
+                    continue
+                frames.append(frame)
+        finally:
+            with self._lock:
+                self._readers[generation] -= 1
+                if not self._readers[generation]:
+                    del self._readers[generation]
+                self._readers_done.notify_all()
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def get(self, load_range):
+        """Return the full dataset, refreshing the hot partitions first once the TTL has expired"""
+        with self._lock:
+            if self._is_fresh() and self._frame is not None:
+                return self._frame
+            have_data = self.manifest is not None
+
+        if have_data and self._refresh_lock.locked():
+            # Another thread is already refreshing; serve what is on disk
+            pass
+        elif have_data and not self._is_fresh():
+            # Serve the partitions already on disk and refresh the hot ones in the background
+            threading.Thread(target=self.refresh, args=(load_range,), daemon=True, name="ads-partition-refresh").start()
+        elif not have_data:
+            self.refresh(load_range)
+
+        with self._lock:
+            if self._frame is not None:
+                return self._frame
+            manifest = self.manifest
+        frame = self.load()
+        with self._lock:
+            # A frame assembled while a refresh swapped the manifest is served once but not kept
+            if self.manifest is manifest:
+                self._frame = frame
+        return frame
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still in flight wait for it and get the same result (or exception)
+    instead of starting their own. Nothing is kept once the call finishes.
+    `stats["shared"]` counts the duplicate calls avoided.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.stats = {"calls": 0, "runs": 0, "shared": 0, "errors": 0}
+
+    def do(self, key, function):
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = {"done": threading.Event(), "result": None, "error": None}
+                self.stats["runs"] += 1
+            else:
+                self.stats["shared"] += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = function()
+        except Exception as e:
+            call["error"] = e
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call["done"].set()
+        return call["result"]
+
+
+class BackgroundRefresher:
+    """
+    Stale-while-revalidate holder for a dataset that is expensive to load.
+
+    The first `get` runs `load()` on the caller's thread; that warm-up is the
+    only load anyone waits for. A daemon thread then calls
+    `load(background=True)` again `ttl - lead` seconds after the data was
+    fetched and swaps the result in atomically, so `get` always returns the
+    last good value immediately. A failed reload (an exception or None) keeps
+    the previous value and is retried after `retry_after` seconds.
+
+    `as_of(value)` tells when a value's data was fetched (epoch seconds), e.g.
+    for one restored from disk; by default it is the time its load finished.
+    """
+
+    def __init__(self, load, ttl=3600, lead=300, retry_after=60, as_of=None, name="ads-refresher"):
+        self._load = load
+        self.interval = max(ttl - lead, 1)
+        self.retry_after = retry_after
+        self._as_of = as_of
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._warm_up = SingleFlight()
+        self._thread = None
+        self.value = None
+        self.loaded_at = None
+        self.last_error = None
+        self.stats = {"reloads": 0, "failures": 0}
+
+    @property
+    def ready(self):
+        return self.value is not None
+
+    def _load_once(self, **kwargs):
+        """Run `load` and swap its result in; the caller holds _load_lock"""
+        try:
+            value = self._load(**kwargs)
+            error = None if value is not None else "load returned no data"
+        except Exception as e:
+            logging.error(f"{self.name}: load failed: {str(e)}", exc_info=True)
+            value, error = None, str(e)
+        if value is None:
+            self.last_error = error
+            self.stats["failures"] += 1
+            return False
+
+        loaded_at = time.time()
+        if self._as_of is not None:
+            loaded_at = self._as_of(value) or loaded_at
+        with self._lock:
+            self.value, self.loaded_at, self.last_error = value, loaded_at, None
+        self.stats["reloads"] += 1
+        return True
+
+    @property
+    def warm_up_stats(self):
+        return self._warm_up.stats
+
+    def _warm_up_once(self, **kwargs):
+        with self._load_lock:
+            # A caller that just missed the previous warm-up finds its value here
+            if self.value is None:
+                self._load_once(**kwargs)
+
+    def _refresh_forever(self):
+        delay = self.loaded_at + self.interval - time.time()
+        while True:
+            if delay > 0:
+                time.sleep(delay)
+            with self._load_lock:
+                refreshed = self._load_once(background=True)
+            if refreshed:
+                logging.info(f"{self.name}: refreshed in the background, data as of {self.loaded_at:.0f}")
+                delay = self.loaded_at + self.interval - time.time()
+                # Data that is already due again (e.g. an unchanged on-disk copy) is retried later, not in a loop
+                delay = delay if delay > 0 else self.retry_after
+            else:
+                logging.warning(f"{self.name}: background refresh failed, serving previous data: {self.last_error}")
+                delay = self.retry_after
+
+    def _start_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refresh_forever, daemon=True, name=self.name)
+                self._thread.start()
+
+    def get(self, **kwargs):
+        """
+        The last good value, or None if the warm-up load failed.
+
+        Only while there is no value yet is `load(**kwargs)` run on this thread;
+        concurrent callers wait for that one warm-up instead of loading again
+        (counted in `warm_up_stats["shared"]`).
+        """
+        if self.value is None:
+            self._warm_up.do("load", lambda: self._warm_up_once(**kwargs))
+        if self.value is not None:
+            self._start_thread()
+        return self.value
+
+
+
+def account_buid_map(accounts, business_managers, business_owners):
+    """ad_account_id -> buid through the business manager and owning business, like ads_data_query's left joins"""
+    manager_business = business_managers.drop_duplicates('id').set_index('id')['app_business_id']
+    business_buid = business_owners.drop_duplicates('id').set_index('id')['buid']
+    accounts = accounts.drop_duplicates('ad_account_id')
+    buids = accounts['app_business_manager_id'].map(manager_business).map(business_buid)
+    return pd.Series(buids.to_numpy(), index=pd.Index(accounts['ad_account_id'].to_numpy()), name='buid')
+
+
+class SplitAdsLoader:
+    """
+    Loads ads as a narrow fact query plus the small account -> buid dimension queries.
+
+    `fetch(query, on_chunk=None)` runs one query on its own pooled connection
+    and returns a DataFrame, or None on failure. It is passed to every `load`
+    rather than kept, so a long-lived loader always uses the caller's current
+    connection settings. The fact query runs on the caller's thread (so
+    `on_chunk` can report progress) while the dimension queries run
+    concurrently on a thread pool; `account_buid_map` composes them and buid
+    is attached to the facts with one hash lookup per row.
+
+    The map is kept for `dimension_ttl` seconds, so most loads run the fact
+    query alone. It is reloaded early when the facts reference an account it
+    does not know yet, and a failed reload keeps serving the previous map.
+    Concurrent loads share one in-flight dimension load.
+    """
+
+    def __init__(self, dimension_queries, dimension_ttl=24 * 3600, max_workers=3):
+        self.dimension_queries = dimension_queries
+        self.dimension_ttl = dimension_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ads-dimensions")
+        self._lock = threading.Lock()
+        self._in_flight = None
+        self.account_buids = None
+        self.dimensions_loaded_at = None
+        self.stats = {"fact_loads": 0, "dimension_loads": 0, "early_dimension_loads": 0, "dimension_failures": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _dimensions_due(self):
+        return self.account_buids is None or time.time() - self.dimensions_loaded_at >= self.dimension_ttl
+
+    def _start_dimensions(self, fetch, force=False):
+        """The dimension load to wait for: the one in flight, a new one if the map is due (or `force`), else None"""
+        with self._lock:
+            if self._in_flight is None and (force or self._dimensions_due()):
+                self._in_flight = {
+                    "futures": {
+                        name: self._executor.submit(fetch, query) for name, query in self.dimension_queries.items()
+                    },
+                    "lock": threading.Lock(),
+                    "stored": None,
+                }
+            return self._in_flight
+
+    def _finish_dimensions(self, call):
+        """Wait for a dimension load; the first caller to get here swaps its map in, True if that succeeded"""
+        with call["lock"]:
+            if call["stored"] is None:
+                call["stored"] = self._store_dimensions(call["futures"])
+                with self._lock:
+                    if self._in_flight is call:
+                        self._in_flight = None
+            return call["stored"]
+
+    def _store_dimensions(self, futures):
+        """Wait for the dimension queries and swap in the new map; False (keeping the old one) if any failed"""
+        frames = {}
+        for name, future in futures.items():
+            try:
+                frames[name] = future.result()
+            except Exception as e:
+                logging.error(f"Dimension query {name} failed: {str(e)}")
+                frames[name] = None
+        failed = [name for name, frame in frames.items() if frame is None]
+        if failed:
+            self._count("dimension_failures")
+            logging.warning(f"Dimension queries failed ({', '.join(failed)}), keeping the previous account -> buid map")
+            return False
+
+        account_buids = account_buid_map(**frames)
+        with self._lock:
+            self.account_buids, self.dimensions_loaded_at = account_buids, time.time()
+            self.stats["dimension_loads"] += 1
+        logging.info(f"Loaded account -> buid map for {len(account_buids)} accounts")
+        return True
+
+    def load(self, fact_query, fetch, on_chunk=None):
+        """The facts of `fact_query` with buid as the first column; None if the facts or a first dimension load failed"""
+        dimensions = self._start_dimensions(fetch)
+        facts = fetch(fact_query, on_chunk)
+        if dimensions is not None:
+            self._finish_dimensions(dimensions)
+        if facts is None:
+            return None
+        self._count("fact_loads")
+
+        account_buids = self.account_buids
+        if account_buids is not None and dimensions is None:
+            unknown = facts['ad_account_id'].dropna().drop_duplicates()
+            unknown = unknown[~unknown.isin(account_buids.index)]
+            if len(unknown):
+                logging.info(f"{len(unknown)} ad accounts missing from the account -> buid map, reloading it")
+                self._count("early_dimension_loads")
+                if self._finish_dimensions(self._start_dimensions(fetch, force=True)):
+                    account_buids = self.account_buids
+        if account_buids is None:
+            return None
+
+        # The fetched frame may be shared with concurrent callers of the same query; never modify it
+        facts = facts.copy(deep=False)
+        facts.insert(0, 'buid', facts['ad_account_id'].map(account_buids))
+        return facts
+
+
+# Columns filtered by exact value in the dashboards, each indexed with one bitmap per value
+FILTER_VALUE_COLUMNS = ['ad_status', 'effective_status', 'error_type']
+
+
+def _codes_by_appearance(values):
+    """Integer codes (-1 for missing) and labels, with labels in first-appearance order"""
+    codes, labels = pd.factorize(values)
+    return codes, list(labels)
+
+
+class AdsFilterIndex:
+    """
+    Row indexes over a shared df_ads for resolving the dashboard filters.
+
+    Built once per dataset version: a hash index from ad_account_id to its
+    row positions, row positions sorted by each day column so date ranges
+    resolve with binary search, and one boolean bitmap per value of the
+    FILTER_VALUE_COLUMNS. `resolve` intersects these for any combination of
+    filters and returns sorted row positions without scanning or copying df_ads.
+    """
+
+    def __init__(self, frame):
+        self.n_rows = len(frame)
+
+        self._account_positions = {}
+        self.account_ids = []
+        if 'ad_account_id' in frame.columns:
+            codes, self.account_ids = _codes_by_appearance(frame['ad_account_id'])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(self.account_ids) + 1))
+            for code, account in enumerate(self.account_ids):
+                self._account_positions[account] = order[bounds[code]:bounds[code + 1]]
+
+        self._days = {}
+        self._day_order = {}
+        self._sorted_days = {}
+        for day_column in DAY_COLUMNS.values():
+            if day_column in frame.columns:
+                days = frame[day_column].to_numpy()
+                order = np.argsort(days, kind='stable')
+                self._days[day_column] = days
+                self._day_order[day_column] = order
+                self._sorted_days[day_column] = days[order]
+
+        self._bitmaps = {}
+        self._options = {}
+        for column in FILTER_VALUE_COLUMNS:
+            if column in frame.columns:
+                codes, labels = _codes_by_appearance(frame[column])
+                self._options[column] = labels
+                self._bitmaps[column] = {label: codes == code for code, label in enumerate(labels)}
+
+    def has_account(self, ad_account_id):
+        return ad_account_id in self._account_positions
+
+    def options(self, column):
+        """Distinct non-null values of an indexed column, in first-appearance order"""
+        return list(self._options.get(column, []))
+
+    def _day_range(self, day_column, start, end):
+        sorted_days = self._sorted_days[day_column]
+        lo, hi = np.searchsorted(sorted_days, [start, end + 1])
+        return np.sort(self._day_order[day_column][lo:hi])
+
+    def _values_mask(self, column, values, positions=None):
+        bitmaps = self._bitmaps[column]
+        size = self.n_rows if positions is None else len(positions)
+        mask = np.zeros(size, dtype=bool)
+        for value in values:
+            bitmap = bitmaps.get(value)
+            if bitmap is not None:
+                mask |= bitmap if positions is None else bitmap[positions]
+        return mask
+
+    def resolve(self, ad_account_id=None, day_ranges=None, values=None):
+        """
+        Sorted row positions matching every given filter, or None if no filter applies.
+
+        None stands for every row, as it does for SharedAdsDataset.take,
+        window_counts and disapproval_cube, so nothing is allocated for it.
+        `day_ranges` maps a day column to an inclusive (start_day, end_day);
+        `values` maps a FILTER_VALUE_COLUMNS column to the accepted values.
+        Filters on columns the frame lacks are ignored.
+        """
+        positions = None  # None means every row
+        if ad_account_id:
+            positions = self._account_positions.get(ad_account_id, np.empty(0, dtype=np.intp))
+
+        for day_column, (start, end) in (day_ranges or {}).items():
+            if day_column not in self._days:
+                continue
+            if positions is None:
+                positions = self._day_range(day_column, start, end)
+            else:
+                days = self._days[day_column][positions]
+                positions = positions[(days >= start) & (days <= end)]
+
+        for column, accepted in (values or {}).items():
+            if not accepted or column not in self._bitmaps:
+                continue
+            if positions is None:
+                positions = np.flatnonzero(self._values_mask(column, accepted))
+            else:
+                positions = positions[self._values_mask(column, accepted, positions)]
+
+        return positions
+
+
+class TimeIndex:
+    """
+    Row positions of a shared df_ads sorted by one timestamp column (UTC).
+
+    Built once per dataset version, so any time window resolves with two
+    binary searches instead of comparing every row's timestamp.
+    """
+
+    def __init__(self, frame, column='status_change_date'):
+        times = to_utc_nanoseconds(frame[column]) if column in frame.columns else np.empty(0, dtype=np.int64)
+        present = np.flatnonzero(times != np.iinfo(np.int64).min)
+        self._order = present[np.argsort(times[present], kind='stable')]
+        self._sorted_times = times[self._order]
+
+    def between(self, start, end):
+        """Positions of the rows with start <= time < end (Timestamps, naive taken as UTC, or ns), in time order"""
+        # Timestamp.value is nanoseconds since the epoch in UTC, reading naive values as UTC
+        lo, hi = np.searchsorted(self._sorted_times, [pd.Timestamp(start).value, pd.Timestamp(end).value])
+        return self._order[lo:hi]
+
+
+def _distinct_values(values):
+    """Integer codes (-1 for missing) and the text of the distinct values they index; dates by their day"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories.astype(str)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        codes, days = pd.factorize(values.dt.normalize())
+        return codes, pd.DatetimeIndex(days).strftime('%Y-%m-%d')
+    codes, uniques = pd.factorize(values)
+    return codes, pd.Index(uniques).astype(str)
+
+
+def search_mask(frame, text, columns=None):
+    """
+    Boolean mask of the rows where any of `columns` (default: all) contains `text`, ignoring case.
+
+    Each distinct value of a column is matched once and the result is spread
+    to the rows through their codes, so categoricals cost one check per category.
+    """
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in columns if columns is not None else frame.columns:
+        codes, labels = _distinct_values(frame[column])
+        matched = np.append(labels.str.contains(text, case=False, regex=False), False)
+        mask |= matched[codes]
+    return mask
+
+
+def sort_order(frame, column, ascending=True):
+    """Row positions of `frame` in stable `column` order, missing values last"""
+    values = frame[column].reset_index(drop=True)
+    return values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+class SharedAdsDataset:
+    """
+    One prepared, read-only version of df_ads referenced by every session.
+
+    Sessions must never mutate `frame`; per-session filtering keeps only row
+    positions and materializes the selected rows with `take`.
+    """
+
+    def __init__(self, frame, version, built_at):
+        self.frame = frame
+        self.version = version
+        self.built_at = built_at
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def derived(self, name, build):
+        """Return `build(frame)`, computed once per dataset version and shared by every session"""
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = build(self.frame)
+            return self._derived[name]
+
+    def take(self, positions):
+        """Return the rows at `positions`, or the shared frame itself when every row is selected"""
+        if positions is None or len(positions) == len(self.frame):
+            return self.frame
+        return self.frame.take(positions)
+
+
+class SharedDatasetCache:
+    """
+    Builds a SharedAdsDataset once per distinct source frame and hands the same object to every caller.
+
+    The source is only remembered through a weak reference, so the raw frame
+    can be freed once its loader lets go of it and only the prepared frame stays.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._source_ref = None
+        self.current = None
+        self.version = 0
+
+    def publish(self, source, prepare=None):
+        """Return the dataset for `source`, running `prepare(source)` only when the source changed"""
+        with self._lock:
+            if self.current is not None and self._source_ref is not None and self._source_ref() is source:
+                return self.current
+            frame = prepare(source) if prepare is not None else source
+            self.version += 1
+            self.current = SharedAdsDataset(frame, self.version, time.time())
+            self._source_ref = weakref.ref(source)
+            logging.info(f"Published shared ads dataset v{self.version} with {len(frame)} rows")
+            return self.current
+
+
+def _canonical_filter_value(value):
+    """JSON-safe form of a widget value in which equivalent selections compare equal"""
+    if value is None or (isinstance(value, (list, tuple, set)) and len(value) == 0) or value == "":
+        return None
+    if isinstance(value, (date, pd.Timestamp)):
+        return value.isoformat()
+    if isinstance(value, (list, set)):
+        # Multiselect order does not change the result
+        return sorted(str(item) for item in value)
+    if isinstance(value, tuple):
+        return [_canonical_filter_value(item) for item in value]
+    return str(value)
+
+
+def derived_result_key(version, name, **state):
+    """Cache key for result `name` of dataset `version` under a filter state, e.g. the widget values"""
+    canonical = json.dumps({k: _canonical_filter_value(v) for k, v in state.items()}, sort_keys=True)
+    return f"v{version}:{name}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]}"
+
+
+def result_nbytes(value):
+    """Approximate memory held by a derived result: arrays and pandas objects, inside tuples, lists and dicts"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, (tuple, list)):
+        return sum(result_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(result_nbytes(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class DerivedResultCache:
+    """
+    Bounded LRU cache of results derived from a dataset version and filter state.
+
+    Shared by every session, so a view computed once (filtered rows, overview
+    metrics, grouped tables, summary) is reused until it is evicted. Keys from
+    `derived_result_key` include the dataset version, so results of an old
+    version are never served and simply age out. Entries are evicted beyond
+    `max_entries` or `max_bytes` (by `result_nbytes`), except the one just
+    stored. Cached values are shared and must not be mutated. Sessions missing
+    the same key at the same time share one build; `flights.stats["shared"]`
+    counts the builds avoided.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.nbytes = 0
+        self.flights = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, build):
+        """Return the cached value for `key`, calling `build()` to compute it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._entries[key]
+            self.stats["misses"] += 1
+
+        def build_and_store():
+            with self._lock:
+                # Built by another session between our miss and this flight
+                if key in self._entries:
+                    return self._entries[key]
+            value = build()
+            size = result_nbytes(value)
+            with self._lock:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                self.nbytes += size - self._sizes.get(key, 0)
+                self._sizes[key] = size
+                while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+                    evicted, _ = self._entries.popitem(last=False)
+                    self.nbytes -= self._sizes.pop(evicted)
+                    self.stats["evictions"] += 1
+            return value
+
+        return self.flights.do(key, build_and_store)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.nbytes = 0
@@ -6,12 +6,49 @@ import numpy as np
 import streamlit as st
 from streamlit_option_menu import option_menu
 import psycopg2
-from functools import wraps
+from functools import partial, wraps
 import hmac
 import boto3
 import json
 import logging
 import os
+from ads_exports import ExportManager, write_csv, write_excel, write_parquet
+from ads_metrics import (
+    build_account_summary,
+    disapproval_cube,
+    filter_disapproval_cube,
+    rollup_disapprovals,
+    top_group,
+    window_counts,
+)
+from ads_store import (
+    AD_LINK_TEMPLATE,
+    AdsFilterIndex,
+    BackgroundRefresher,
+    DerivedResultCache,
+    IncrementalAdsCache,
+    PartitionedAdsStore,
+    DAY_COLUMNS,
+    SharedDatasetCache,
+    SingleFlight,
+    SplitAdsLoader,
+    ad_links,
+    apply_ads_schema,
+    date_to_day,
+    day_bounds,
+    derived_result_key,
+    memory_report,
+    normalize_ads_dates,
+    query_hash,
+)
+from aws_secrets import LocalSecretsManagerClient, SecretCache
+from db_utils import (
+    ADS_DATA_DTYPES,
+    ADS_DATE_COLUMNS,
+    RotatingConnectionPool,
+    fetch_dataframe_chunked,
+    fetch_dataframe_copy,
+)
 
 # Suppress Streamlit internal logs
 logging.getLogger("streamlit").setLevel(logging.ERROR)
@@ -28,56 +65,91 @@ logging.getLogger("botocore").setLevel(logging.ERROR)
 # Set environment variable to suppress Streamlit logs
 os.environ["STREAMLIT_LOGGER_LEVEL"] = "error"
 
+# Secrets are cached process-wide; rotated values are picked up in the background
+SECRET_TTL_SECONDS = 3600
+REDSHIFT_SECRET_NAME = "G-streamlit-KAT"
+
 def get_aws_client():
-    """Get AWS client with proper error handling for Streamlit context"""
-    try:
-        return boto3.client(
-            "secretsmanager",
-            region_name=st.secrets["AWS_DEFAULT_REGION"],
-            aws_access_key_id=st.secrets["AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=st.secrets["AWS_SECRET_ACCESS_KEY"]
-        )
-    except Exception as e:
-        st.error(f"Error accessing AWS secrets: {str(e)}")
-        return None
+    """Get the Secrets Manager client, or a local file-backed stand-in when LOCAL_SECRETS_FILE is set"""
+    local_secrets_file = os.environ.get("LOCAL_SECRETS_FILE")
+    if local_secrets_file:
+        return LocalSecretsManagerClient.from_file(local_secrets_file)
+    return boto3.client(
+        "secretsmanager",
+        region_name=st.secrets["AWS_DEFAULT_REGION"],
+        aws_access_key_id=st.secrets["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=st.secrets["AWS_SECRET_ACCESS_KEY"]
+    )
+
+@st.cache_resource
+def get_secret_cache():
+    """Secrets Manager lookups shared by every session and rerun"""
+    return SecretCache(get_aws_client, ttl=SECRET_TTL_SECONDS)
 
 def get_secret(secret_name):
     """Retrieve secret value from AWS Secrets Manager"""
-    client = get_aws_client()
-    if client is None:
-        return None
-    
     try:
-        response = client.get_secret_value(SecretId=secret_name)
-        return json.loads(response["SecretString"])
+        return get_secret_cache().get(secret_name)
     except Exception as e:
         st.error(f"Error retrieving secret '{secret_name}': {str(e)}")
         return None
 
 # Initialize secrets with error handling
-secret = get_secret("G-streamlit-KAT")
+secret = get_secret(REDSHIFT_SECRET_NAME)
 if secret is None:
     st.error("Failed to retrieve database secrets. Please check your AWS configuration.")
     st.stop()
 
-db = secret["db"]
-name = secret["name"]
-passw = secret["passw"]
-server = secret["server"]
-port = secret["port"]
+# Redshift settings are read from the cached secret on every connection (redshift_credentials)
 stripe_key = secret["stripe"]
 
+# Upper bound on concurrent Redshift connections held by this process
+POOL_MAX_CONNECTIONS = 5
+
+# How run_query pulls rows: "stream" (server-side cursor, chunked), "fetchall",
+# or "copy" (COPY ... TO STDOUT bulk export; Postgres only, falls back to "stream")
+FETCH_MODE = "stream"
+STREAM_CHUNK_SIZE = 50000
+
+# df_ads is reloaded by a background thread DATA_REFRESH_LEAD_SECONDS before it is
+# DATA_TTL_SECONDS old; page loads are always served the last good dataset
+DATA_TTL_SECONDS = 3600
+DATA_REFRESH_LEAD_SECONDS = 300
+DATA_RETRY_SECONDS = 60
+
+# "incremental" re-fetches only ads edited since the last load once the hour is up,
+# "partitioned" keeps one on-disk file per status change day and re-fetches only the
+# last PARTITION_HOT_DAYS days, "full" re-runs the whole ads_data_query every hour
+REFRESH_MODE = "incremental"
+INCREMENTAL_FULL_REFRESH_HOURS = 24
+PARTITION_HOT_DAYS = 7
+
+# Load df_ads as ads_fact_query plus the account -> buid dimension queries, run in parallel on
+# pooled connections; the dimensions change rarely and are re-fetched every DIMENSION_TTL_SECONDS
+SPLIT_QUERY_LOADING = True
+DIMENSION_TTL_SECONDS = 24 * 3600
+
+# On-disk Arrow snapshot of df_ads; a restarted process serves it while refreshing in the background
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "df_ads.arrow")
+PARTITION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "df_ads_partitions")
+
+# Filtered rows, overview metrics, grouped tables and summaries kept across sessions (LRU)
+DERIVED_CACHE_ENTRIES = 128
+DERIVED_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Raw Dump downloads are generated on request by background workers and kept for reuse
+EXPORT_WORKERS = 2
+EXPORT_CACHE_ENTRIES = 8
+EXPORT_POLL_SECONDS = 0.5
+
 
 st.set_page_config( page_title = "Ads Dashboard",
     page_icon=":bar_chart:",
     layout="wide",
     initial_sidebar_state="expanded")
 
-# Configure Streamlit to handle larger datasets and improve WebSocket stability
-# This increases the message size limit to handle large dataframes
-st.config.set_option('server.maxMessageSize', 1000)
-
-# Additional WebSocket stability configurations
+# WebSocket stability configurations. No message size override: downloads are served through
+# the media endpoint and no page sends more than one table page or grouped table at a time
 st.config.set_option('server.enableWebsocketCompression', True)
 st.config.set_option('server.enableCORS', False)
 st.config.set_option('server.maxUploadSize', 200)
@@ -86,35 +158,42 @@ st.config.set_option('server.maxUploadSize', 200)
 
 st.write("Successfully connected to the database!")
 
-def redshift_connection(dbname, user, password, host, port):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-
-                connection = psycopg2.connect(
-                    dbname=dbname,
-                    user=user,
-                    password=password,
-                    host=host,
-                    port=port
-                )
+def redshift_credentials():
+    """Connection settings from the current (possibly rotated) Redshift secret"""
+    secret = get_secret_cache().get(REDSHIFT_SECRET_NAME)
+    return dict(dbname=secret["db"], user=secret["name"], password=secret["passw"],
+                host=secret["server"], port=secret["port"])
+
+@st.cache_resource
+def get_connection_pool():
+    """Process-wide Redshift connection pool for the current secret, shared by every Streamlit session"""
+    return RotatingConnectionPool(redshift_credentials, max_size=POOL_MAX_CONNECTIONS)
+
+def redshift_connection(func):
+    """Run `func` on a pooled connection, resolving the credentials on every call rather than once per script run"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+
+            pool = get_connection_pool().get()
 
+            with pool.connection() as connection:
                 cursor = connection.cursor()
 
                 result = func(*args, connection=connection, cursor=cursor, **kwargs)
 
                 cursor.close()
-                connection.close()
 
-                return result
+            return result
 
-            except Exception as e:
-                return None
+        except Exception as e:
+            logging.error(f"Redshift query failed: {str(e)}")
+            if isinstance(e, psycopg2.OperationalError) and "authentication failed" in str(e):
+                # The password was rotated after the secret was cached; fetch it again on the next call
+                get_secret_cache().invalidate(REDSHIFT_SECRET_NAME)
+            return None
 
-        return wrapper
-
-    return decorator
+    return wrapper
 
 # query = '''
 # SELECT buid,bu.name as business_name,bu.email as email,a.ad_account_id,b.currency,
@@ -415,11 +494,8 @@ def redshift_connection(dbname, user, password, host, port):
 # '''
 
 
-ads_data_query = '''SELECT buid,a.ad_account_id,a.ad_id,ad_status,effective_status,a.created_at,edited_at as status_change_date,error_type,error_description
--- ,spend
- FROM
-(
-SELECT a.ad_account_id,ad_id,ad_status,effective_status,edited_at,a.created_at,ad_review_feedback,error_description,error_type
+# Latest status of every ad in a child ad account: the facts half of ads_data_query
+ads_latest_status_query = '''SELECT a.ad_account_id,ad_id,ad_status,effective_status,edited_at,a.created_at,ad_review_feedback,error_description,error_type
  FROM
 (SELECT 
   fad.ad_account_id,
@@ -455,7 +531,13 @@ JOIN zocket_global.fb_child_ad_accounts fcaa
   ON fad.ad_account_id = fcaa.ad_account_id
 )a
 where rw=1
-) a
+'''
+
+ads_data_query = f'''SELECT buid,a.ad_account_id,a.ad_id,ad_status,effective_status,a.created_at,edited_at as status_change_date,error_type,error_description
+-- ,spend
+ FROM
+(
+{ads_latest_status_query}) a
 -- left join
 -- ( select ad_id,sum(spend)spend  from zocket_global.fb_ads_age_gender_metrics_v3 
 -- group by 1)b on a.ad_id=b.ad_id
@@ -470,9 +552,45 @@ left join
      json_extract_path_text(json_extract_array_element_text(business_user_ids, 0), 'role') = 'owner' )bp on e.app_business_id=bp.id
 '''
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour to reduce database load
-@redshift_connection(db,name,passw,server,port)
-def execute_query(connection, cursor,query):
+# ads_data_query without buid; SplitAdsLoader resolves it from account_buid_queries instead
+ads_fact_query = f'''SELECT a.ad_account_id,a.ad_id,ad_status,effective_status,a.created_at,edited_at as status_change_date,error_type,error_description
+ FROM
+(
+{ads_latest_status_query}) a
+'''
+
+# The joins ads_data_query makes after the facts: account -> business manager -> business -> owner buid
+account_buid_queries = {
+    "accounts": "SELECT ad_account_id, app_business_manager_id FROM zocket_global.fb_child_ad_accounts",
+    "business_managers": "SELECT id, app_business_id FROM zocket_global.fb_child_business_managers",
+    "business_owners": '''SELECT id,
+     json_extract_path_text(json_extract_array_element_text(business_user_ids, 0), 'business_user_id') AS buid
+ FROM
+     zocket_global.business_profile
+ WHERE
+     json_extract_path_text(json_extract_array_element_text(business_user_ids, 0), 'role') = 'owner'
+''',
+}
+
+@redshift_connection
+def run_query(connection, cursor,query, _on_chunk=None):
+
+    if FETCH_MODE == "copy":
+        try:
+            result = fetch_dataframe_copy(connection, query, dtype=ADS_DATA_DTYPES, parse_dates=ADS_DATE_COLUMNS)
+            # The cursor path returns python dates for the DATE() columns; keep that shape
+            for column in ADS_DATE_COLUMNS:
+                if column in result.columns:
+                    result[column] = result[column].dt.date
+            return result
+        except psycopg2.Error as e:
+            # Redshift does not support COPY ... TO STDOUT; fall back to streaming
+            logging.warning(f"COPY fetch failed, falling back to streaming: {str(e)}")
+            connection.rollback()
+
+    if FETCH_MODE in ("stream", "copy"):
+        # Server-side cursor, built column by column so row tuples never pile up
+        return fetch_dataframe_chunked(connection, query, chunk_size=STREAM_CHUNK_SIZE, on_chunk=_on_chunk)
 
     cursor.execute(query)
     column_names = [desc[0] for desc in cursor.description]
@@ -480,61 +598,242 @@ def execute_query(connection, cursor,query):
 
     return result
 
+@st.cache_resource
+def get_query_flights():
+    """Redshift queries in flight, shared by every session and the background refresher"""
+    return SingleFlight()
+
+def fetch_query(query, _on_chunk=None):
+    """run_query, joining an identical query that is already in flight instead of running it again"""
+    flights = get_query_flights()
+    result = flights.do(query_hash(query), lambda: run_query(query=query, _on_chunk=_on_chunk))
+    logging.info(f"Query single-flight: {flights.stats}")
+    return result
+
+def build_ads_delta_query(since, query=ads_data_query):
+    """`query` (ads_data_query or ads_fact_query) restricted to ads edited on or after `since`"""
+    anchor = "  ON fad.ad_account_id = fcaa.ad_account_id\n)a"
+    if anchor not in query:
+        raise ValueError("ads_data_query no longer matches the delta filter anchor")
+    since = pd.Timestamp(since).date()
+    return query.replace(
+        anchor,
+        f"  ON fad.ad_account_id = fcaa.ad_account_id\nWHERE DATE(fad.edited_at) >= DATE '{since.isoformat()}'\n)a",
+        1
+    )
+
+@st.cache_resource
+def get_split_ads_loader():
+    """Fact/dimension split loader whose account -> buid map is shared by every session"""
+    return SplitAdsLoader(
+        account_buid_queries,
+        dimension_ttl=DIMENSION_TTL_SECONDS,
+        max_workers=len(account_buid_queries)
+    )
+
+def fetch_ads(since=None, _on_chunk=None):
+    """df_ads rows edited on or after `since` (all of them if None), as split queries if SPLIT_QUERY_LOADING"""
+    if not SPLIT_QUERY_LOADING:
+        return fetch_query(
+            query=ads_data_query if since is None else build_ads_delta_query(since),
+            _on_chunk=_on_chunk
+        )
+    loader = get_split_ads_loader()
+    result = loader.load(
+        ads_fact_query if since is None else build_ads_delta_query(since, ads_fact_query),
+        fetch_query,
+        on_chunk=_on_chunk
+    )
+    logging.info(f"Split ads load: {loader.stats}")
+    return result
+
+@st.cache_resource
+def get_incremental_ads_cache():
+    """Last loaded df_ads and its watermark, shared by every session"""
+    return IncrementalAdsCache(
+        # Already due whenever the background refresher asks for a reload
+        ttl=DATA_TTL_SECONDS - DATA_REFRESH_LEAD_SECONDS,
+        full_refresh_after=INCREMENTAL_FULL_REFRESH_HOURS * 3600,
+        snapshot_path=SNAPSHOT_PATH,
+        query=ads_data_query
+    )
+
+@st.cache_resource
+def get_partitioned_ads_store():
+    """Day-partitioned on-disk df_ads cache, shared by every session"""
+    return PartitionedAdsStore(
+        PARTITION_DIR,
+        hot_days=PARTITION_HOT_DAYS,
+        ttl=DATA_TTL_SECONDS - DATA_REFRESH_LEAD_SECONDS,
+        query=ads_data_query
+    )
+
+def load_ads_data(_on_chunk=None, wait=False):
+    """
+    Load df_ads using the configured REFRESH_MODE.
+
+    Without `wait` a cache holding data on disk serves it at once and refreshes
+    itself in the background; with `wait` an expired cache is refreshed first.
+    """
+    if REFRESH_MODE == "partitioned":
+        store = get_partitioned_ads_store()
+        load_range = lambda since: fetch_ads(since, _on_chunk=_on_chunk if since is None else None)
+        if wait:
+            store.refresh(load_range)
+        return store.get(load_range=load_range)
+    if REFRESH_MODE == "incremental":
+        cache = get_incremental_ads_cache()
+        load_full = lambda: fetch_ads(_on_chunk=_on_chunk)
+        load_delta = lambda since: fetch_ads(since)
+        if wait:
+            return cache.refresh(load_full=load_full, load_delta=load_delta)
+        return cache.get(load_full=load_full, load_delta=load_delta)
+    return fetch_ads(_on_chunk=_on_chunk)
+
+def ads_data_as_of(dataset):
+    """When the configured REFRESH_MODE last fetched the data from Redshift (epoch seconds), if it keeps track"""
+    if REFRESH_MODE == "partitioned":
+        manifest = get_partitioned_ads_store().manifest
+        return manifest["refreshed_at"] if manifest else None
+    if REFRESH_MODE == "incremental":
+        return get_incremental_ads_cache().loaded_at
+    return None
+
+def prepare_ads_frame(source):
+    """Build the shared df_ads once per loaded dataset, adding derived columns"""
+    frame = source.copy()
+    
+    # Parse dates once and precompute day numbers so date filters are integer comparisons
+    frame = normalize_ads_dates(frame)
+    
+    # Categorical columns and integer ad_id make every filter and groupby cheaper
+    usage_before = frame.memory_usage(deep=True, index=False)
+    frame = apply_ads_schema(frame)
+    logging.info(f"df_ads memory by column:\n{memory_report(usage_before, frame.memory_usage(deep=True, index=False))}")
+    
+    # ad_link is not stored; ad_links builds it for the rows actually displayed or exported
+    return frame
+
+@st.cache_resource
+def get_shared_dataset_cache():
+    """Prepared, read-only df_ads referenced by every session without copying"""
+    return SharedDatasetCache()
+
+def load_ads_dataset(_on_chunk=None, background=False):
+    """Load df_ads and publish it as the shared, prepared dataset; None if nothing could be loaded"""
+    source = load_ads_data(_on_chunk=_on_chunk, wait=background)
+    if source is None or source.empty:
+        return None
+    return get_shared_dataset_cache().publish(source, prepare=prepare_ads_frame)
+
+@st.cache_resource
+def get_ads_refresher():
+    """Last good shared dataset, reloaded ahead of expiry by a background thread shared by every session"""
+    return BackgroundRefresher(
+        load_ads_dataset,
+        ttl=DATA_TTL_SECONDS,
+        lead=DATA_REFRESH_LEAD_SECONDS,
+        retry_after=DATA_RETRY_SECONDS,
+        as_of=ads_data_as_of,
+    )
+
+@st.cache_resource
+def get_derived_result_cache():
+    """Results derived from df_ads, keyed by dataset version and filter state and shared by every session"""
+    return DerivedResultCache(max_entries=DERIVED_CACHE_ENTRIES, max_bytes=DERIVED_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def get_export_manager():
+    """Background workers and finished Raw Dump downloads shared by every session"""
+    return ExportManager(max_workers=EXPORT_WORKERS, max_entries=EXPORT_CACHE_ENTRIES)
+
+@st.fragment(run_every=EXPORT_POLL_SECONDS)
+def export_progress(job, label):
+    """Progress of a running export, polled on its own so the rest of the page stays usable"""
+    if job.running:
+        st.progress(job.progress, text=f"Preparing {label}... {job.progress:.0%}")
+        return
+    if job.error:
+        # Failed jobs are dropped by the manager; keep the message for the rerun below
+        st.session_state[f"export_error_{job.key}"] = job.error
+    # Rerun the page once so the download button replaces the progress bar
+    st.rerun()
+
+def export_download_button(export_key, build, label, icon, file_name, mime, help_text):
+    """Download button for an export generated only on request, in the background, with progress"""
+    error = st.session_state.pop(f"export_error_{export_key}", None)
+    if error:
+        st.error(f"Could not prepare the {label} download: {error}")
+    
+    export_manager = get_export_manager()
+    job = export_manager.get(export_key)
+    if job is None:
+        if not st.button(f"{icon} Prepare {label}", key=f"prepare_{export_key}", help=help_text):
+            return
+        job = export_manager.submit(export_key, build)
+    
+    if job.running:
+        export_progress(job, label)
+        return
+    
+    if job.error:
+        st.error(f"Could not prepare the {label} download: {job.error}")
+        return
+    st.download_button(
+        label=f"{icon} Download {label}",
+        data=job.data,
+        file_name=file_name,
+        mime=mime,
+        help=help_text,
+        key=f"download_{export_key}",
+    )
+
 # df = execute_query(query=query)
 # df = execute_query(query=query)
 # df_yesterday = execute_query(query=yesterday_query)
 
-# Load data with error handling and progress indication
+# Load data with error handling; only the first load in this process shows progress and waits
 try:
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    status_text.text("Connecting to database...")
-    progress_bar.progress(25)
-    
-    df_ads = execute_query(query=ads_data_query)
-    progress_bar.progress(75)
-    
-    status_text.text("Processing data...")
+    ads_refresher = get_ads_refresher()
+    if ads_refresher.ready:
+        ads_dataset = ads_refresher.get()
+    else:
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        
+        status_text.text("Connecting to database...")
+        progress_bar.progress(25)
+        
+        def report_rows_fetched(rows_so_far):
+            status_text.text(f"Fetching data... {rows_so_far:,} rows loaded")
+        
+        ads_dataset = ads_refresher.get(_on_chunk=report_rows_fetched)
+        logging.info(f"Dataset warm-up single-flight: {ads_refresher.warm_up_stats}")
+        progress_bar.empty()
+        status_text.empty()
     
-    if df_ads is None or df_ads.empty:
+    if ads_dataset is None:
         st.error("Failed to load ads data. Please check your database connection.")
         st.stop()
     
-    progress_bar.progress(100)
-    status_text.text("Data loaded successfully!")
+    # Shared across sessions: never mutate df_ads, select rows by position instead
+    df_ads = ads_dataset.frame
+    filter_index = ads_dataset.derived('filter_index', AdsFilterIndex)
+    derived_results = get_derived_result_cache()
+    logging.info(f"Derived results: {derived_results.stats}, single-flight: {derived_results.flights.stats}")
     
-    # Clear progress indicators after a short delay
-    import time
-    time.sleep(0.5)
-    progress_bar.empty()
-    status_text.empty()
+    data_as_of = pd.Timestamp(ads_refresher.loaded_at, unit='s', tz='UTC')
+    st.caption(
+        f"🕒 Data as of {data_as_of.strftime('%Y-%m-%d %H:%M')} UTC, "
+        f"refreshed in the background every {(DATA_TTL_SECONDS - DATA_REFRESH_LEAD_SECONDS) // 60} minutes"
+    )
+    if ads_refresher.last_error:
+        st.warning(f"⚠️ The latest data refresh failed, showing the last good data: {ads_refresher.last_error}")
     
 except Exception as e:
     st.error(f"Error loading data: {str(e)}")
     st.stop()
 
-# Function to generate Facebook Ads Manager URL
-def generate_ad_link(ad_account_id, ad_id):
-    """
-    Generate Facebook Ads Manager URL for a specific ad.
-    Removes 'act_' prefix from ad_account_id and uses the ad_id directly.
-    """
-    # Remove 'act_' prefix if it exists
-    clean_account_id = ad_account_id.replace('act_', '') if ad_account_id.startswith('act_') else ad_account_id
-    
-    # Generate the URL
-    url = f"https://adsmanager.facebook.com/adsmanager/manage/ads/edit/standalone?act={clean_account_id}&columns=name%2Cdelivery%2Crecommendations_guidance%2Ccampaign_name%2Cbid%2Cbudget%2Clast_significant_edit%2Cattribution_setting%2Cresults%2Creach%2Cimpressions%2Ccost_per_result%2Cquality_score_organic%2Cquality_score_ectr%2Cquality_score_ecvr%2Cspend%2Cend_time%2Cschedule%2Ccpm%2Cpurchase_roas%3Aomni_purchase%2Cfrequency%2Cactions%3Aomni_purchase%2Ccreated_time&attribution_windows=default&filter_set=CAMPAIGN_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]%1DCAMPAIGN_GROUP_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]%1DADGROUP_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]&selected_ad_ids={ad_id}&sort=created_time~0&current_step=0&ads_manager_write_regions=true&nav_source=no_referrer#"
-    return url
-
-# Add ad_link column to df_ads with error handling
-if not df_ads.empty and 'ad_account_id' in df_ads.columns and 'ad_id' in df_ads.columns:
-    try:
-        df_ads['ad_link'] = df_ads.apply(lambda row: generate_ad_link(row['ad_account_id'], row['ad_id']), axis=1)
-    except Exception as e:
-        st.warning(f"Warning: Could not generate ad links: {str(e)}")
-        df_ads['ad_link'] = "Link unavailable"
-
 # df['Disapproved_Percentage'] = df['disapproved_ads'] / df['total_ads']
 # df['Disapproved_Percentage'] = df['Disapproved_Percentage'].fillna(0)
 # df['Disapproved_Percentage'] = df['Disapproved_Percentage'].apply(lambda x: "0%" if pd.isna(x) or np.isinf(x) or x == 0 else f"{round(x*100):.0f}%")
@@ -577,8 +876,7 @@ try:
         ad_account_id = st.text_input("Enter Ad Account ID", placeholder="e.g., act_123456789")
         
         # Date Filter (for 'created_at' ideally, as that's usually present)
-        date_min = df_ads['created_at'].min() if 'created_at' in df_ads.columns else None
-        date_max = df_ads['created_at'].max() if 'created_at' in df_ads.columns else None
+        date_min, date_max = day_bounds(df_ads['created_day']) if 'created_day' in df_ads.columns else (None, None)
         if date_min is not None and date_max is not None:
             date_range = st.date_input(
                 "Created At Date Range",
@@ -590,13 +888,12 @@ try:
             date_range = None
         
         # Main Status Filter (formerly Ad Status)
-        ad_status_options = df_ads['ad_status'].dropna().unique() if 'ad_status' in df_ads.columns else []
+        ad_status_options = filter_index.options('ad_status')
         selected_ad_status = st.multiselect("Main Status", options=ad_status_options)
 
     with col2:
         # Status Change Date Filter
-        edited_min = df_ads['status_change_date'].min() if 'status_change_date' in df_ads.columns else None
-        edited_max = df_ads['status_change_date'].max() if 'status_change_date' in df_ads.columns else None
+        edited_min, edited_max = day_bounds(df_ads['status_change_day']) if 'status_change_day' in df_ads.columns else (None, None)
         if edited_min is not None and edited_max is not None:
             edited_range = st.date_input(
                 "Status Change Date Range",
@@ -609,58 +906,63 @@ try:
             edited_range = None
         
         # Sub Status Filter (formerly Effective Status)
-        effective_status_options = df_ads['effective_status'].dropna().unique() if 'effective_status' in df_ads.columns else []
+        effective_status_options = filter_index.options('effective_status')
         selected_effective_status = st.multiselect("Sub Status", options=effective_status_options)
         
         # Error Type Filter
-        error_type_options = df_ads['error_type'].dropna().unique() if 'error_type' in df_ads.columns else []
+        error_type_options = filter_index.options('error_type')
         selected_error_type = st.multiselect("Error Type", options=error_type_options)
         
 except Exception as e:
     st.error(f"Error creating filters: {str(e)}")
     st.stop()
 
+# Every widget value; results derived from the filtered rows are cached under this state
+filter_state = dict(
+    ad_account_id=ad_account_id,
+    date_range=date_range,
+    edited_range=edited_range,
+    ad_status=selected_ad_status,
+    effective_status=selected_effective_status,
+    error_type=selected_error_type,
+)
+
 # Apply filters with error handling
 try:
-    filtered_df_ads = df_ads.copy()
-
-    # Ad Account ID validation and filtering
-    if ad_account_id and 'ad_account_id' in df_ads.columns:
-        # Check if the entered ad account ID exists in the data
-        available_accounts = df_ads['ad_account_id'].dropna().unique()
-        if ad_account_id not in available_accounts:
-            st.error(f"Ad Account ID '{ad_account_id}' does not exist. Please check the account ID and try again.")
-            st.info(f"Available account IDs: {', '.join(available_accounts[:10])}{'...' if len(available_accounts) > 10 else ''}")
-            filtered_df_ads = pd.DataFrame()  # Empty dataframe to show no results
-        else:
-            filtered_df_ads = filtered_df_ads[filtered_df_ads['ad_account_id'] == ad_account_id]
-
-    if date_range and 'created_at' in df_ads.columns and not filtered_df_ads.empty:
-        start, end = date_range
-        filtered_df_ads = filtered_df_ads[
-            (filtered_df_ads['created_at'] >= start) &
-            (filtered_df_ads['created_at'] <= end)
-        ]
-
-    if edited_range and 'status_change_date' in df_ads.columns and not filtered_df_ads.empty:
-        start, end = edited_range
-        filtered_df_ads = filtered_df_ads[
-            (filtered_df_ads['status_change_date'] >= start) &
-            (filtered_df_ads['status_change_date'] <= end)
-        ]
-
-    if selected_ad_status and 'ad_status' in df_ads.columns and not filtered_df_ads.empty:
-        filtered_df_ads = filtered_df_ads[filtered_df_ads['ad_status'].isin(selected_ad_status)]
-
-    if selected_effective_status and 'effective_status' in df_ads.columns and not filtered_df_ads.empty:
-        filtered_df_ads = filtered_df_ads[filtered_df_ads['effective_status'].isin(selected_effective_status)]
-
-    if selected_error_type and 'error_type' in df_ads.columns and not filtered_df_ads.empty:
-        filtered_df_ads = filtered_df_ads[filtered_df_ads['error_type'].isin(selected_error_type)]
+    # Filters resolve against indexes built once per dataset version; only the selected rows are ever materialized
+    day_ranges = {}
+    if date_range and len(date_range) == 2:
+        day_ranges['created_day'] = (date_to_day(date_range[0]), date_to_day(date_range[1]))
+    if edited_range and len(edited_range) == 2:
+        day_ranges['status_change_day'] = (date_to_day(edited_range[0]), date_to_day(edited_range[1]))
+
+    # Ad Account ID validation: a hash lookup instead of scanning the unique account ids
+    if ad_account_id and not filter_index.has_account(ad_account_id):
+        available_accounts = filter_index.account_ids
+        st.error(f"Ad Account ID '{ad_account_id}' does not exist. Please check the account ID and try again.")
+        st.info(f"Available account IDs: {', '.join(available_accounts[:10])}{'...' if len(available_accounts) > 10 else ''}")
+
+    filtered_positions = derived_results.get(
+        derived_result_key(ads_dataset.version, 'filtered_positions', **filter_state),
+        lambda: filter_index.resolve(
+            ad_account_id=ad_account_id,
+            day_ranges=day_ranges,
+            values={
+                'ad_status': selected_ad_status,
+                'effective_status': selected_effective_status,
+                'error_type': selected_error_type,
+            },
+        ),
+    )
+    filtered_df_ads = ads_dataset.take(filtered_positions)
         
 except Exception as e:
     st.error(f"Error applying filters: {str(e)}")
-    filtered_df_ads = df_ads.copy()  # Fallback to original data
+    filtered_positions = None
+    filtered_df_ads = df_ads  # Fallback to original data
+
+# Grouped tables offered as extra sheets in the Excel download, filled in by Main Stats
+excel_summary_sheets = {}
 
 # Create tabs for navigation
 tab1, tab2, tab3 = st.tabs(["📊 Main Stats", "📋 Raw Dump", "📈 Summary"])
@@ -674,95 +976,24 @@ with tab1:
         st.subheader("📊 Overview")
 
         if not df_ads.empty:
-            # Calculate date ranges
+            # Every window metric in one pass, plus per-account counts for the top rejected account
             today = pd.Timestamp.now().date()
-            yesterday = today - pd.Timedelta(days=1)
-            thirty_days_ago = today - pd.Timedelta(days=30)
-            current_month_start = pd.Timestamp.now().replace(day=1).date()
-            
-            # Convert date columns to datetime for comparison
-            df_ads_copy = df_ads.copy()
-            if 'created_at' in df_ads_copy.columns:
-                df_ads_copy['created_at'] = pd.to_datetime(df_ads_copy['created_at'])
-            if 'status_change_date' in df_ads_copy.columns:
-                df_ads_copy['status_change_date'] = pd.to_datetime(df_ads_copy['status_change_date'])
-            
-            # Calculate metrics
-            total_ads = len(df_ads)
-            total_rejected = len(df_ads[df_ads['ad_status'] == 'DISAPPROVED'])
-            
-            # Calculate adspends metrics
-            # total_disapproved_adspends = df_ads[df_ads['ad_status'] == 'DISAPPROVED']['spend'].sum() if 'spend' in df_ads.columns else 0
-            # total_approved_adspends = df_ads[df_ads['ad_status'] == 'APPROVED']['spend'].sum() if 'spend' in df_ads.columns else 0
-            
-            # Yesterday metrics
-            yesterday_ads = len(df_ads_copy[
-                (df_ads_copy['created_at'].dt.date == yesterday) 
-            ])
-            yesterday_rejected = len(df_ads_copy[
-                (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                 (df_ads_copy['status_change_date'].dt.date == yesterday)
-            ])
-            
-            # Yesterday adspends metrics
-            # yesterday_disapproved_adspends = df_ads_copy[
-            #     (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-            #     (df_ads_copy['status_change_date'].dt.date == yesterday)
-            # ]['spend'].sum() if 'spend' in df_ads_copy.columns else 0
-            # 
-            # yesterday_approved_adspends = df_ads_copy[
-            #     (df_ads_copy['ad_status'] == 'APPROVED') &
-            #     (df_ads_copy['created_at'].dt.date == yesterday)
-            # ]['spend'].sum() if 'spend' in df_ads_copy.columns else 0
-            
-            # Current month metrics
-            current_month_ads = len(df_ads_copy[
-                df_ads_copy['created_at'].dt.date >= current_month_start
-            ])
-            current_month_rejected = len(df_ads_copy[
-                (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                (df_ads_copy['status_change_date'].dt.date >= current_month_start)
-            ])
-            
-            # Current month adspends metrics
-            # current_month_disapproved_adspends = df_ads_copy[
-            #     (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-            #     (df_ads_copy['status_change_date'].dt.date >= current_month_start)
-            # ]['spend'].sum() if 'spend' in df_ads_copy.columns else 0
-            # 
-            # current_month_approved_adspends = df_ads_copy[
-            #     (df_ads_copy['ad_status'] == 'APPROVED') &
-            #     (df_ads_copy['created_at'].dt.date >= current_month_start)
-            # ]['spend'].sum() if 'spend' in df_ads_copy.columns else 0
-            
-            # Last 30 days metrics
-            last_30_days_ads = len(df_ads_copy[
-                df_ads_copy['created_at'].dt.date >= thirty_days_ago
-            ])
-            last_30_days_rejected = len(df_ads_copy[
-                (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                (df_ads_copy['status_change_date'].dt.date >= thirty_days_ago)
-            ])
-            
-            # Last 30 days adspends metrics
-            # last_30_days_disapproved_adspends = df_ads_copy[
-            #     (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-            #     (df_ads_copy['status_change_date'].dt.date >= thirty_days_ago)
-            # ]['spend'].sum() if 'spend' in df_ads_copy.columns else 0
-            # 
-            # last_30_days_approved_adspends = df_ads_copy[
-            #     (df_ads_copy['ad_status'] == 'APPROVED') &
-            #     (df_ads_copy['created_at'].dt.date >= thirty_days_ago)
-            # ]['spend'].sum() if 'spend' in df_ads_copy.columns else 0
-            
-            # Top rejected account yesterday
-            yesterday_rejected_by_account = df_ads_copy[
-                (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                 (df_ads_copy['status_change_date'].dt.date == yesterday)
-            ].groupby('ad_account_id').size().sort_values(ascending=False)
+            overview_counts, (top_rejected_account_yesterday, top_rejected_count_yesterday) = derived_results.get(
+                derived_result_key(ads_dataset.version, 'overview', today=today),
+                lambda: (
+                    window_counts(df_ads, today),
+                    top_group(window_counts(df_ads, today, by='ad_account_id'), 'rejected_yesterday'),
+                ),
+            )
             
-            top_rejected_account_yesterday = yesterday_rejected_by_account.index[0] if len(yesterday_rejected_by_account) > 0 else "None"
-            top_rejected_count_yesterday = yesterday_rejected_by_account.iloc[0] if len(yesterday_rejected_by_account) > 0 else 0
+            total_ads = overview_counts['published_lifetime']
+            total_rejected = overview_counts['rejected_lifetime']
+            yesterday_ads = overview_counts['published_yesterday']
+            yesterday_rejected = overview_counts['rejected_yesterday']
+            current_month_ads = overview_counts['published_current_month']
+            current_month_rejected = overview_counts['rejected_current_month']
+            last_30_days_ads = overview_counts['published_last_30_days']
+            last_30_days_rejected = overview_counts['rejected_last_30_days']
             
             # Display metrics in columns
             col1, col2, col3, col4 = st.columns(4)
@@ -811,95 +1042,27 @@ with tab1:
         if filters_applied and not filtered_df_ads.empty:
             st.subheader("🔍 Filtered Overview")
             
-            # Calculate date ranges
+            # Same engine over the filtered row positions, without materializing the rows
             today = pd.Timestamp.now().date()
-            yesterday = today - pd.Timedelta(days=1)
-            thirty_days_ago = today - pd.Timedelta(days=30)
-            current_month_start = pd.Timestamp.now().replace(day=1).date()
-            
-            # Convert date columns to datetime for comparison
-            filtered_df_ads_copy = filtered_df_ads.copy()
-            if 'created_at' in filtered_df_ads_copy.columns:
-                filtered_df_ads_copy['created_at'] = pd.to_datetime(filtered_df_ads_copy['created_at'])
-            if 'status_change_date' in filtered_df_ads_copy.columns:
-                filtered_df_ads_copy['status_change_date'] = pd.to_datetime(filtered_df_ads_copy['status_change_date'])
-            
-            # Calculate filtered metrics
-            filtered_total_ads = len(filtered_df_ads)
-            filtered_total_rejected = len(filtered_df_ads[filtered_df_ads['ad_status'] == 'DISAPPROVED'])
-            
-            # Calculate filtered adspends metrics
-            # filtered_total_disapproved_adspends = filtered_df_ads[filtered_df_ads['ad_status'] == 'DISAPPROVED']['spend'].sum() if 'spend' in filtered_df_ads.columns else 0
-            # filtered_total_approved_adspends = filtered_df_ads[filtered_df_ads['ad_status'] == 'APPROVED']['spend'].sum() if 'spend' in filtered_df_ads.columns else 0
-            
-            # Yesterday metrics for filtered data
-            filtered_yesterday_ads = len(filtered_df_ads_copy[
-                (filtered_df_ads_copy['created_at'].dt.date == yesterday)
-            ])
-            filtered_yesterday_rejected = len(filtered_df_ads_copy[
-                (filtered_df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                 (filtered_df_ads_copy['status_change_date'].dt.date == yesterday)
-            ])
-            
-            # Yesterday adspends metrics for filtered data
-            # filtered_yesterday_disapproved_adspends = filtered_df_ads_copy[
-            #     (filtered_df_ads_copy['ad_status'] == 'DISAPPROVED') &
-            #     (filtered_df_ads_copy['status_change_date'].dt.date == yesterday)
-            # ]['spend'].sum() if 'spend' in filtered_df_ads_copy.columns else 0
-            # 
-            # filtered_yesterday_approved_adspends = filtered_df_ads_copy[
-            #     (filtered_df_ads_copy['ad_status'] == 'APPROVED') &
-            #     (filtered_df_ads_copy['created_at'].dt.date == yesterday)
-            # ]['spend'].sum() if 'spend' in filtered_df_ads_copy.columns else 0
-            
-            # Current month metrics for filtered data
-            filtered_current_month_ads = len(filtered_df_ads_copy[
-                filtered_df_ads_copy['created_at'].dt.date >= current_month_start
-            ])
-            filtered_current_month_rejected = len(filtered_df_ads_copy[
-                (filtered_df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                (filtered_df_ads_copy['status_change_date'].dt.date >= current_month_start)
-            ])
-            
-            # Current month adspends metrics for filtered data
-            # filtered_current_month_disapproved_adspends = filtered_df_ads_copy[
-            #     (filtered_df_ads_copy['ad_status'] == 'DISAPPROVED') &
-            #     (filtered_df_ads_copy['status_change_date'].dt.date >= current_month_start)
-            # ]['spend'].sum() if 'spend' in filtered_df_ads_copy.columns else 0
-            # 
-            # filtered_current_month_approved_adspends = filtered_df_ads_copy[
-            #     (filtered_df_ads_copy['ad_status'] == 'APPROVED') &
-            #     (filtered_df_ads_copy['created_at'].dt.date >= current_month_start)
-            # ]['spend'].sum() if 'spend' in filtered_df_ads_copy.columns else 0
-            
-            # Last 30 days metrics for filtered data
-            filtered_last_30_days_ads = len(filtered_df_ads_copy[
-                filtered_df_ads_copy['created_at'].dt.date >= thirty_days_ago
-            ])
-            filtered_last_30_days_rejected = len(filtered_df_ads_copy[
-                (filtered_df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                (filtered_df_ads_copy['status_change_date'].dt.date >= thirty_days_ago)
-            ])
-            
-            # Last 30 days adspends metrics for filtered data
-            # filtered_last_30_days_disapproved_adspends = filtered_df_ads_copy[
-            #     (filtered_df_ads_copy['ad_status'] == 'DISAPPROVED') &
-            #     (filtered_df_ads_copy['status_change_date'].dt.date >= thirty_days_ago)
-            # ]['spend'].sum() if 'spend' in filtered_df_ads_copy.columns else 0
-            # 
-            # filtered_last_30_days_approved_adspends = filtered_df_ads_copy[
-            #     (filtered_df_ads_copy['ad_status'] == 'APPROVED') &
-            #     (filtered_df_ads_copy['created_at'].dt.date >= thirty_days_ago)
-            # ]['spend'].sum() if 'spend' in filtered_df_ads_copy.columns else 0
-            
-            # Top rejected account yesterday for filtered data
-            filtered_yesterday_rejected_by_account = filtered_df_ads_copy[
-                (filtered_df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                 (filtered_df_ads_copy['status_change_date'].dt.date == yesterday)
-            ].groupby('ad_account_id').size().sort_values(ascending=False)
+            filtered_counts, (filtered_top_rejected_account_yesterday, filtered_top_rejected_count_yesterday) = derived_results.get(
+                derived_result_key(ads_dataset.version, 'filtered_overview', today=today, **filter_state),
+                lambda: (
+                    window_counts(df_ads, today, positions=filtered_positions),
+                    top_group(
+                        window_counts(df_ads, today, by='ad_account_id', positions=filtered_positions),
+                        'rejected_yesterday',
+                    ),
+                ),
+            )
             
-            filtered_top_rejected_account_yesterday = filtered_yesterday_rejected_by_account.index[0] if len(filtered_yesterday_rejected_by_account) > 0 else "None"
-            filtered_top_rejected_count_yesterday = filtered_yesterday_rejected_by_account.iloc[0] if len(filtered_yesterday_rejected_by_account) > 0 else 0
+            filtered_total_ads = filtered_counts['published_lifetime']
+            filtered_total_rejected = filtered_counts['rejected_lifetime']
+            filtered_yesterday_ads = filtered_counts['published_yesterday']
+            filtered_yesterday_rejected = filtered_counts['rejected_yesterday']
+            filtered_current_month_ads = filtered_counts['published_current_month']
+            filtered_current_month_rejected = filtered_counts['rejected_current_month']
+            filtered_last_30_days_ads = filtered_counts['published_last_30_days']
+            filtered_last_30_days_rejected = filtered_counts['rejected_last_30_days']
             
             # Display filtered metrics in columns
             col1, col2, col3, col4 = st.columns(4)
@@ -940,81 +1103,95 @@ with tab1:
         # Grouped Tables Section
         st.subheader("📈 Grouped Analysis")
         
+        def build_grouped_tables():
+            """The six Grouped Analysis tables, rolled up from one (account, date, error type) count cube"""
+            # The unfiltered cube is built once per dataset version; filters on its own dimensions
+            # just select cells, other filters rebuild it from the filtered rows.
+            created_range_filtered = bool(date_range) and tuple(date_range) != (date_min, date_max)
+            if selected_effective_status or created_range_filtered:
+                disapproval_counts = disapproval_cube(df_ads, positions=filtered_positions)
+            else:
+                disapproval_counts = ads_dataset.derived('disapproval_cube', disapproval_cube)
+                if selected_ad_status and 'DISAPPROVED' not in selected_ad_status:
+                    disapproval_counts = disapproval_counts.iloc[0:0]
+                edited_day_range = None
+                if edited_range and len(edited_range) == 2:
+                    edited_day_range = (date_to_day(edited_range[0]), date_to_day(edited_range[1]))
+                disapproval_counts = filter_disapproval_cube(
+                    disapproval_counts,
+                    ad_account_id=ad_account_id,
+                    day_range=edited_day_range,
+                    error_types=selected_error_type,
+                )
+            
+            return {
+                # By status_change_date, sorted by status_change_date desc
+                'date': rollup_disapprovals(disapproval_counts, ['status_change_date']).sort_index(ascending=False),
+                # By status_change_date and error_type, sorted by status_change_date desc
+                'date_error': (
+                    rollup_disapprovals(disapproval_counts, ['status_change_date', 'error_type'])
+                    .sort_index(level='status_change_date', ascending=False)
+                ),
+                'account': rollup_disapprovals(disapproval_counts, ['ad_account_id']),
+                'account_error': rollup_disapprovals(disapproval_counts, ['ad_account_id', 'error_type']),
+                # Total disapproved ads per account per date
+                'account_date': (
+                    rollup_disapprovals(disapproval_counts, ['ad_account_id', 'status_change_date'])
+                    .sort_index(level='status_change_date', ascending=False)
+                ),
+                # Total disapproved ads per account, date and error type
+                'account_date_error': (
+                    rollup_disapprovals(disapproval_counts, ['ad_account_id', 'status_change_date', 'error_type'])
+                    .sort_index(level='status_change_date', ascending=False)
+                ),
+            }
+        
+        grouped_tables = derived_results.get(
+            derived_result_key(ads_dataset.version, 'grouped_tables', **filter_state), build_grouped_tables
+        )
+        excel_summary_sheets = {
+            'By Status Change Date': grouped_tables['date'],
+            'By Date and Error Type': grouped_tables['date_error'],
+            'By Ad Account': grouped_tables['account'],
+            'By Account and Error Type': grouped_tables['account_error'],
+            'By Account and Date': grouped_tables['account_date'],
+            'By Account, Date, Error Type': grouped_tables['account_date_error'],
+        }
+        
         # Arrange tables side by side using Streamlit columns
         col1, col2 = st.columns(2)
 
         with col1:
-            # Grouped data by status_change_date of disapproved ads, sorted by status_change_date desc
-            grouped_created_at = (
-                filtered_df_ads[filtered_df_ads['ad_status'] == 'DISAPPROVED']
-                .groupby(['status_change_date'])
-                .agg(no_of_ads=('ad_id', 'count'))
-                .sort_index(ascending=False)
-            )
             st.write("Disapproved Ads Count by Status Change Date")
-            st.dataframe(grouped_created_at, use_container_width=True)
+            st.dataframe(grouped_tables['date'], use_container_width=True)
 
         with col2:
-            # Grouped data by status_change_date and error_type of disapproved ads, sorted by status_change_date desc
-            grouped_created_at_error = (
-                filtered_df_ads[filtered_df_ads['ad_status'] == 'DISAPPROVED']
-                .groupby(['status_change_date', 'error_type'])
-                .agg(no_of_ads=('ad_id', 'count'))
-                .sort_index(level='status_change_date', ascending=False)
-            )
             st.write("Disapproved Ads Count by Status Change Date and Error Type")
-            st.dataframe(grouped_created_at_error, use_container_width=True)
+            st.dataframe(grouped_tables['date_error'], use_container_width=True)
 
         # Arrange grouped tables by ad_account_id and (ad_account_id, error_type) side by side
         col3, col4 = st.columns(2)
 
         with col3:
-            # Grouped data by ad_account_id of disapproved ads
-            grouped_df_ads_account = (
-                filtered_df_ads[filtered_df_ads['ad_status'] == 'DISAPPROVED']
-                .groupby(['ad_account_id'])
-                .agg(no_of_ads=('ad_id', 'count'))
-            )
             st.write("Disapproved Ads Count by Ad Account ID")
-            st.dataframe(grouped_df_ads_account, use_container_width=True)
+            st.dataframe(grouped_tables['account'], use_container_width=True)
 
         with col4:
-            # Grouped data by ad_account_id and error_type of disapproved ads
-            grouped_df_ads_account_error = (
-                filtered_df_ads[filtered_df_ads['ad_status'] == 'DISAPPROVED']
-                .groupby(['ad_account_id', 'error_type'])
-                .agg(no_of_ads=('ad_id', 'count'))
-            )
             st.write("Disapproved Ads Count by Ad Account ID and Error Type")
-            st.dataframe(grouped_df_ads_account_error, use_container_width=True)
+            st.dataframe(grouped_tables['account_error'], use_container_width=True)
         
         # Show two tables side by side:
         # 1. Left: By ad_account_id and status_change_date (total disapproved ads per account per date)
         # 2. Right: By ad_account_id, status_change_date, and error_type (total disapproved ads per account, date, and error type)
-
-        grouped_df_ads_account_created_at = (
-            filtered_df_ads[filtered_df_ads['ad_status'] == 'DISAPPROVED']
-            .groupby(['ad_account_id', 'status_change_date'])
-            .agg(no_of_ads=('ad_id', 'count'))
-            .sort_index(level='status_change_date', ascending=False)
-        )
-
-        grouped_df_ads_account_created_at_error = (
-            filtered_df_ads[filtered_df_ads['ad_status'] == 'DISAPPROVED']
-            .groupby(['ad_account_id', 'status_change_date', 'error_type'])
-            .agg(no_of_ads=('ad_id', 'count'))
-            .sort_index(level='status_change_date', ascending=False)
-        )
-
         col5, col6 = st.columns(2)
 
         with col5:
             st.write("Disapproved Ads Count by Ad Account ID and Status Change Date")
-            st.dataframe(grouped_df_ads_account_created_at, use_container_width=True)
+            st.dataframe(grouped_tables['account_date'], use_container_width=True)
 
         with col6:
             st.write("Disapproved Ads Count by Ad Account ID, Status Change Date and Error Type")
-            st.dataframe(grouped_df_ads_account_created_at_error, use_container_width=True)
+            st.dataframe(grouped_tables['account_date_error'], use_container_width=True)
         
     except Exception as e:
         st.error(f"Error in Main Stats section: {str(e)}")
@@ -1029,37 +1206,86 @@ with tab2:
         total_rows = len(filtered_df_ads)
         st.info(f"📊 **Total Records Available:** {total_rows:,}")
         
+        def build_export(writer):
+            """Serialize the rows behind this view; runs on an export worker, never on a rerun"""
+            # Day number columns are internal to the filters and stay out of the downloads;
+            # ad_link is generated chunk by chunk while writing
+            export_rows = filtered_df_ads
+            virtual_columns = {'ad_link': ad_links} if include_ad_link else None
+            return lambda progress: writer(
+                export_rows.drop(columns=list(DAY_COLUMNS.values()), errors='ignore'), progress,
+                virtual_columns=virtual_columns,
+            )
+        
         # Add download options
         st.subheader("📥 Download Data")
+        export_timestamp = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
+        # ad_link is most of every row's bytes and can be rebuilt from ad_account_id and ad_id
+        include_ad_link = st.checkbox(
+            "Include ad_link column",
+            value=True,
+            help="Leave out to shrink the downloads; the Parquet file keeps the link template in its metadata"
+        )
         col1, col2 = st.columns(2)
         
         with col1:
             # CSV Download
-            csv_data = filtered_df_ads.to_csv(index=False)
-            st.download_button(
-                label="📄 Download CSV",
-                data=csv_data,
-                file_name=f"ads_data_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            export_download_button(
+                derived_result_key(ads_dataset.version, 'export_csv', ad_link=include_ad_link, **filter_state),
+                build_export(write_csv),
+                label="CSV",
+                icon="📄",
+                file_name=f"ads_data_{export_timestamp}.csv",
                 mime="text/csv",
-                help="Download the filtered data as CSV file"
+                help_text="Download the filtered data as CSV file",
             )
         
         with col2:
-            # Excel Download
-            import io
-            excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                filtered_df_ads.to_excel(writer, index=False, sheet_name='Ads Data')
-            excel_data = excel_buffer.getvalue()
-            
-            st.download_button(
-                label="📊 Download Excel",
-                data=excel_data,
-                file_name=f"ads_data_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            # Excel Download, streamed sheet by sheet and split past Excel's row limit
+            include_summary_sheets = st.checkbox(
+                "Add grouped tables as sheets",
+                disabled=not excel_summary_sheets,
+                help="Append the Grouped Analysis tables to the workbook as extra sheets"
+            )
+            summary_sheets = excel_summary_sheets if include_summary_sheets else {}
+            export_download_button(
+                derived_result_key(
+                    ads_dataset.version, 'export_xlsx', ad_link=include_ad_link, summary_sheets=bool(summary_sheets), **filter_state
+                ),
+                build_export(partial(write_excel, summary_sheets=summary_sheets)),
+                label="Excel",
+                icon="📊",
+                file_name=f"ads_data_{export_timestamp}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                help="Download the filtered data as Excel file"
+                help_text="Download the filtered data as Excel file",
             )
         
+        # Compressed downloads, a fraction of the CSV size and much faster to produce
+        col3, col4, col5 = st.columns(3)
+        compressed_exports = (
+            (col3, 'export_parquet', "Parquet", "🗜️", "parquet", "application/octet-stream",
+             partial(write_parquet, metadata={'ad_link_template': AD_LINK_TEMPLATE}),
+             "Download the filtered data as a zstd-compressed Parquet file. Rebuild ad_link with "
+             "ad_link_template from the file metadata: template.format(account_id=<id without act_>, ad_id=<ad_id>)"),
+            (col4, 'export_csv_gzip', "CSV (gzip)", "📦", "csv.gz", "application/gzip",
+             partial(write_csv, compression='gzip'),
+             "Download the filtered data as a gzip-compressed CSV file"),
+            (col5, 'export_csv_zstd', "CSV (zstd)", "📦", "csv.zst", "application/zstd",
+             partial(write_csv, compression='zstd'),
+             "Download the filtered data as a zstd-compressed CSV file"),
+        )
+        for column, name, label, icon, extension, mime, writer, help_text in compressed_exports:
+            with column:
+                export_download_button(
+                    derived_result_key(ads_dataset.version, name, ad_link=include_ad_link, **filter_state),
+                    build_export(writer),
+                    label=label,
+                    icon=icon,
+                    file_name=f"ads_data_{export_timestamp}.{extension}",
+                    mime=mime,
+                    help_text=help_text,
+                )
+        
         st.success("✅ **Performance Optimized:** Table display has been removed to improve loading speed. Use the download buttons above to access the complete dataset.")
         
     except Exception as e:
@@ -1072,14 +1298,8 @@ with tab3:
         st.title("📈 Ad Publishing & Rejection Summary")
         
         if not df_ads.empty:
-            # Initialize session state for summary data if not exists
-            if 'summary_df' not in st.session_state:
-                st.session_state.summary_df = None
-                st.session_state.summary_title = None
-                st.session_state.filters_applied = None
-            
             # Check if any filters are applied
-            filters_applied = (
+            filters_applied = bool(
                 ad_account_id or 
                 selected_ad_status or 
                 selected_effective_status or 
@@ -1088,105 +1308,27 @@ with tab3:
                 (edited_range and edited_range != (edited_min, edited_max))
             )
             
-            # Check if we need to regenerate summary data
-            need_regeneration = (
-                st.session_state.summary_df is None or 
-                st.session_state.filters_applied != filters_applied
-            )
+            # Use filtered data if filters are applied, otherwise use unfiltered data
+            use_filtered = filters_applied and not filtered_df_ads.empty
+            summary_title = "Filtered Summary" if use_filtered else "Complete Summary"
+            today = pd.Timestamp.now().date()
             
-            if need_regeneration:
-                # Show loading indicator
-                with st.spinner("Loading summary data..."):
-                    # Calculate date ranges
-                    today = pd.Timestamp.now().date()
-                    yesterday = today - pd.Timedelta(days=1)
-                    thirty_days_ago = today - pd.Timedelta(days=30)
-                    current_month_start = pd.Timestamp.now().replace(day=1).date()
-                    
-                    # Use filtered data if filters are applied, otherwise use unfiltered data
-                    if filters_applied and not filtered_df_ads.empty:
-                        df_summary = filtered_df_ads.copy()
-                        summary_title = "Filtered Summary"
-                    else:
-                        df_summary = df_ads.copy()
-                        summary_title = "Complete Summary"
-                    
-                    if 'created_at' in df_summary.columns:
-                        df_summary['created_at'] = pd.to_datetime(df_summary['created_at'])
-                    if 'status_change_date' in df_summary.columns:
-                        df_summary['status_change_date'] = pd.to_datetime(df_summary['status_change_date'])
-                    
-                    # Get unique ad accounts with their BUIDs
-                    unique_accounts = df_summary[['ad_account_id', 'buid']].drop_duplicates().dropna()
-                    
-                    # Create summary data for each account
-                    summary_data = []
-                    
-                    for _, row in unique_accounts.iterrows():
-                        account = row['ad_account_id']
-                        buid = row['buid']
-                        account_data = df_summary[df_summary['ad_account_id'] == account]
-                        
-                        # Calculate metrics for this account
-                        # Lifetime: All ads regardless of date (consistent with Filtered Overview)
-                        lifetime_published = len(account_data)  # All ads (both APPROVED and DISAPPROVED)
-                        lifetime_rejected = len(account_data[account_data['ad_status'] == 'DISAPPROVED'])
-                        
-                        # Yesterday: Ads created/rejected on yesterday (consistent with Filtered Overview)
-                        yesterday_published = len(account_data[
-                            (account_data['created_at'].dt.date == yesterday)
-                        ])
-                        yesterday_rejected = len(account_data[
-                            (account_data['ad_status'] == 'DISAPPROVED') &
-                            (account_data['status_change_date'].dt.date == yesterday)
-                        ])
-                        
-                        # Current month: Ads created/rejected from start of current month
-                        current_month_published = len(account_data[
-                            (account_data['created_at'].dt.date >= current_month_start)
-                        ])
-                        current_month_rejected = len(account_data[
-                            (account_data['ad_status'] == 'DISAPPROVED') &
-                            (account_data['status_change_date'].dt.date >= current_month_start)
-                        ])
-                        
-                        # Last month: Ads created/rejected in the previous month
-                        last_month_published = len(account_data[
-                            (account_data['created_at'].dt.date >= thirty_days_ago) &
-                            (account_data['created_at'].dt.date < current_month_start)
-                        ])
-                        last_month_rejected = len(account_data[
-                            (account_data['ad_status'] == 'DISAPPROVED') &
-                            (account_data['status_change_date'].dt.date >= thirty_days_ago) &
-                            (account_data['status_change_date'].dt.date < current_month_start)
-                        ])
-                        
-                        summary_data.append({
-                            'BUID': buid,
-                            'Ad Account ID': account,
-                            'Ads Published - Lifetime': lifetime_published,
-                            'Ads Rejected - Lifetime': lifetime_rejected,
-                            'Ads Published - Last Month': last_month_published,
-                            'Ads Rejected - Last Month': last_month_rejected,
-                            'Ads Published - Current Month': current_month_published,
-                            'Ads Rejected - Current Month': current_month_rejected,
-                            'Ads Published - Yesterday': yesterday_published,
-                            'Ads Rejected - Yesterday': yesterday_rejected
-                        })
-                    
-                    # Store in session state
-                    st.session_state.summary_df = pd.DataFrame(summary_data)
-                    st.session_state.summary_title = summary_title
-                    st.session_state.filters_applied = filters_applied
+            # Cached per dataset version, filter state and day, so switching between accounts
+            # or filters never serves another selection's table
+            with st.spinner("Loading summary data..."):
+                summary_df = derived_results.get(
+                    derived_result_key(ads_dataset.version, 'summary', today=today, **(filter_state if use_filtered else {})),
+                    lambda: build_account_summary(filtered_df_ads if use_filtered else df_ads, today=today),
+                )
             
             # Display the summary table
-            st.dataframe(st.session_state.summary_df, use_container_width=True, hide_index=True)
+            st.dataframe(summary_df, use_container_width=True, hide_index=True)
             
             # Add some additional context
-            if st.session_state.filters_applied:
-                st.info(f"📈 **{st.session_state.summary_title}:** This table shows ad publishing and rejection metrics across different timeframes for filtered accounts.")
+            if filters_applied:
+                st.info(f"📈 **{summary_title}:** This table shows ad publishing and rejection metrics across different timeframes for filtered accounts.")
             else:
-                st.info(f"📈 **{st.session_state.summary_title}:** This table shows ad publishing and rejection metrics across different timeframes for all accounts in your dataset.")
+                st.info(f"📈 **{summary_title}:** This table shows ad publishing and rejection metrics across different timeframes for all accounts in your dataset.")
             
         else:
             st.warning("No data available to generate summary table.")
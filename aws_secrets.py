@@ -0,0 +1,128 @@
+"""Process-wide caching of AWS Secrets Manager lookups"""
+import json
+import logging
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+class LocalSecretsManagerClient:
+    """
+    Offline stand-in for a boto3 Secrets Manager client.
+
+    Serves `get_secret_value` from an in-memory dict of secret name -> dict,
+    raising the same ResourceNotFoundException ClientError as AWS for unknown names.
+    """
+
+    def __init__(self, secrets):
+        self._secrets = secrets
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path):
+        """Load secrets from a JSON file shaped like {"secret-name": {...}}"""
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def put_secret_value(self, SecretId, SecretString):
+        """Replace a secret's value, e.g. to simulate a rotation"""
+        self._secrets[SecretId] = json.loads(SecretString)
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1
+        if SecretId not in self._secrets:
+            raise ClientError(
+                {"Error": {"Code": "ResourceNotFoundException", "Message": f"Secret {SecretId} not found"}},
+                "GetSecretValue",
+            )
+        return {"Name": SecretId, "SecretString": json.dumps(self._secrets[SecretId])}
+
+
+class SecretCache:
+    """
+    TTL cache of parsed JSON secrets sharing one lazily built client.
+
+    Within `refresh_ahead` seconds of expiry a secret is re-fetched on a
+    background thread while the cached value keeps being served, so rotated
+    credentials are picked up without any caller waiting on AWS. If a refresh
+    fails the last good value is served until it can be fetched again.
+    """
+
+    def __init__(self, client_factory, ttl=3600, refresh_ahead=300):
+        self.client_factory = client_factory
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._entries = {}  # secret name -> (value, fetched_at)
+        self._refreshing = set()
+        self.stats = {"hits": 0, "misses": 0, "background_refreshes": 0, "failures": 0}
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self.client_factory()
+            return self._client
+
+    def _fetch(self, secret_name):
+        response = self._get_client().get_secret_value(SecretId=secret_name)
+        value = json.loads(response["SecretString"])
+        with self._lock:
+            self._entries[secret_name] = (value, time.monotonic())
+        return value
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _background_refresh(self, secret_name):
+        try:
+            self._fetch(secret_name)
+            self._count("background_refreshes")
+        except Exception as e:
+            self._count("failures")
+            logging.warning(f"Background refresh of secret '{secret_name}' failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(secret_name)
+
+    def get(self, secret_name):
+        """Return the parsed secret, fetching it only when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(secret_name)
+        now = time.monotonic()
+
+        if entry is not None:
+            value, fetched_at = entry
+            age = now - fetched_at
+            if age < self.ttl:
+                self._count("hits")
+                if age >= self.ttl - self.refresh_ahead:
+                    with self._lock:
+                        start = secret_name not in self._refreshing
+                        self._refreshing.add(secret_name)
+                    if start:
+                        threading.Thread(
+                            target=self._background_refresh, args=(secret_name,), daemon=True, name="secret-refresh"
+                        ).start()
+                return value
+
+        self._count("misses")
+        try:
+            return self._fetch(secret_name)
+        except Exception:
+            self._count("failures")
+            if entry is not None:
+                logging.warning(f"Could not refresh secret '{secret_name}', serving the expired value")
+                return entry[0]
+            raise
+
+    def invalidate(self, secret_name=None):
+        """Drop one cached secret (or all of them) so the next get re-fetches it"""
+        with self._lock:
+            if secret_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(secret_name, None)
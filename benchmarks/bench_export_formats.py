@@ -0,0 +1,68 @@
+"""
+Benchmark the Raw Dump download formats against the plain CSV export.
+
+Usage:
+    python benchmarks/bench_export_formats.py [rows ...]    (default: 1000000)
+
+Every format is written from the same frame shaped like the prepared df_ads
+(categoricals, integer ad_id, datetime columns), with ad_link generated
+chunk by chunk as the dashboards do and without it. The cost of the
+row-wise ad_link column the dashboards used to store is reported first.
+"""
+import os
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ads_exports import write_csv, write_parquet
+from ads_store import AD_LINK_TEMPLATE, ad_links
+from bench_xlsx_export import make_export_frame
+
+FORMATS = {
+    'csv': write_csv,
+    'csv.gz': partial(write_csv, compression='gzip'),
+    'csv.zst': partial(write_csv, compression='zstd'),
+    'parquet': partial(write_parquet, metadata={'ad_link_template': AD_LINK_TEMPLATE}),
+}
+
+
+def legacy_ad_links(frame):
+    """The per-row apply that used to build the stored ad_link column"""
+    def generate_ad_link(ad_account_id, ad_id):
+        clean_account_id = ad_account_id.replace('act_', '') if ad_account_id.startswith('act_') else ad_account_id
+        return AD_LINK_TEMPLATE.format(account_id=clean_account_id, ad_id=ad_id)
+    return frame.apply(lambda row: generate_ad_link(row['ad_account_id'], row['ad_id']), axis=1)
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or [1_000_000]
+    for rows in row_counts:
+        frame = make_export_frame(rows).drop(columns=['ad_link'])
+        frame_mb = frame.memory_usage(deep=True, index=False).sum() / 1e6
+        for name, builder in (('row-wise apply', legacy_ad_links), ('ad_links', ad_links)):
+            links, seconds = timed(builder, frame)
+            print(f"{rows:>10,} rows  ad_link via {name:<15} {seconds:7.2f}s  "
+                  f"+{links.memory_usage(deep=True, index=False) / 1e6:7.1f} MB on a {frame_mb:.1f} MB frame")
+            del links
+
+        baseline = None
+        for include_ad_link in (True, False):
+            virtual_columns = {'ad_link': ad_links} if include_ad_link else None
+            for name, writer in FORMATS.items():
+                data, seconds = timed(writer, frame, virtual_columns=virtual_columns)
+                baseline = baseline or (seconds, len(data))
+                print(f"{rows:>10,} rows  {name:<8} ad_link={'yes' if include_ad_link else 'no ':<4}"
+                      f"{seconds:7.2f}s ({baseline[0] / seconds:5.1f}x)  "
+                      f"{len(data) / 1e6:8.1f} MB ({baseline[1] / len(data):6.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
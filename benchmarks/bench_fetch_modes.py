@@ -0,0 +1,80 @@
+"""
+Compare the fetchall, streaming and COPY loaders against a local Postgres stand-in.
+
+Usage:
+    BENCH_PG_DSN="dbname=postgres user=postgres host=localhost" python benchmarks/bench_fetch_modes.py [rows]
+
+A temporary table shaped like ads_data_query's output is generated server-side,
+so no Redshift access is needed.
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_utils import ADS_DATA_DTYPES, ADS_DATE_COLUMNS, fetch_dataframe_chunked, fetch_dataframe_copy
+
+SETUP_SQL = '''
+CREATE TEMP TABLE bench_ads AS
+SELECT
+    (1000 + i % 5000)::text AS buid,
+    'act_' || (100000000 + i % 50000)::text AS ad_account_id,
+    (120200000000000000 + i)::text AS ad_id,
+    CASE WHEN i % 7 = 0 THEN 'DISAPPROVED' ELSE 'APPROVED' END AS ad_status,
+    (ARRAY['ACTIVE', 'PAUSED', 'DISAPPROVED', 'ARCHIVED'])[1 + i % 4] AS effective_status,
+    DATE '2023-01-01' + (i % 700) AS created_at,
+    DATE '2023-01-01' + (i % 700) + (i % 11) AS status_change_date,
+    CASE WHEN i % 7 = 0 THEN (ARRAY['CIRCUMVENTING_SYSTEMS', 'UNACCEPTABLE_BUSINESS_PRACTICES', 'MISLEADING_CLAIMS'])[1 + i % 3] ELSE '' END AS error_type,
+    CASE WHEN i % 7 = 0 THEN 'Ad does not comply with our Advertising Policies' ELSE '' END AS error_description
+FROM generate_series(1, %s) AS i
+'''
+
+QUERY = "SELECT * FROM bench_ads"
+
+
+def fetch_all(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(QUERY)
+        column_names = [desc[0] for desc in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=column_names)
+
+
+def time_loader(label, loader, connection, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = loader(connection)
+        timings.append(time.perf_counter() - started)
+        connection.rollback()
+    print(f"{label:<10} best {min(timings):7.2f}s  rows={len(result):,}  columns={list(result.columns)}")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dsn = os.environ.get("BENCH_PG_DSN", "dbname=postgres user=postgres host=localhost")
+
+    connection = psycopg2.connect(dsn)
+    with connection.cursor() as cursor:
+        cursor.execute(SETUP_SQL, (rows,))
+    connection.commit()
+
+    print(f"Benchmarking {rows:,} rows")
+    baseline = time_loader("fetchall", fetch_all, connection)
+    time_loader("stream", lambda conn: fetch_dataframe_chunked(conn, QUERY), connection)
+    copied = time_loader(
+        "copy",
+        lambda conn: fetch_dataframe_copy(conn, QUERY, dtype=ADS_DATA_DTYPES, parse_dates=ADS_DATE_COLUMNS),
+        connection,
+    )
+
+    assert list(copied.columns) == list(baseline.columns), "COPY loader returned different columns"
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark the grouped Summary tab aggregation against the original per-account loop.
+
+Usage:
+    python benchmarks/bench_summary.py [rows] [accounts]
+
+The per-account loop is O(accounts x rows), so it is timed on a sample of
+accounts and extrapolated; both versions are checked for identical output
+on a smaller frame first.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ads_metrics import build_account_summary
+
+
+def make_ads_frame(rows, accounts, today, seed=0):
+    rng = np.random.default_rng(seed)
+    account_ids = np.array([f"act_{100000000 + i}" for i in range(accounts)], dtype=object)
+    account_index = rng.integers(0, accounts, rows)
+    created = today - pd.to_timedelta(rng.integers(0, 400, rows), unit="D")
+    changed = created + pd.to_timedelta(rng.integers(0, 10, rows), unit="D")
+    changed = changed.where(changed <= today, today)
+    return pd.DataFrame({
+        "buid": (account_index % (accounts // 5 + 1)).astype(str).astype(object),
+        "ad_account_id": account_ids[account_index],
+        "ad_id": np.arange(rows).astype(str).astype(object),
+        "ad_status": np.where(rng.random(rows) < 0.15, "DISAPPROVED", "APPROVED").astype(object),
+        "created_at": created.date,
+        "status_change_date": changed.date,
+    })
+
+
+def legacy_account_summary(df_summary, today, limit=None):
+    """The original Summary tab loop, kept verbatim for comparison"""
+    yesterday = today - pd.Timedelta(days=1)
+    thirty_days_ago = today - pd.Timedelta(days=30)
+    current_month_start = today.replace(day=1)
+
+    df_summary = df_summary.copy()
+    df_summary['created_at'] = pd.to_datetime(df_summary['created_at'])
+    df_summary['status_change_date'] = pd.to_datetime(df_summary['status_change_date'])
+    unique_accounts = df_summary[['ad_account_id', 'buid']].drop_duplicates().dropna()
+    if limit is not None:
+        unique_accounts = unique_accounts.head(limit)
+
+    summary_data = []
+    for _, row in unique_accounts.iterrows():
+        account = row['ad_account_id']
+        buid = row['buid']
+        account_data = df_summary[df_summary['ad_account_id'] == account]
+        summary_data.append({
+            'BUID': buid,
+            'Ad Account ID': account,
+            'Ads Published - Lifetime': len(account_data),
+            'Ads Rejected - Lifetime': len(account_data[account_data['ad_status'] == 'DISAPPROVED']),
+            'Ads Published - Last Month': len(account_data[
+                (account_data['created_at'].dt.date >= thirty_days_ago) &
+                (account_data['created_at'].dt.date < current_month_start)
+            ]),
+            'Ads Rejected - Last Month': len(account_data[
+                (account_data['ad_status'] == 'DISAPPROVED') &
+                (account_data['status_change_date'].dt.date >= thirty_days_ago) &
+                (account_data['status_change_date'].dt.date < current_month_start)
+            ]),
+            'Ads Published - Current Month': len(account_data[
+                (account_data['created_at'].dt.date >= current_month_start)
+            ]),
+            'Ads Rejected - Current Month': len(account_data[
+                (account_data['ad_status'] == 'DISAPPROVED') &
+                (account_data['status_change_date'].dt.date >= current_month_start)
+            ]),
+            'Ads Published - Yesterday': len(account_data[
+                (account_data['created_at'].dt.date == yesterday)
+            ]),
+            'Ads Rejected - Yesterday': len(account_data[
+                (account_data['ad_status'] == 'DISAPPROVED') &
+                (account_data['status_change_date'].dt.date == yesterday)
+            ]),
+        })
+    return pd.DataFrame(summary_data)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    today = pd.Timestamp.now().date()
+
+    check = make_ads_frame(20_000, 500, pd.Timestamp(today), seed=1)
+    pd.testing.assert_frame_equal(build_account_summary(check, today), legacy_account_summary(check, today))
+    print("Grouped summary matches the per-account loop")
+
+    frame = make_ads_frame(rows, accounts, pd.Timestamp(today))
+    started = time.perf_counter()
+    summary = build_account_summary(frame, today)
+    grouped_seconds = time.perf_counter() - started
+    print(f"grouped:  {grouped_seconds:8.2f}s for {len(summary):,} account rows over {rows:,} ads")
+
+    # Separate the one-off date parsing from the per-account scans before extrapolating
+    sample = 50
+    started = time.perf_counter()
+    legacy_account_summary(frame, today, limit=0)
+    fixed_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    legacy_account_summary(frame, today, limit=sample)
+    per_account = (time.perf_counter() - started - fixed_seconds) / sample
+    legacy_seconds = fixed_seconds + per_account * len(summary)
+    print(f"loop:     {legacy_seconds:8.2f}s (extrapolated from {sample} accounts)")
+    print(f"speedup:  {legacy_seconds / grouped_seconds:8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark the Hourly Update look-back windows through TimeIndex against a full scan.
+
+Usage:
+    python benchmarks/bench_time_windows.py [rows ...]    (default: 200000 1000000)
+
+The frame is shaped like hour_app's df_ads: ads edited in the last 24 hours
+and earlier today (ads_latest_status_query), about 15% disapproved. Every
+look-back window offered on the tab is timed with the default bucket size,
+once via the index and once scanning status_change_date, and the two
+results are checked to be identical.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ads_metrics import BUCKET_KEYS, recent_disapprovals
+from ads_store import TimeIndex, apply_ads_schema
+
+# Mirrors hour_app; the app module itself runs Streamlit on import
+LOOKBACK_WINDOW_MINUTES = [15, 30, 60, 120, 240, 360, 720, 1440]
+DEFAULT_BUCKET_MINUTES = 60
+BUCKET_MINUTES = [5, 15, 30, 60, 120, 240]
+REPEATS = 20
+
+
+def make_recent_frame(rows, now, accounts=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    # The query keeps edits from min(midnight, now - 24h), i.e. the last 24 hours
+    span_ns = pd.Timedelta(hours=24).value
+    changed = now.tz_localize(None) - pd.to_timedelta(rng.integers(0, span_ns, rows), unit="ns")
+    account_ids = np.array([f"act_{100000000 + i}" for i in range(accounts)], dtype=object)
+    disapproved = rng.random(rows) < 0.15
+    frame = pd.DataFrame({
+        "buid": rng.integers(0, accounts // 5, rows).astype(str).astype(object),
+        "ad_account_id": account_ids[rng.integers(0, accounts, rows)],
+        "ad_id": (120200000000000000 + np.arange(rows)).astype(str).astype(object),
+        "ad_status": np.where(disapproved, "DISAPPROVED", "APPROVED").astype(object),
+        "effective_status": np.where(disapproved, "DISAPPROVED", "ACTIVE").astype(object),
+        "created_at": changed - pd.to_timedelta(rng.integers(0, 30, rows), unit="D"),
+        "status_change_date": changed,
+        "error_type": np.where(disapproved, rng.choice(["MISLEADING_CLAIMS", "CIRCUMVENTING_SYSTEMS"], rows), "").astype(object),
+        "error_description": np.where(disapproved, "Policy", "").astype(object),
+    })
+    return apply_ads_schema(frame)
+
+
+def best_of(function, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def sorted_table(table):
+    return table.sort_values(BUCKET_KEYS).reset_index(drop=True)
+
+
+def run(rows, now):
+    frame = make_recent_frame(rows, now)
+    started = time.perf_counter()
+    index = TimeIndex(frame)
+    print(f"{rows:,} rows over 24 hours: index build {time.perf_counter() - started:.3f}s")
+    for window_minutes in LOOKBACK_WINDOW_MINUTES:
+        bucket_minutes = max(m for m in BUCKET_MINUTES if m <= min(DEFAULT_BUCKET_MINUTES, window_minutes) and window_minutes % m == 0)
+        window = pd.Timedelta(minutes=window_minutes)
+        bucket = pd.Timedelta(minutes=bucket_minutes)
+        indexed_seconds, indexed = best_of(lambda: recent_disapprovals(frame, now, window, bucket, time_index=index))
+        scanned_seconds, scanned = best_of(lambda: recent_disapprovals(frame, now, window, bucket))
+        pd.testing.assert_frame_equal(sorted_table(indexed), sorted_table(scanned))
+        print(
+            f"  {window_minutes:>5} min / {bucket_minutes:>3} min buckets: "
+            f"index {indexed_seconds * 1000:7.1f} ms  scan {scanned_seconds * 1000:7.1f} ms  "
+            f"({int(indexed['no_of_ads'].sum()):,} disapprovals)"
+        )
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [200_000, 1_000_000]
+    now = pd.Timestamp.now(tz="UTC")
+    for rows in sizes:
+        run(rows, now)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark the streaming XLSX export against openpyxl, as pandas' ExcelWriter and in write-only mode.
+
+Usage:
+    python benchmarks/bench_xlsx_export.py [rows ...]    (default: 1000000 5000000)
+
+Each writer runs in its own process on a frame shaped like the prepared
+df_ads (categoricals, integer ad_id, datetime columns, ad_link URLs); the
+reported memory is the growth of the process' peak RSS while writing, which
+includes the finished file held in memory for the download. The
+"openpyxl-wo" writer streams the same cells through
+openpyxl.Workbook(write_only=True), with large integers as text and dates
+formatted like write_excel. The openpyxl baselines are skipped above
+Excel's row limit, where they cannot write a single sheet at all.
+"""
+import gc
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ads_exports import EXCEL_MAX_EXACT_INTEGER, EXCEL_MAX_ROWS, XLSX_CHUNK_ROWS, write_excel
+from ads_store import apply_ads_schema, normalize_ads_dates
+
+
+def make_export_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    accounts = np.array([f"act_{100000000 + i}" for i in range(50_000)], dtype=object)
+    account_ids = accounts[rng.integers(0, len(accounts), rows)]
+    ad_ids = 120200000000000000 + np.arange(rows)
+    created = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 600, rows), unit="D")
+    frame = pd.DataFrame({
+        "buid": rng.integers(1000, 6000, rows).astype(str).astype(object),
+        "ad_account_id": account_ids,
+        "ad_id": ad_ids,
+        "ad_status": np.where(rng.random(rows) < 0.15, "DISAPPROVED", "APPROVED").astype(object),
+        "effective_status": rng.choice(["ACTIVE", "PAUSED", "DISAPPROVED", "ARCHIVED"], rows).astype(object),
+        "created_at": created,
+        "status_change_date": created + pd.to_timedelta(rng.integers(0, 10, rows), unit="D"),
+        "error_type": rng.choice(["CIRCUMVENTING_SYSTEMS", "MISLEADING_CLAIMS", ""], rows).astype(object),
+        "error_description": rng.choice(["Ad does not comply with our Advertising Policies", ""], rows).astype(object),
+    })
+    frame = apply_ads_schema(normalize_ads_dates(frame))
+    frame["ad_link"] = (
+        "https://adsmanager.facebook.com/adsmanager/manage/ads/edit/standalone?act="
+        + frame["ad_account_id"].astype(str).str.slice(4)
+        + "&selected_ad_ids=" + frame["ad_id"].astype(str)
+    )
+    return frame.drop(columns=["created_day", "status_change_day"])
+
+
+def write_openpyxl(frame):
+    import io
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        frame.to_excel(writer, index=False, sheet_name="Ads Data")
+    return buffer.getvalue()
+
+
+def write_only_values(series):
+    """Cell values of one column for openpyxl: Python objects, None where missing"""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = np.append(dtype.categories.astype(str).to_numpy(dtype=object), None)
+        return categories[series.cat.codes.to_numpy()]
+    if pd.api.types.is_integer_dtype(dtype) and (series.abs() >= EXCEL_MAX_EXACT_INTEGER).any():
+        return series.astype(str).to_numpy(dtype=object)
+    return series.astype(object).where(series.notna(), None).to_numpy(dtype=object)
+
+
+def write_openpyxl_write_only(frame, chunk_rows=XLSX_CHUNK_ROWS):
+    import io
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Ads Data")
+    sheet.append(list(frame.columns))
+
+    def date_cell(value):
+        if value is None:
+            return None
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = "yyyy-mm-dd"
+        return cell
+
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        columns = []
+        for name in chunk.columns:
+            values = write_only_values(chunk[name])
+            if pd.api.types.is_datetime64_any_dtype(chunk[name].dtype):
+                values = [date_cell(value) for value in values]
+            columns.append(values)
+        for row in zip(*columns):
+            sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+WRITERS = {"streaming": write_excel, "openpyxl": write_openpyxl, "openpyxl-wo": write_openpyxl_write_only}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process since the last reset_peak_rss, in MB"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    """Restart peak RSS tracking at the current RSS (Linux only; elsewhere the peak keeps accumulating)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def measure(writer_name, rows, results):
+    frame = make_export_frame(rows)
+    writer = WRITERS[writer_name]
+    gc.collect()
+    reset_peak_rss()
+    peak_before = peak_rss_mb()
+    started = time.perf_counter()
+    data = writer(frame)
+    seconds = time.perf_counter() - started
+    results.put((seconds, len(data), peak_rss_mb() - peak_before))
+
+
+def run(writer_name, rows):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(writer_name, rows, results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+
+def main():
+    row_counts = [int(arg) for arg in sys.argv[1:]] or [1_000_000, 5_000_000]
+    for rows in row_counts:
+        writers = ["streaming"]
+        if rows < EXCEL_MAX_ROWS:
+            writers += ["openpyxl-wo", "openpyxl"]
+        for writer_name in writers:
+            seconds, size, peak_mb = run(writer_name, rows)
+            print(f"{rows:>10,} rows  {writer_name:<11} {seconds:8.1f}s  {size / 1e6:8.1f} MB file  "
+                  f"+{peak_mb:8.0f} MB peak RSS")
+        if rows >= EXCEL_MAX_ROWS:
+            sheets = -(-rows // (EXCEL_MAX_ROWS - 1))
+            print(f"{rows:>10,} rows  openpyxl*   skipped: one sheet holds at most {EXCEL_MAX_ROWS - 1:,} rows "
+                  f"(streaming wrote {sheets} sheets)")
+
+
+if __name__ == "__main__":
+    main()
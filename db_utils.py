@@ -0,0 +1,349 @@
+"""Redshift connection helpers shared by app.py and hour_app.py"""
+import csv
+import io
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+# Column types of ads_data_query, used to skip type inference when parsing bulk exports
+ADS_DATA_DTYPES = {
+    "buid": str,
+    "ad_account_id": str,
+    "ad_id": str,
+    "ad_status": str,
+    "effective_status": str,
+    "error_type": str,
+    "error_description": str,
+}
+ADS_DATE_COLUMNS = ["created_at", "status_change_date"]
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection becomes free before the acquire timeout"""
+
+
+class _NewConnectionSlot:
+    """Holds a pool slot while the connection for it is being opened"""
+
+
+class RedshiftConnectionPool:
+    """
+    Thread-safe, process-wide pool of long-lived Redshift connections.
+
+    Connections are created lazily up to `max_size`, handed out LIFO so the
+    warmest connection is reused first, health checked with `SELECT 1` when
+    they have been idle for a while, and recycled once they exceed
+    `max_lifetime` seconds.
+    """
+
+    def __init__(self, dbname, user, password, host, port, min_size=1, max_size=5,
+                 acquire_timeout=30, health_check_after=60, max_lifetime=3600):
+        self._connect_kwargs = dict(dbname=dbname, user=user, password=password, host=host, port=port)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+
+        self._lock = threading.Condition()
+        self._retired = False
+        self._idle = []  # [(connection, created_at, last_used_at)]
+        self._in_use = {}  # id(connection) -> created_at
+        self._metrics = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "total_wait_seconds": 0.0,
+        }
+
+        for _ in range(min_size):
+            try:
+                self._idle.append((self._connect(), time.monotonic(), time.monotonic()))
+            except psycopg2.Error as e:
+                logging.warning(f"Could not pre-open pooled connection: {str(e)}")
+                break
+
+    def _connect(self):
+        connection = psycopg2.connect(**self._connect_kwargs)
+        with self._lock:
+            self._metrics["created"] += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            self._metrics["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            with self._lock:
+                self._metrics["health_check_failures"] += 1
+            return False
+
+    def _check_out(self, deadline, waited):
+        """
+        Reserve a slot under the lock without touching the network.
+
+        Returns (connection, needs_health_check, expired, waited). The connection
+        is a _NewConnectionSlot when the caller should open a new connection in
+        the reserved slot, and None when it should just try again. Expired
+        connections are handed back for the caller to close outside the lock.
+        """
+        expired = []
+        with self._lock:
+            while True:
+                while self._idle:
+                    connection, created_at, last_used_at = self._idle.pop()
+                    now = time.monotonic()
+                    if now - created_at > self.max_lifetime:
+                        expired.append(connection)
+                        continue
+                    self._in_use[id(connection)] = created_at
+                    return connection, now - last_used_at > self.health_check_after, expired, waited
+
+                if len(self._in_use) < self.max_size:
+                    # Reserve the slot before connecting so concurrent callers respect max_size
+                    slot = _NewConnectionSlot()
+                    self._in_use[id(slot)] = None
+                    return slot, False, expired, waited
+                if expired:
+                    # Close them before blocking rather than holding them while waiting
+                    return None, False, expired, waited
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolExhaustedError(
+                        f"No Redshift connection available after {self.acquire_timeout}s "
+                        f"(max_size={self.max_size})"
+                    )
+                if not waited:
+                    self._metrics["waits"] += 1
+                    waited = True
+                wait_started = time.monotonic()
+                self._lock.wait(remaining)
+                self._metrics["total_wait_seconds"] += time.monotonic() - wait_started
+
+    def _free_slot(self, key):
+        with self._lock:
+            del self._in_use[key]
+            self._lock.notify()
+
+    def acquire(self):
+        """Check out a healthy connection, opening a new one if the pool has room"""
+        deadline = time.monotonic() + self.acquire_timeout
+        waited = False
+        while True:
+            connection, needs_health_check, expired, waited = self._check_out(deadline, waited)
+            for stale in expired:
+                self._discard(stale)
+            if connection is None:
+                continue
+            if isinstance(connection, _NewConnectionSlot):
+                slot = connection
+                break
+            # The SELECT 1 round trip runs without the lock so other threads are not held up by it
+            if needs_health_check and not self._is_healthy(connection):
+                self._free_slot(id(connection))
+                self._discard(connection)
+                continue
+            with self._lock:
+                self._metrics["reused"] += 1
+            return connection
+
+        try:
+            connection = self._connect()
+        except Exception:
+            self._free_slot(id(slot))
+            raise
+
+        with self._lock:
+            del self._in_use[id(slot)]
+            self._in_use[id(connection)] = time.monotonic()
+        return connection
+
+    def release(self, connection, broken=False):
+        """Return a connection to the pool, closing it if it is broken or closed"""
+        with self._lock:
+            created_at = self._in_use.get(id(connection))
+        reusable = not broken and not connection.closed and created_at is not None and not self._retired
+        if reusable:
+            try:
+                # End any transaction left open by the caller before reuse; the slot stays reserved meanwhile
+                connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        with self._lock:
+            self._in_use.pop(id(connection), None)
+            if reusable:
+                self._idle.append((connection, created_at, time.monotonic()))
+            self._lock.notify()
+        if not reusable:
+            self._discard(connection)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it"""
+        connection = self.acquire()
+        broken = False
+        try:
+            yield connection
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(connection, broken=broken)
+
+    def stats(self):
+        """Snapshot of pool size and usage counters"""
+        with self._lock:
+            return dict(
+                self._metrics,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+                max_size=self.max_size,
+            )
+
+    def close_all(self):
+        """Close every idle connection in the pool"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def retire(self):
+        """Close the idle connections now and every checked-out one as it is released"""
+        with self._lock:
+            self._retired = True
+        self.close_all()
+
+
+class RotatingConnectionPool:
+    """
+    The RedshiftConnectionPool for the current credentials.
+
+    `credentials()` returns the connect keyword arguments (dbname, user,
+    password, host, port) and is called on every `get`, so a rotated secret
+    is used by the next query even from long-lived callers such as a
+    background refresh thread. When the credentials change, a new pool is
+    opened and the previous one is retired: its idle connections are closed
+    and the ones still checked out are closed when they come back.
+    """
+
+    def __init__(self, credentials, **pool_kwargs):
+        self._credentials = credentials
+        self._pool_kwargs = pool_kwargs
+        self._lock = threading.Lock()
+        self._key = None
+        self._pool = None
+        self.rotations = 0
+
+    def get(self):
+        credentials = self._credentials()
+        key = tuple(sorted(credentials.items()))
+        with self._lock:
+            if self._pool is not None and key == self._key:
+                return self._pool
+            previous = self._pool
+            self._pool = RedshiftConnectionPool(**credentials, **self._pool_kwargs)
+            self._key = key
+            pool = self._pool
+            if previous is not None:
+                self.rotations += 1
+        if previous is not None:
+            logging.info("Redshift credentials changed, retiring the previous connection pool")
+            previous.retire()
+        return pool
+
+
+def fetch_dataframe_chunked(connection, query, chunk_size=50000, on_chunk=None):
+    """
+    Stream a query through a server-side named cursor into a DataFrame.
+
+    Rows are pulled `chunk_size` at a time and immediately transposed into
+    per-column arrays, so only one chunk of row tuples is alive at once.
+    `on_chunk(rows_so_far)` is called after every chunk for progress reporting.
+    """
+    cursor = connection.cursor(name=f"stream_{threading.get_ident()}_{time.monotonic_ns()}")
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(query)
+
+        column_chunks = None
+        column_names = None
+        total_rows = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if column_names is None:
+                # Named cursors only populate description after the first fetch
+                column_names = [desc[0] for desc in cursor.description]
+                column_chunks = [[] for _ in column_names]
+            if not rows:
+                break
+
+            for i, values in enumerate(zip(*rows)):
+                chunk = np.empty(len(values), dtype=object)
+                chunk[:] = values
+                column_chunks[i].append(chunk)
+            total_rows += len(rows)
+            del rows
+
+            if on_chunk is not None:
+                on_chunk(total_rows)
+    finally:
+        cursor.close()
+
+    columns = {
+        name: np.concatenate(chunks) if chunks else np.empty(0, dtype=object)
+        for name, chunks in zip(column_names, column_chunks)
+    }
+    return pd.DataFrame(columns, columns=column_names).infer_objects()
+
+
+def fetch_dataframe_copy(connection, query, dtype=None, parse_dates=None):
+    """
+    Bulk-load a query with `COPY (query) TO STDOUT` and parse it with pandas' C parser.
+
+    NULLs are written as \\N so they stay distinguishable from empty strings.
+    Only engines that support COPY TO STDOUT (Postgres) can serve this; callers
+    should fall back to another fetch mode on psycopg2.Error.
+    """
+    buffer = io.BytesIO()
+    copy_sql = f"COPY (\n{query.strip().rstrip(';')}\n) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')"
+    with connection.cursor() as cursor:
+        cursor.copy_expert(copy_sql, buffer)
+    buffer.seek(0)
+
+    header = next(csv.reader([buffer.readline().decode("utf-8")]), [])
+    buffer.seek(0)
+    if parse_dates:
+        parse_dates = [col for col in parse_dates if col in header]
+
+    return pd.read_csv(
+        buffer,
+        engine="c",
+        dtype=dtype,
+        parse_dates=parse_dates or False,
+        keep_default_na=False,
+        na_values=["\\N"],
+    )
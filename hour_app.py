@@ -6,12 +6,42 @@ import numpy as np
 import streamlit as st
 from streamlit_option_menu import option_menu
 import psycopg2
-from functools import wraps
+from functools import partial, wraps
 import hmac
 import boto3
 import json
 import logging
 import os
+from ads_exports import ExportManager, write_csv, write_excel, write_parquet
+from ads_metrics import recent_disapprovals, top_group, window_counts
+from ads_store import (
+    AD_LINK_TEMPLATE,
+    BackgroundRefresher,
+    DAY_COLUMNS,
+    DerivedResultCache,
+    SharedDatasetCache,
+    SingleFlight,
+    SplitAdsLoader,
+    TimeIndex,
+    ad_links,
+    apply_ads_schema,
+    date_to_day,
+    derived_result_key,
+    memory_report,
+    normalize_ads_dates,
+    query_hash,
+    search_mask,
+    sort_order,
+)
+from aws_secrets import LocalSecretsManagerClient, SecretCache
+from db_utils import (
+    ADS_DATA_DTYPES,
+    ADS_DATE_COLUMNS,
+    PoolExhaustedError,
+    RotatingConnectionPool,
+    fetch_dataframe_chunked,
+    fetch_dataframe_copy,
+)
 
 # Suppress Streamlit internal logs
 logging.getLogger("streamlit").setLevel(logging.ERROR)
@@ -28,56 +58,87 @@ logging.getLogger("botocore").setLevel(logging.ERROR)
 # Set environment variable to suppress Streamlit logs
 os.environ["STREAMLIT_LOGGER_LEVEL"] = "error"
 
+# Secrets are cached process-wide; rotated values are picked up in the background
+SECRET_TTL_SECONDS = 3600
+REDSHIFT_SECRET_NAME = "G-streamlit-KAT"
+
 def get_aws_client():
-    """Get AWS client with proper error handling for Streamlit context"""
-    try:
-        return boto3.client(
-            "secretsmanager",
-            region_name=st.secrets["AWS_DEFAULT_REGION"],
-            aws_access_key_id=st.secrets["AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=st.secrets["AWS_SECRET_ACCESS_KEY"]
-        )
-    except Exception as e:
-        st.error(f"Error accessing AWS secrets: {str(e)}")
-        return None
+    """Get the Secrets Manager client, or a local file-backed stand-in when LOCAL_SECRETS_FILE is set"""
+    local_secrets_file = os.environ.get("LOCAL_SECRETS_FILE")
+    if local_secrets_file:
+        return LocalSecretsManagerClient.from_file(local_secrets_file)
+    return boto3.client(
+        "secretsmanager",
+        region_name=st.secrets["AWS_DEFAULT_REGION"],
+        aws_access_key_id=st.secrets["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=st.secrets["AWS_SECRET_ACCESS_KEY"]
+    )
+
+@st.cache_resource
+def get_secret_cache():
+    """Secrets Manager lookups shared by every session and rerun"""
+    return SecretCache(get_aws_client, ttl=SECRET_TTL_SECONDS)
 
 def get_secret(secret_name):
     """Retrieve secret value from AWS Secrets Manager"""
-    client = get_aws_client()
-    if client is None:
-        return None
-    
     try:
-        response = client.get_secret_value(SecretId=secret_name)
-        return json.loads(response["SecretString"])
+        return get_secret_cache().get(secret_name)
     except Exception as e:
         st.error(f"Error retrieving secret '{secret_name}': {str(e)}")
         return None
 
 # Initialize secrets with error handling
-secret = get_secret("G-streamlit-KAT")
+secret = get_secret(REDSHIFT_SECRET_NAME)
 if secret is None:
     st.error("Failed to retrieve database secrets. Please check your AWS configuration.")
     st.stop()
 
-db = secret["db"]
-name = secret["name"]
-passw = secret["passw"]
-server = secret["server"]
-port = secret["port"]
+# Redshift settings are read from the cached secret on every connection (redshift_credentials)
 stripe_key = secret["stripe"]
 
+# Upper bound on concurrent Redshift connections held by this process
+POOL_MAX_CONNECTIONS = 5
+
+# How execute_query pulls rows: "stream" (server-side cursor, chunked), "fetchall",
+# or "copy" (COPY ... TO STDOUT bulk export; Postgres only, falls back to "stream")
+FETCH_MODE = "stream"
+STREAM_CHUNK_SIZE = 50000
+
+# df_ads is reloaded by a background thread DATA_REFRESH_LEAD_SECONDS before it is
+# DATA_TTL_SECONDS old; page loads are always served the last good dataset
+DATA_TTL_SECONDS = 3600
+DATA_REFRESH_LEAD_SECONDS = 300
+DATA_RETRY_SECONDS = 60
+
+# Load df_ads as ads_fact_query plus the account -> buid dimension queries, run in parallel on
+# pooled connections; the dimensions change rarely and are re-fetched every DIMENSION_TTL_SECONDS
+SPLIT_QUERY_LOADING = True
+DIMENSION_TTL_SECONDS = 24 * 3600
+
+# Raw Dump downloads are generated on request by background workers and kept for reuse
+EXPORT_WORKERS = 2
+EXPORT_CACHE_ENTRIES = 8
+EXPORT_POLL_SECONDS = 0.5
+
+# Raw Data table rows are sent to the browser one page at a time; search and sort orders are kept (LRU)
+RAW_TABLE_PAGE_SIZES = [50, 100, 250, 500, 1000]
+DERIVED_CACHE_ENTRIES = 32
+DERIVED_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+# Look-back windows and bucket sizes offered on the Hourly Update tab, in minutes;
+# ads_latest_status_query loads 24 hours of edits, so no window may be longer
+LOOKBACK_WINDOW_MINUTES = [15, 30, 60, 120, 240, 360, 720, 1440]
+BUCKET_MINUTES = [5, 15, 30, 60, 120, 240]
+DEFAULT_LOOKBACK_MINUTES = 240
+DEFAULT_BUCKET_MINUTES = 60
+
 
 st.set_page_config( page_title = "Ads Dashboard",
     page_icon=":bar_chart:",
     layout="wide",
     initial_sidebar_state="expanded")
 
-# Configure Streamlit to handle larger datasets and improve WebSocket stability
-# This increases the message size limit to handle large dataframes
-st.config.set_option('server.maxMessageSize', 1000)
-
-# Additional WebSocket stability configurations
+# WebSocket stability configurations
 st.config.set_option('server.enableWebsocketCompression', True)
 st.config.set_option('server.enableCORS', False)
 st.config.set_option('server.maxUploadSize', 200)
@@ -86,22 +147,27 @@ st.config.set_option('server.maxUploadSize', 200)
 
 st.write("Successfully connected to the database!")
 
-def redshift_connection(dbname, user, password, host, port):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                logging.info(f"Attempting to connect to database: {host}:{port}/{dbname} as user {user}")
-                
-                connection = psycopg2.connect(
-                    dbname=dbname,
-                    user=user,
-                    password=password,
-                    host=host,
-                    port=port
-                )
-                
-                logging.info("Database connection established successfully")
+def redshift_credentials():
+    """Connection settings from the current (possibly rotated) Redshift secret"""
+    secret = get_secret_cache().get(REDSHIFT_SECRET_NAME)
+    return dict(dbname=secret["db"], user=secret["name"], password=secret["passw"],
+                host=secret["server"], port=secret["port"])
+
+@st.cache_resource
+def get_connection_pool():
+    """Process-wide Redshift connection pool for the current secret, shared by every Streamlit session"""
+    logging.info(f"Creating rotating connection pool (max {POOL_MAX_CONNECTIONS} connections)")
+    return RotatingConnectionPool(redshift_credentials, max_size=POOL_MAX_CONNECTIONS)
+
+def redshift_connection(func):
+    """Run `func` on a pooled connection, resolving the credentials on every call rather than once per script run"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            pool = get_connection_pool().get()
+            
+            with pool.connection() as connection:
+                logging.info("Database connection acquired from pool")
                 cursor = connection.cursor()
 
                 logging.info("Executing query...")
@@ -109,34 +175,38 @@ def redshift_connection(dbname, user, password, host, port):
                 logging.info("Query executed successfully")
 
                 cursor.close()
-                connection.close()
-                logging.info("Database connection closed")
-
-                return result
-
-            except psycopg2.OperationalError as e:
-                logging.error(f"Database operational error: {str(e)}")
-                st.error(f"Database connection error: {str(e)}")
-                return None
-            except psycopg2.Error as e:
-                logging.error(f"Database error: {str(e)}")
-                st.error(f"Database error: {str(e)}")
-                return None
-            except Exception as e:
-                logging.error(f"Unexpected error in database connection: {str(e)}")
-                st.error(f"Unexpected error: {str(e)}")
-                return None
-
-        return wrapper
-
-    return decorator
-
-
-ads_data_query = '''SELECT buid,a.ad_account_id,a.ad_id,ad_status,effective_status,a.created_at,edited_at as status_change_date,error_type,error_description
--- ,spend
- FROM
-(
-SELECT a.ad_account_id,ad_id,ad_status,effective_status,edited_at,a.created_at,ad_review_feedback,error_description,error_type
+            
+            logging.info(f"Database connection returned to pool: {pool.stats()}")
+
+            return result
+
+        except PoolExhaustedError as e:
+            logging.error(f"Connection pool exhausted: {str(e)}")
+            st.error(f"Database is busy, please retry shortly: {str(e)}")
+            return None
+
+        except psycopg2.OperationalError as e:
+            logging.error(f"Database operational error: {str(e)}")
+            if "authentication failed" in str(e):
+                # The password was rotated after the secret was cached; fetch it again on the next call
+                get_secret_cache().invalidate(REDSHIFT_SECRET_NAME)
+            st.error(f"Database connection error: {str(e)}")
+            return None
+        except psycopg2.Error as e:
+            logging.error(f"Database error: {str(e)}")
+            st.error(f"Database error: {str(e)}")
+            return None
+        except Exception as e:
+            logging.error(f"Unexpected error in database connection: {str(e)}")
+            st.error(f"Unexpected error: {str(e)}")
+            return None
+
+    return wrapper
+
+
+# Latest status of every child-account ad edited in the last 24 hours (and all of today, UTC):
+# the facts half of ads_data_query. The span covers the longest LOOKBACK_WINDOW_MINUTES option
+ads_latest_status_query = '''SELECT a.ad_account_id,ad_id,ad_status,effective_status,edited_at,a.created_at,ad_review_feedback,error_description,error_type
  FROM
 (SELECT 
   fad.ad_account_id,
@@ -170,10 +240,16 @@ SELECT a.ad_account_id,ad_id,ad_status,effective_status,edited_at,a.created_at,a
 FROM zocket_global.fb_ads_details_v3 fad
 JOIN zocket_global.fb_child_ad_accounts fcaa 
   ON fad.ad_account_id = fcaa.ad_account_id
-where date(edited_at) = current_date
+where edited_at >= least(current_date, getdate() - interval '24 hours')
 )a
 where rw=1
-) a
+'''
+
+ads_data_query = f'''SELECT buid,a.ad_account_id,a.ad_id,ad_status,effective_status,a.created_at,edited_at as status_change_date,error_type,error_description
+-- ,spend
+ FROM
+(
+{ads_latest_status_query}) a
 -- left join
 -- ( select ad_id,sum(spend)spend  from zocket_global.fb_ads_age_gender_metrics_v3 
 -- group by 1)b on a.ad_id=b.ad_id
@@ -188,11 +264,48 @@ left join
      json_extract_path_text(json_extract_array_element_text(business_user_ids, 0), 'role') = 'owner' )bp on e.app_business_id=bp.id
 '''
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour to reduce database load
-@redshift_connection(db,name,passw,server,port)
-def execute_query(connection, cursor,query):
+# ads_data_query without buid; SplitAdsLoader resolves it from account_buid_queries instead
+ads_fact_query = f'''SELECT a.ad_account_id,a.ad_id,ad_status,effective_status,a.created_at,edited_at as status_change_date,error_type,error_description
+ FROM
+(
+{ads_latest_status_query}) a
+'''
+
+# The joins ads_data_query makes after the facts: account -> business manager -> business -> owner buid
+account_buid_queries = {
+    "accounts": "SELECT ad_account_id, app_business_manager_id FROM zocket_global.fb_child_ad_accounts",
+    "business_managers": "SELECT id, app_business_id FROM zocket_global.fb_child_business_managers",
+    "business_owners": '''SELECT id,
+     json_extract_path_text(json_extract_array_element_text(business_user_ids, 0), 'business_user_id') AS buid
+ FROM
+     zocket_global.business_profile
+ WHERE
+     json_extract_path_text(json_extract_array_element_text(business_user_ids, 0), 'role') = 'owner'
+''',
+}
+
+# Not cached itself: the background refresher below keeps the last good result
+@redshift_connection
+def execute_query(connection, cursor,query, _on_chunk=None):
     try:
         logging.info(f"Executing query with {len(query)} characters")
+        
+        if FETCH_MODE == "copy":
+            try:
+                result = fetch_dataframe_copy(connection, query, dtype=ADS_DATA_DTYPES, parse_dates=ADS_DATE_COLUMNS)
+                logging.info(f"DataFrame bulk-loaded via COPY with shape: {result.shape}")
+                return result
+            except psycopg2.Error as e:
+                # Redshift does not support COPY ... TO STDOUT; fall back to streaming
+                logging.warning(f"COPY fetch failed, falling back to streaming: {str(e)}")
+                connection.rollback()
+        
+        if FETCH_MODE in ("stream", "copy"):
+            # Server-side cursor, built column by column so row tuples never pile up
+            result = fetch_dataframe_chunked(connection, query, chunk_size=STREAM_CHUNK_SIZE, on_chunk=_on_chunk)
+            logging.info(f"DataFrame streamed with shape: {result.shape}")
+            return result
+        
         cursor.execute(query)
         logging.info("Fetching results...")
         column_names = [desc[0] for desc in cursor.description]
@@ -210,45 +323,184 @@ def execute_query(connection, cursor,query):
         st.error(f"Query execution error: {str(e)}")
         raise
 
-# Load data with error handling and progress indication
-try:
-    logging.info("Starting data load process")
+def prepare_ads_frame(source):
+    """Build the shared df_ads once per loaded dataset: parse dates and add derived columns"""
+    frame = source.copy()
+    if frame.empty:
+        return frame
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    # Convert date columns to datetime once and precompute their day numbers
+    try:
+        frame = normalize_ads_dates(frame)
+    except Exception as e:
+        logging.warning(f"Could not convert date columns: {str(e)}")
     
-    status_text.text("Connecting to database...")
-    progress_bar.progress(25)
+    # Categorical columns and integer ad_id make every filter and groupby cheaper
+    usage_before = frame.memory_usage(deep=True, index=False)
+    frame = apply_ads_schema(frame)
+    logging.info(f"df_ads memory by column:\n{memory_report(usage_before, frame.memory_usage(deep=True, index=False))}")
     
+    # ad_link is not stored; ad_links builds it for the rows actually displayed or exported
+    return frame
+
+def minutes_label(minutes):
+    """Short label for a duration in minutes, e.g. 15 min, 1 hour, 24 hours"""
+    if minutes % 60:
+        return f"{minutes} min"
+    hours = minutes // 60
+    return f"{hours} hour" if hours == 1 else f"{hours} hours"
+
+@st.cache_resource
+def get_shared_dataset_cache():
+    """Prepared, read-only df_ads referenced by every session without copying"""
+    return SharedDatasetCache()
+
+@st.cache_resource
+def get_query_flights():
+    """Redshift queries in flight, shared by every session and the background refresher"""
+    return SingleFlight()
+
+def fetch_query(query, _on_chunk=None):
+    """execute_query, joining an identical query that is already in flight instead of running it again"""
+    flights = get_query_flights()
+    result = flights.do(query_hash(query), lambda: execute_query(query=query, _on_chunk=_on_chunk))
+    logging.info(f"Query single-flight: {flights.stats}")
+    return result
+
+@st.cache_resource
+def get_split_ads_loader():
+    """Fact/dimension split loader whose account -> buid map is shared by every session"""
+    return SplitAdsLoader(
+        account_buid_queries,
+        dimension_ttl=DIMENSION_TTL_SECONDS,
+        max_workers=len(account_buid_queries)
+    )
+
+def fetch_ads(_on_chunk=None):
+    """The last 24 hours' df_ads rows, as split fact and dimension queries if SPLIT_QUERY_LOADING"""
+    if not SPLIT_QUERY_LOADING:
+        return fetch_query(query=ads_data_query, _on_chunk=_on_chunk)
+    loader = get_split_ads_loader()
+    result = loader.load(ads_fact_query, fetch_query, on_chunk=_on_chunk)
+    logging.info(f"Split ads load: {loader.stats}")
+    return result
+
+def load_ads_dataset(_on_chunk=None, background=False):
+    """Run ads_data_query and publish the result as the shared, prepared dataset; None if the query failed"""
     logging.info("Calling execute_query...")
-    df_ads = execute_query(query=ads_data_query)
-    logging.info(f"execute_query returned: {type(df_ads)}")
+    source = fetch_ads(_on_chunk=_on_chunk)
+    logging.info(f"execute_query returned: {type(source)}")
+    if source is None:
+        logging.error("Query returned None - database connection or query failed")
+        return None
+    return get_shared_dataset_cache().publish(source, prepare=prepare_ads_frame)
+
+@st.cache_resource
+def get_ads_refresher():
+    """Last good shared dataset, reloaded ahead of expiry by a background thread shared by every session"""
+    return BackgroundRefresher(
+        load_ads_dataset,
+        ttl=DATA_TTL_SECONDS,
+        lead=DATA_REFRESH_LEAD_SECONDS,
+        retry_after=DATA_RETRY_SECONDS,
+    )
+
+@st.cache_resource
+def get_derived_result_cache():
+    """Raw Data table row orders, keyed by dataset version, search and sort and shared by every session"""
+    return DerivedResultCache(max_entries=DERIVED_CACHE_ENTRIES, max_bytes=DERIVED_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def get_export_manager():
+    """Background workers and finished Raw Dump downloads shared by every session"""
+    return ExportManager(max_workers=EXPORT_WORKERS, max_entries=EXPORT_CACHE_ENTRIES)
+
+@st.fragment(run_every=EXPORT_POLL_SECONDS)
+def export_progress(job, label):
+    """Progress of a running export, polled on its own so the rest of the page stays usable"""
+    if job.running:
+        st.progress(job.progress, text=f"Preparing {label}... {job.progress:.0%}")
+        return
+    if job.error:
+        # Failed jobs are dropped by the manager; keep the message for the rerun below
+        st.session_state[f"export_error_{job.key}"] = job.error
+    # Rerun the page once so the download button replaces the progress bar
+    st.rerun()
+
+def export_download_button(export_key, build, label, icon, file_name, mime, help_text):
+    """Download button for an export generated only on request, in the background, with progress"""
+    error = st.session_state.pop(f"export_error_{export_key}", None)
+    if error:
+        st.error(f"Could not prepare the {label} download: {error}")
     
-    progress_bar.progress(75)
+    export_manager = get_export_manager()
+    job = export_manager.get(export_key)
+    if job is None:
+        if not st.button(f"{icon} Prepare {label}", key=f"prepare_{export_key}", help=help_text):
+            return
+        job = export_manager.submit(export_key, build)
     
-    status_text.text("Processing data...")
+    if job.running:
+        export_progress(job, label)
+        return
     
-    if df_ads is None:
-        logging.error("Query returned None - database connection or query failed")
+    if job.error:
+        st.error(f"Could not prepare the {label} download: {job.error}")
+        return
+    st.download_button(
+        label=f"{icon} Download {label}",
+        data=job.data,
+        file_name=file_name,
+        mime=mime,
+        help=help_text,
+        key=f"download_{export_key}",
+    )
+
+# Load data with error handling; only the first load in this process shows progress and waits
+try:
+    logging.info("Starting data load process")
+    
+    ads_refresher = get_ads_refresher()
+    if ads_refresher.ready:
+        ads_dataset = ads_refresher.get()
+    else:
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        
+        status_text.text("Connecting to database...")
+        progress_bar.progress(25)
+        
+        def report_rows_fetched(rows_so_far):
+            status_text.text(f"Fetching data... {rows_so_far:,} rows loaded")
+        
+        ads_dataset = ads_refresher.get(_on_chunk=report_rows_fetched)
+        logging.info(f"Dataset warm-up single-flight: {ads_refresher.warm_up_stats}")
+        progress_bar.empty()
+        status_text.empty()
+    
+    if ads_dataset is None:
         st.error("Failed to load ads data. Please check your database connection.")
         st.stop()
     
+    # Shared across sessions: never mutate df_ads, select rows by position instead
+    df_ads = ads_dataset.frame
+    
     if df_ads.empty:
         logging.warning("Query returned empty DataFrame - no data found")
-        st.warning("No ads data found in the database for today's date.")
+        st.warning("No ads data found in the database for the last 24 hours.")
         # Don't stop, just show a message
-        st.info("This could be because there are no ads edited today, or the query returned no results.")
+        st.info("This could be because there are no ads edited in the last 24 hours, or the query returned no results.")
+    else:
+        logging.info(f"Serving {len(df_ads)} rows of data (dataset v{ads_dataset.version})")
     
-    if df_ads is not None and not df_ads.empty:
-        logging.info(f"Successfully loaded {len(df_ads)} rows of data")
-        progress_bar.progress(100)
-        status_text.text("Data loaded successfully!")
-        
-        # Clear progress indicators after a short delay
-        import time
-        time.sleep(0.5)
-        progress_bar.empty()
-        status_text.empty()
+    data_as_of = pd.Timestamp(ads_refresher.loaded_at, unit='s', tz='UTC')
+    data_as_of_ist = data_as_of + pd.Timedelta(hours=5, minutes=30)
+    st.caption(
+        f"🕒 Data as of {data_as_of.strftime('%Y-%m-%d %H:%M')} UTC ({data_as_of_ist.strftime('%H:%M')} IST), "
+        f"refreshed in the background every {(DATA_TTL_SECONDS - DATA_REFRESH_LEAD_SECONDS) // 60} minutes"
+    )
+    if ads_refresher.last_error:
+        st.warning(f"⚠️ The latest data refresh failed, showing the last good data: {ads_refresher.last_error}")
     
 except Exception as e:
     logging.error(f"Error in data loading section: {str(e)}", exc_info=True)
@@ -256,40 +508,8 @@ except Exception as e:
     st.exception(e)
     st.stop()
 
-# Function to generate Facebook Ads Manager URL
-def generate_ad_link(ad_account_id, ad_id):
-    """
-    Generate Facebook Ads Manager URL for a specific ad.
-    Removes 'act_' prefix from ad_account_id and uses the ad_id directly.
-    """
-    # Remove 'act_' prefix if it exists
-    clean_account_id = ad_account_id.replace('act_', '') if ad_account_id.startswith('act_') else ad_account_id
-    
-    # Generate the URL
-    url = f"https://adsmanager.facebook.com/adsmanager/manage/ads/edit/standalone?act={clean_account_id}&columns=name%2Cdelivery%2Crecommendations_guidance%2Ccampaign_name%2Cbid%2Cbudget%2Clast_significant_edit%2Cattribution_setting%2Cresults%2Creach%2Cimpressions%2Ccost_per_result%2Cquality_score_organic%2Cquality_score_ectr%2Cquality_score_ecvr%2Cspend%2Cend_time%2Cschedule%2Ccpm%2Cpurchase_roas%3Aomni_purchase%2Cfrequency%2Cactions%3Aomni_purchase%2Ccreated_time&attribution_windows=default&filter_set=CAMPAIGN_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]%1DCAMPAIGN_GROUP_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]%1DADGROUP_DELIVERY_STATUS-STRING_SET%1EIN%1E[%22active%22%2C%22draft%22%2C%22pending%22%2C%22inactive%22%2C%22error%22%2C%22deleted%22%2C%22completed%22%2C%22off%22]&selected_ad_ids={ad_id}&sort=created_time~0&current_step=0&ads_manager_write_regions=true&nav_source=no_referrer#"
-    return url
-
-# Convert date columns to proper datetime format
-if not df_ads.empty:
-    try:
-        # Convert string dates to datetime objects
-        if 'created_at' in df_ads.columns:
-            df_ads['created_at'] = pd.to_datetime(df_ads['created_at'])
-        if 'status_change_date' in df_ads.columns:
-            df_ads['status_change_date'] = pd.to_datetime(df_ads['status_change_date'])
-    except Exception as e:
-        st.warning(f"Warning: Could not convert date columns: {str(e)}")
-
-# Add ad_link column to df_ads with error handling
-if not df_ads.empty and 'ad_account_id' in df_ads.columns and 'ad_id' in df_ads.columns:
-    try:
-        df_ads['ad_link'] = df_ads.apply(lambda row: generate_ad_link(row['ad_account_id'], row['ad_id']), axis=1)
-    except Exception as e:
-        st.warning(f"Warning: Could not generate ad links: {str(e)}")
-        df_ads['ad_link'] = "Link unavailable"
-
-# Use all data without filters
-    filtered_df_ads = df_ads.copy()
+# Use all data without filters; df_ads is shared across sessions and never mutated
+filtered_df_ads = df_ads
 
 # Create tabs for navigation
 tab1, tab2, tab3 = st.tabs(["⏰ Hourly Update", "📊 Today's Stats", "📋 Raw Dump"])
@@ -299,9 +519,33 @@ with tab1:
     try:
         st.title("⏰ Hourly Update")
         
-        # Get current UTC time and calculate last 4 hours
+        # Look-back window and bucket size chosen by the user
+        col1, col2 = st.columns(2)
+        with col1:
+            window_minutes = st.selectbox(
+                "Look-back window",
+                LOOKBACK_WINDOW_MINUTES,
+                index=LOOKBACK_WINDOW_MINUTES.index(DEFAULT_LOOKBACK_MINUTES),
+                format_func=minutes_label,
+            )
+        with col2:
+            # Buckets that tile the window exactly
+            bucket_options = [m for m in BUCKET_MINUTES if m <= window_minutes and window_minutes % m == 0]
+            bucket_minutes = st.selectbox(
+                "Bucket size",
+                bucket_options,
+                index=bucket_options.index(min(DEFAULT_BUCKET_MINUTES, max(bucket_options))),
+                format_func=minutes_label,
+            )
+        window = pd.Timedelta(minutes=window_minutes)
+        bucket = pd.Timedelta(minutes=bucket_minutes)
+        n_buckets = window_minutes // bucket_minutes
+        window_text = minutes_label(window_minutes)
+        bucket_text = minutes_label(bucket_minutes)
+        
+        # Get current UTC time and the start of the look-back window
         current_utc = pd.Timestamp.now(tz='UTC')
-        four_hours_ago_utc = current_utc - pd.Timedelta(hours=4)
+        window_start_utc = current_utc - window
         
         # Display timeframe information
         st.subheader("🕐 Timeframe Information")
@@ -315,110 +559,95 @@ with tab1:
         
         with col2:
             # Calculate IST times for analysis period
-            four_hours_ago_ist = four_hours_ago_utc + pd.Timedelta(hours=5, minutes=30)
+            window_start_ist = window_start_utc + pd.Timedelta(hours=5, minutes=30)
             current_ist = current_utc + pd.Timedelta(hours=5, minutes=30)
-            st.info(f"**Analysis Period:** Last 4 hours\n\nUTC: {four_hours_ago_utc.strftime('%Y-%m-%d %H:%M:%S')} - {current_utc.strftime('%Y-%m-%d %H:%M:%S')}\n\nIST: {four_hours_ago_ist.strftime('%Y-%m-%d %H:%M:%S')} - {current_ist.strftime('%Y-%m-%d %H:%M:%S')}")
+            st.info(f"**Analysis Period:** Last {window_text} in {bucket_text} buckets\n\nUTC: {window_start_utc.strftime('%Y-%m-%d %H:%M:%S')} - {current_utc.strftime('%Y-%m-%d %H:%M:%S')}\n\nIST: {window_start_ist.strftime('%Y-%m-%d %H:%M:%S')} - {current_ist.strftime('%Y-%m-%d %H:%M:%S')}")
 
         if not df_ads.empty:
-            # Use the already converted datetime columns and ensure they have UTC timezone
-            df_ads_hourly = df_ads.copy()
-            
-            # Ensure datetime columns have UTC timezone
-            if 'created_at' in df_ads_hourly.columns:
-                if df_ads_hourly['created_at'].dt.tz is None:
-                    df_ads_hourly['created_at'] = df_ads_hourly['created_at'].dt.tz_localize('UTC')
-                else:
-                    df_ads_hourly['created_at'] = df_ads_hourly['created_at'].dt.tz_convert('UTC')
-            
-            if 'status_change_date' in df_ads_hourly.columns:
-                if df_ads_hourly['status_change_date'].dt.tz is None:
-                    df_ads_hourly['status_change_date'] = df_ads_hourly['status_change_date'].dt.tz_localize('UTC')
-                else:
-                    df_ads_hourly['status_change_date'] = df_ads_hourly['status_change_date'].dt.tz_convert('UTC')
-            
-            # Filter data for last 4 hours
-            last_4_hours_data = df_ads_hourly[
-                (df_ads_hourly['status_change_date'] >= four_hours_ago_utc) &
-                (df_ads_hourly['status_change_date'] <= current_utc)
-            ]
+            # Disapprovals per (rolling bucket, clock bucket, account, error type), located with
+            # binary search on the per-dataset time index; every widget below sums this small table
+            bucket_counts = recent_disapprovals(
+                df_ads, current_utc, window, bucket,
+                time_index=ads_dataset.derived('status_change_index', TimeIndex),
+            )
+            window_cells = bucket_counts[bucket_counts['buckets_ago'].between(-1, n_buckets - 1)]
+            
+            def rolling_bucket_rows(counts):
+                """Breakdown rows for each rolling bucket of the window, most recent first, with UTC and IST times"""
+                rejected_by_bucket = counts.groupby('buckets_ago')['no_of_ads'].sum().reindex(range(n_buckets), fill_value=0)
+                rows = []
+                for i, rejected in rejected_by_bucket.items():
+                    period_start = current_utc - bucket * (i + 1)
+                    period_end = current_utc - bucket * i
+                    # Calculate IST times for display
+                    period_start_ist = period_start + pd.Timedelta(hours=5, minutes=30)
+                    period_end_ist = period_end + pd.Timedelta(hours=5, minutes=30)
+                    rows.append({
+                        'Period UTC': f"{period_start.strftime('%H:%M')} - {period_end.strftime('%H:%M')} UTC",
+                        'Period IST': f"{period_start_ist.strftime('%H:%M')} - {period_end_ist.strftime('%H:%M')} IST",
+                        'Rejected Ads': int(rejected)
+                    })
+                return rows
             
-            # Calculate hourly metrics
-            st.subheader("📊 Last 4 Hours Metrics")
+            # Calculate window metrics
+            st.subheader(f"📊 Last {window_text} Metrics")
             
-            # Total ads rejected in last 4 hours
-            total_rejected_4h = len(last_4_hours_data[last_4_hours_data['ad_status'] == 'DISAPPROVED'])
+            # Total ads rejected in the window
+            total_rejected_window = int(window_cells['no_of_ads'].sum())
             
-            # Ads rejected in the last hour specifically
-            one_hour_ago_utc = current_utc - pd.Timedelta(hours=1)
-            last_hour_data = df_ads_hourly[
-                (df_ads_hourly['status_change_date'] >= one_hour_ago_utc) &
-                (df_ads_hourly['status_change_date'] <= current_utc)
-            ]
-            ads_rejected_last_hour = len(last_hour_data[last_hour_data['ad_status'] == 'DISAPPROVED'])
+            # Ads rejected in the most recent bucket specifically
+            last_bucket_start_utc = current_utc - bucket
+            ads_rejected_last_bucket = int(
+                bucket_counts.loc[bucket_counts['buckets_ago'].between(-1, 0), 'no_of_ads'].sum()
+            )
             
             # Display metrics in columns
             col1, col2, col3 = st.columns(3)
             
             with col1:
                 st.metric(
-                    "Ads Rejected in Last Hour", 
-                    ads_rejected_last_hour,
-                    help=f"Ads rejected between {one_hour_ago_utc.strftime('%H:%M')} UTC and {current_utc.strftime('%H:%M')} UTC"
+                    f"Ads Rejected in Last {bucket_text}", 
+                    ads_rejected_last_bucket,
+                    help=f"Ads rejected between {last_bucket_start_utc.strftime('%H:%M')} UTC and {current_utc.strftime('%H:%M')} UTC"
                 )
             
             with col2:
                 st.metric(
-                    "Ads Rejected in Last 4 Hours", 
-                    total_rejected_4h,
-                    help=f"Total ads rejected between {four_hours_ago_utc.strftime('%H:%M')} UTC and {current_utc.strftime('%H:%M')} UTC"
+                    f"Ads Rejected in Last {window_text}", 
+                    total_rejected_window,
+                    help=f"Total ads rejected between {window_start_utc.strftime('%Y-%m-%d %H:%M')} UTC and {current_utc.strftime('%H:%M')} UTC"
                 )
             
             with col3:
-                # Calculate hourly breakdown
-                hourly_breakdown = []
-                for i in range(4):
-                    hour_start = current_utc - pd.Timedelta(hours=i+1)
-                    hour_end = current_utc - pd.Timedelta(hours=i)
-                    hour_data = df_ads_hourly[
-                        (df_ads_hourly['status_change_date'] >= hour_start) &
-                        (df_ads_hourly['status_change_date'] < hour_end) &
-                        (df_ads_hourly['ad_status'] == 'DISAPPROVED')
-                    ]
-                    # Calculate IST times for display
-                    hour_start_ist = hour_start + pd.Timedelta(hours=5, minutes=30)
-                    hour_end_ist = hour_end + pd.Timedelta(hours=5, minutes=30)
-                    
-                    hourly_breakdown.append({
-                        'Hour UTC': f"{hour_start.strftime('%H')}:00 - {hour_end.strftime('%H')}:00 UTC",
-                        'Hour IST': f"{hour_start_ist.strftime('%H')}:00 - {hour_end_ist.strftime('%H')}:00 IST",
-                        'Rejected Ads': len(hour_data)
-                    })
+                # Calculate per-bucket breakdown
+                bucket_breakdown = rolling_bucket_rows(bucket_counts)
                 
                 st.metric(
-                    "Peak Hour Rejections", 
-                    max([h['Rejected Ads'] for h in hourly_breakdown]) if hourly_breakdown else 0,
-                    help="Highest number of rejections in any single hour"
+                    f"Peak {bucket_text} Rejections", 
+                    max([b['Rejected Ads'] for b in bucket_breakdown]) if bucket_breakdown else 0,
+                    help=f"Highest number of rejections in any single {bucket_text} bucket"
                 )
             
-            # Top 5 Ad Accounts with rejected ads in last 4 hours
-            st.subheader("🏆 Top 5 Ad Accounts (Last 4 Hours)")
+            # Top 5 Ad Accounts with rejected ads in the window
+            st.subheader(f"🏆 Top 5 Ad Accounts (Last {window_text})")
             
-            if total_rejected_4h > 0:
-                # Get top accounts by rejected ads count
-                top_accounts_4h = (
-                    last_4_hours_data[last_4_hours_data['ad_status'] == 'DISAPPROVED']
-                    .groupby('ad_account_id')
+            if total_rejected_window > 0:
+                # Get top accounts by rejected ads count, with the buid of each account's first rejected row
+                top_accounts_window = (
+                    window_cells
+                    .groupby('ad_account_id', observed=True)
                     .agg(
-                        rejected_ads=('ad_id', 'count'),
-                        buid=('buid', 'first')
+                        rejected_ads=('no_of_ads', 'sum'),
+                        first_row=('first_row', 'min')
                     )
                     .sort_values('rejected_ads', ascending=False)
                     .head(5)
                 )
+                top_accounts_window['buid'] = df_ads['buid'].to_numpy()[top_accounts_window['first_row'].to_numpy()]
                 
-                if not top_accounts_4h.empty:
+                if not top_accounts_window.empty:
                     # Display top accounts
-                    for idx, (account_id, row) in enumerate(top_accounts_4h.iterrows(), 1):
+                    for idx, (account_id, row) in enumerate(top_accounts_window.iterrows(), 1):
                         col1, col2, col3 = st.columns([1, 3, 1])
                         
                         with col1:
@@ -431,100 +660,75 @@ with tab1:
                         with col3:
                             st.metric("Rejected Ads", row['rejected_ads'])
                     
-                    # Hourly breakdown for top accounts
-                    st.subheader("📈 Hourly Breakdown for Top Accounts")
+                    # Per-bucket breakdown for top accounts
+                    st.subheader(f"📈 {bucket_text} Breakdown for Top Accounts")
                     
-                    for account_id in top_accounts_4h.index[:3]:  # Show breakdown for top 3 accounts
+                    for account_id in top_accounts_window.index[:3]:  # Show breakdown for top 3 accounts
                         st.write(f"**Account: {account_id}**")
                         
-                        account_hourly_data = []
-                        for i in range(4):
-                            hour_start = current_utc - pd.Timedelta(hours=i+1)
-                            hour_end = current_utc - pd.Timedelta(hours=i)
-                            hour_data = df_ads_hourly[
-                                (df_ads_hourly['ad_account_id'] == account_id) &
-                                (df_ads_hourly['status_change_date'] >= hour_start) &
-                                (df_ads_hourly['status_change_date'] < hour_end) &
-                                (df_ads_hourly['ad_status'] == 'DISAPPROVED')
-                            ]
-                            # Calculate IST times for display
-                            hour_start_ist = hour_start + pd.Timedelta(hours=5, minutes=30)
-                            hour_end_ist = hour_end + pd.Timedelta(hours=5, minutes=30)
-                            
-                            account_hourly_data.append({
-                                'Hour UTC': f"{hour_start.strftime('%H')}:00 - {hour_end.strftime('%H')}:00 UTC",
-                                'Hour IST': f"{hour_start_ist.strftime('%H')}:00 - {hour_end_ist.strftime('%H')}:00 IST",
-                                'Rejected Ads': len(hour_data)
-                            })
-                        
-                        account_df = pd.DataFrame(account_hourly_data)
+                        account_df = pd.DataFrame(
+                            rolling_bucket_rows(bucket_counts[bucket_counts['ad_account_id'] == account_id])
+                        )
                         st.dataframe(account_df, use_container_width=True, hide_index=True)
                         st.write("---")
                 
                 else:
-                    st.warning("No rejected ads found in the last 4 hours.")
+                    st.warning(f"No rejected ads found in the last {window_text}.")
             else:
-                st.success("🎉 **Great news!** No ads were rejected in the last 4 hours.")
+                st.success(f"🎉 **Great news!** No ads were rejected in the last {window_text}.")
             
             # Additional insights
             st.subheader("💡 Additional Insights")
             
-            # Error type breakdown for last 4 hours
-            if total_rejected_4h > 0:
+            # Error type breakdown for the window
+            if total_rejected_window > 0:
                 error_breakdown = (
-                    last_4_hours_data[last_4_hours_data['ad_status'] == 'DISAPPROVED']
-                    .groupby('error_type')
-                    .size()
+                    window_cells
+                    .groupby('error_type', observed=True)['no_of_ads']
+                    .sum()
                     .sort_values(ascending=False)
                 )
                 
                 if not error_breakdown.empty:
-                    st.write("**Top Error Types (Last 4 Hours):**")
+                    st.write(f"**Top Error Types (Last {window_text}):**")
                     for error_type, count in error_breakdown.head(3).items():
                         st.write(f"• {error_type}: {count} rejections")
             
             # Trend analysis
             st.subheader("📊 Trend Analysis")
             
-            # Create hourly trend data grouped by actual hour
+            # Create trend data grouped by clock-aligned bucket, oldest first
+            clock_bucket_counts = bucket_counts.groupby('bucket')['no_of_ads'].sum()
+            current_bucket_start = current_utc.floor(bucket)
             trend_data = []
-            for i in range(4):
-                # Get the hour we're analyzing (going backwards from current hour)
-                target_hour = current_utc - pd.Timedelta(hours=i)
-                hour_start = target_hour.replace(minute=0, second=0, microsecond=0)
-                hour_end = hour_start + pd.Timedelta(hours=1)
-                
-                # Filter data for this specific hour
-                hour_data = df_ads_hourly[
-                    (df_ads_hourly['status_change_date'] >= hour_start) &
-                    (df_ads_hourly['status_change_date'] < hour_end) &
-                    (df_ads_hourly['ad_status'] == 'DISAPPROVED')
-                ]
+            for i in reversed(range(n_buckets)):
+                # Get the bucket we're analyzing (going backwards from the current one)
+                period_start = current_bucket_start - bucket * i
                 
                 # Calculate IST time for display
-                hour_start_ist = hour_start + pd.Timedelta(hours=5, minutes=30)
+                period_start_ist = period_start + pd.Timedelta(hours=5, minutes=30)
                 
                 trend_data.append({
-                    'Hour': f"{hour_start.strftime('%H')} UTC",
-                    'Hour_IST': f"{hour_start_ist.strftime('%H')} IST",
-                    'Rejected Ads': len(hour_data)
+                    'Start': period_start.tz_localize(None),
+                    'Period': f"{period_start.strftime('%H:%M')} UTC",
+                    'Period_IST': f"{period_start_ist.strftime('%H:%M')} IST",
+                    'Rejected Ads': int(clock_bucket_counts.get(period_start, 0))
                 })
             
             trend_df = pd.DataFrame(trend_data)
-            trend_df = trend_df.sort_values('Hour')
             
             # Display trend chart and table side by side
             col1, col2 = st.columns(2)
             
             with col1:
-                st.write("**Hourly Rejection Trend**")
-                st.line_chart(trend_df.set_index('Hour')['Rejected Ads'])
+                st.write(f"**{bucket_text} Rejection Trend (UTC)**")
+                st.line_chart(trend_df.set_index('Start')['Rejected Ads'])
             
             with col2:
-                st.write("**Hourly Breakdown**")
+                st.write(f"**{bucket_text} Breakdown**")
                 # Create display table with both UTC and IST times
-                display_df = trend_df[['Hour', 'Hour_IST', 'Rejected Ads']].copy()
-                display_df.columns = ['UTC Hour', 'IST Hour', 'Rejected Ads']
+                display_df = trend_df[['Period', 'Period_IST', 'Rejected Ads']].copy()
+                display_df.columns = ['UTC Period Start', 'IST Period Start', 'Rejected Ads']
                 st.dataframe(display_df, use_container_width=True, hide_index=True)
             
         else:
@@ -534,6 +738,9 @@ with tab1:
         st.error(f"Error in Hourly Update section: {str(e)}")
         st.info("Please try refreshing the page or contact support if the issue persists.")
 
+# Today's tables offered as extra sheets in the Excel download, filled in by Today's Stats
+excel_summary_sheets = {}
+
 # Today's Stats Section
 with tab2:
     try:
@@ -543,26 +750,15 @@ with tab2:
             # Calculate today's date
             today = pd.Timestamp.now().date()
             
-            # Use the already converted datetime columns
-            df_ads_copy = df_ads.copy()
-            
-            # Calculate today's metrics
-            today_ads = len(df_ads_copy[
-                df_ads_copy['created_at'].dt.date == today
-            ])
-            today_rejected = len(df_ads_copy[
-                (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                (df_ads_copy['status_change_date'].dt.date == today)
-            ])
+            # Today's metrics and per-account counts from the shared window metrics engine
+            today_counts = window_counts(df_ads, today)
+            today_ads = today_counts['published_today']
+            today_rejected = today_counts['rejected_today']
             
             # Top rejected account today
-            today_rejected_by_account = df_ads_copy[
-                (df_ads_copy['ad_status'] == 'DISAPPROVED') &
-                (df_ads_copy['status_change_date'].dt.date == today)
-            ].groupby('ad_account_id').size().sort_values(ascending=False)
-            
-            top_rejected_account_today = today_rejected_by_account.index[0] if len(today_rejected_by_account) > 0 else "None"
-            top_rejected_count_today = today_rejected_by_account.iloc[0] if len(today_rejected_by_account) > 0 else 0
+            top_rejected_account_today, top_rejected_count_today = top_group(
+                window_counts(df_ads, today, by='ad_account_id'), 'rejected_today'
+            )
             
             # Display metrics in columns
             col1, col2, col3 = st.columns(3)
@@ -586,7 +782,7 @@ with tab2:
         today_grouped_by_hour = (
             filtered_df_ads[
                 (filtered_df_ads['ad_status'] == 'DISAPPROVED') &
-                (filtered_df_ads['status_change_date'].dt.date == today)
+                (filtered_df_ads['status_change_day'] == date_to_day(today))
             ]
             .groupby(filtered_df_ads['status_change_date'].dt.hour)
             .agg(no_of_ads=('ad_id', 'count'))
@@ -597,19 +793,21 @@ with tab2:
         
         st.write("Today's Disapproved Ads Count by Hour")
         st.dataframe(today_grouped_by_hour, use_container_width=True)
+        excel_summary_sheets['Today by Hour'] = today_grouped_by_hour
 
         # Grouped data by error_type of disapproved ads for today
         today_error_grouped = (
             filtered_df_ads[
                 (filtered_df_ads['ad_status'] == 'DISAPPROVED') &
-                (filtered_df_ads['status_change_date'].dt.date == today)
+                (filtered_df_ads['status_change_day'] == date_to_day(today))
             ]
-            .groupby(['error_type'])
+            .groupby(['error_type'], observed=True)
             .agg(no_of_ads=('ad_id', 'count'))
             .sort_values('no_of_ads', ascending=False)
         )
         st.write("Today's Disapproved Ads Count by Error Type")
         st.dataframe(today_error_grouped, use_container_width=True)
+        excel_summary_sheets['Today by Error Type'] = today_error_grouped
 
         # Top accounts today
         st.subheader("🏆 Top Ad Accounts Today")
@@ -619,9 +817,9 @@ with tab2:
             top_accounts_today = (
                 filtered_df_ads[
                     (filtered_df_ads['ad_status'] == 'DISAPPROVED') &
-                    (filtered_df_ads['status_change_date'].dt.date == today)
+                    (filtered_df_ads['status_change_day'] == date_to_day(today))
                 ]
-                .groupby('ad_account_id')
+                .groupby('ad_account_id', observed=True)
                 .agg(
                     rejected_ads=('ad_id', 'count'),
                     buid=('buid', 'first')
@@ -638,6 +836,7 @@ with tab2:
                 summary_table = summary_table[['Rank', 'Ad Account ID', 'BUID', 'Rejected Ads Count']]
                 
                 st.dataframe(summary_table, use_container_width=True, hide_index=True)
+                excel_summary_sheets['Top Accounts Today'] = summary_table
             else:
                 st.warning("No rejected ads found today.")
         else:
@@ -656,42 +855,137 @@ with tab3:
         total_rows = len(filtered_df_ads)
         st.info(f"📊 **Total Records Available:** {total_rows:,}")
         
+        def build_export(writer):
+            """Serialize the rows behind this view; runs on an export worker, never on a rerun"""
+            # Day number columns are internal to the filters and stay out of the downloads;
+            # ad_link is generated chunk by chunk while writing
+            export_rows = filtered_df_ads
+            virtual_columns = {'ad_link': ad_links} if include_ad_link else None
+            return lambda progress: writer(
+                export_rows.drop(columns=list(DAY_COLUMNS.values()), errors='ignore'), progress,
+                virtual_columns=virtual_columns,
+            )
+        
         # Add download options
         st.subheader("📥 Download Data")
+        export_timestamp = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
+        # ad_link is most of every row's bytes and can be rebuilt from ad_account_id and ad_id
+        include_ad_link = st.checkbox(
+            "Include ad_link column",
+            value=True,
+            help="Leave out to shrink the downloads; the Parquet file keeps the link template in its metadata"
+        )
         col1, col2 = st.columns(2)
         
         with col1:
             # CSV Download
-            csv_data = filtered_df_ads.to_csv(index=False)
-            st.download_button(
-                label="📄 Download CSV",
-                data=csv_data,
-                file_name=f"ads_data_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            export_download_button(
+                derived_result_key(ads_dataset.version, 'export_csv', ad_link=include_ad_link),
+                build_export(write_csv),
+                label="CSV",
+                icon="📄",
+                file_name=f"ads_data_{export_timestamp}.csv",
                 mime="text/csv",
-                help="Download the data as CSV file"
+                help_text="Download the data as CSV file",
             )
         
         with col2:
-            # Excel Download
-            import io
-            excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                filtered_df_ads.to_excel(writer, index=False, sheet_name='Ads Data')
-            excel_data = excel_buffer.getvalue()
-            
-            st.download_button(
-                label="📊 Download Excel",
-                data=excel_data,
-                file_name=f"ads_data_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            # Excel Download, streamed sheet by sheet and split past Excel's row limit
+            include_summary_sheets = st.checkbox(
+                "Add today's tables as sheets",
+                disabled=not excel_summary_sheets,
+                help="Append the Today's Stats tables to the workbook as extra sheets"
+            )
+            summary_sheets = excel_summary_sheets if include_summary_sheets else {}
+            export_download_button(
+                derived_result_key(
+                    ads_dataset.version, 'export_xlsx', ad_link=include_ad_link,
+                    summary_sheets=bool(summary_sheets), today=pd.Timestamp.now().date() if summary_sheets else None,
+                ),
+                build_export(partial(write_excel, summary_sheets=summary_sheets)),
+                label="Excel",
+                icon="📊",
+                file_name=f"ads_data_{export_timestamp}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                help="Download the data as Excel file"
+                help_text="Download the data as Excel file",
             )
         
-        # Display the raw data table
+        # Compressed downloads, a fraction of the CSV size and much faster to produce
+        col3, col4, col5 = st.columns(3)
+        compressed_exports = (
+            (col3, 'export_parquet', "Parquet", "🗜️", "parquet", "application/octet-stream",
+             partial(write_parquet, metadata={'ad_link_template': AD_LINK_TEMPLATE}),
+             "Download the data as a zstd-compressed Parquet file. Rebuild ad_link with "
+             "ad_link_template from the file metadata: template.format(account_id=<id without act_>, ad_id=<ad_id>)"),
+            (col4, 'export_csv_gzip', "CSV (gzip)", "📦", "csv.gz", "application/gzip",
+             partial(write_csv, compression='gzip'),
+             "Download the data as a gzip-compressed CSV file"),
+            (col5, 'export_csv_zstd', "CSV (zstd)", "📦", "csv.zst", "application/zstd",
+             partial(write_csv, compression='zstd'),
+             "Download the data as a zstd-compressed CSV file"),
+        )
+        for column, name, label, icon, extension, mime, writer, help_text in compressed_exports:
+            with column:
+                export_download_button(
+                    derived_result_key(ads_dataset.version, name, ad_link=include_ad_link),
+                    build_export(writer),
+                    label=label,
+                    icon=icon,
+                    file_name=f"ads_data_{export_timestamp}.{extension}",
+                    mime=mime,
+                    help_text=help_text,
+                )
+        
+        # Display the raw data table one page at a time; search and sort run here on the server
         st.subheader("📊 Raw Data Table")
-        st.dataframe(filtered_df_ads, use_container_width=True, hide_index=True)
+        table_columns = [column for column in filtered_df_ads.columns if column not in DAY_COLUMNS.values()]
+        col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+        with col1:
+            search_text = st.text_input("Search", placeholder="Text in any column, e.g. an ad ID, account or error type").strip()
+        with col2:
+            sort_column = st.selectbox("Sort by", ["(original order)"] + table_columns)
+        with col3:
+            sort_direction = st.selectbox("Order", ["Ascending", "Descending"])
+        with col4:
+            page_size = st.selectbox("Rows per page", RAW_TABLE_PAGE_SIZES, index=1)
+        
+        def build_table_order():
+            """Row positions matching the search, in the chosen sort order"""
+            if sort_column in table_columns:
+                order = sort_order(filtered_df_ads, sort_column, ascending=sort_direction == "Ascending")
+            else:
+                order = np.arange(len(filtered_df_ads))
+            if search_text:
+                order = order[search_mask(filtered_df_ads, search_text, table_columns)[order]]
+            return order
+        
+        table_state = dict(search=search_text, sort_column=sort_column, sort_direction=sort_direction)
+        table_order = get_derived_result_cache().get(
+            derived_result_key(ads_dataset.version, 'raw_table_order', **table_state), build_table_order
+        )
+        
+        page_count = max(1, -(-len(table_order) // page_size))
+        # Keyed by the query so a new search or sort starts again from page 1
+        page = st.number_input(
+            f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1, step=1,
+            key=f"raw_table_page_{derived_result_key(ads_dataset.version, 'raw_table_page', page_size=page_size, **table_state)}",
+        )
+        start = (page - 1) * page_size
+        page_rows = filtered_df_ads.iloc[table_order[start:start + page_size]][table_columns]
+        # Send only the categories on this page, not every account in the dataset
+        page_rows = page_rows.apply(
+            lambda values: values.cat.remove_unused_categories() if isinstance(values.dtype, pd.CategoricalDtype) else values
+        )
+        st.dataframe(page_rows.assign(ad_link=ad_links(page_rows)), use_container_width=True, hide_index=True)
+        if len(table_order):
+            st.caption(
+                f"Rows {start + 1:,}–{start + len(page_rows):,} of {len(table_order):,} matching "
+                f"({total_rows:,} total)"
+            )
+        else:
+            st.caption(f"No rows match \"{search_text}\" ({total_rows:,} total)")
         
-        st.success("✅ **Data Table:** Complete dataset displayed above. Use the download buttons to export data.")
+        st.success("✅ **Data Table:** Only the visible page is sent to the browser. Use the download buttons to export the complete dataset.")
         
     except Exception as e:
         st.error(f"Error in Raw Dump section: {str(e)}")
@@ -0,0 +1,25 @@
+"""Synthetic frames shaped like the prepared df_ads, shared by the tests"""
+import numpy as np
+import pandas as pd
+
+from ads_store import apply_ads_schema, normalize_ads_dates
+
+TODAY = pd.Timestamp("2025-06-15")
+
+
+def make_ads(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    created = TODAY - pd.to_timedelta(rng.integers(-2, 90, rows), unit="D")
+    frame = pd.DataFrame({
+        "buid": rng.choice(["5001", "5002"], rows).astype(object),
+        "ad_account_id": rng.choice(["act_1", "act_2", "act_3"], rows).astype(object),
+        "ad_id": np.arange(rows).astype(str).astype(object),
+        "ad_status": rng.choice(["APPROVED", "DISAPPROVED"], rows).astype(object),
+        "effective_status": rng.choice(["ACTIVE", "PAUSED", "DISAPPROVED"], rows).astype(object),
+        "created_at": created.date,
+        "status_change_date": (created + pd.to_timedelta(rng.integers(0, 5, rows), unit="D")).date,
+        "error_type": rng.choice(["MISLEADING_CLAIMS", "CIRCUMVENTING_SYSTEMS", ""], rows).astype(object),
+        "error_description": "",
+    })
+    frame.loc[::50, "status_change_date"] = None
+    return apply_ads_schema(normalize_ads_dates(frame))
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from ads_fixtures import make_ads
+from ads_store import AD_LINK_TEMPLATE, ad_links
+
+
+def generate_ad_link(ad_account_id, ad_id):
+    """The per-row helper the dashboards used to apply to every row"""
+    clean_account_id = ad_account_id.replace('act_', '') if ad_account_id.startswith('act_') else ad_account_id
+    return AD_LINK_TEMPLATE.format(account_id=clean_account_id, ad_id=ad_id)
+
+
+def legacy_links(frame):
+    return frame.apply(lambda row: generate_ad_link(row["ad_account_id"], row["ad_id"]), axis=1)
+
+
+def test_matches_the_per_row_helper():
+    frame = make_ads(rows=300)
+    links = ad_links(frame)
+    assert links.name == "ad_link"
+    assert links.index.equals(frame.index)
+    assert links.tolist() == legacy_links(frame).tolist()
+
+
+def test_matches_for_integer_ids_unprefixed_accounts_and_a_shuffled_index():
+    frame = pd.DataFrame({
+        "ad_account_id": pd.Categorical(["act_1", "2", "act_1", "act_act_3"]),
+        "ad_id": np.array([120212345678901234, 5, 6, 7], dtype="int64"),
+    }, index=[10, 3, 7, 0])
+    links = ad_links(frame)
+    assert links.tolist() == legacy_links(frame).tolist()
+    assert links.index.tolist() == [10, 3, 7, 0]
+
+
+def test_rows_missing_an_account_or_ad_id_get_no_link():
+    frame = pd.DataFrame({
+        "ad_account_id": ["act_1", None, "act_2", "act_3"],
+        "ad_id": ["11", "12", None, np.nan],
+    })
+    links = ad_links(frame)
+    assert links.iloc[0] == generate_ad_link("act_1", "11")
+    # The per-row helper raised on a missing account and wrote "None"/"nan" into the URL for a missing ad id
+    assert links.iloc[1:].isna().all()
+
+
+def test_empty_frame():
+    frame = pd.DataFrame({"ad_account_id": pd.Series([], dtype=object), "ad_id": pd.Series([], dtype=object)})
+    assert ad_links(frame).empty
@@ -0,0 +1,171 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from ads_exports import ExportManager, write_csv, write_excel, write_parquet
+from ads_fixtures import make_ads
+from ads_store import ad_links
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+def read_workbook(data):
+    workbook = openpyxl.load_workbook(io.BytesIO(data))
+    return {sheet.title: [[cell.value for cell in row] for row in sheet.iter_rows()] for sheet in workbook}
+
+
+def ads_frame():
+    return pd.DataFrame({
+        "ad_id": np.array([120212345678901234, 120212345678901235], dtype="int64"),
+        "ad_account_id": pd.Categorical(["act_1", "act_<2>"]),
+        "no_of_ads": [3, 4],
+        "status_change_date": pd.to_datetime(["2025-06-01", "2025-06-02"]),
+    })
+
+
+def test_large_integer_ids_are_written_as_text():
+    rows = read_workbook(write_excel(ads_frame()))["Ads Data"]
+    assert rows[0] == ["ad_id", "ad_account_id", "no_of_ads", "status_change_date"]
+    assert rows[1][0] == "120212345678901234"
+    assert rows[2][0] == "120212345678901235"
+    # Small integers stay numeric
+    assert rows[1][2] == 3
+    assert rows[2][1] == "act_<2>"
+    assert rows[1][3] == pd.Timestamp("2025-06-01")
+
+
+def test_cells_keep_their_types_and_missing_values_stay_empty():
+    frame = pd.DataFrame({
+        "text": ["a & <b>", "bell\x07 and tab\t", None],
+        "category": pd.Categorical(["x", None, "y"]),
+        "flag": [True, False, True],
+        "ratio": [0.5, np.nan, np.inf],
+        "count": pd.array([1, None, 3], dtype="Int64"),
+        "day": pd.to_datetime(["2025-06-01", None, "2025-06-03"]),
+        "changed_at": pd.to_datetime(["2025-06-01 10:30:00", "2025-06-02 00:00:00", None]),
+    })
+    data = write_excel(frame)
+    rows = read_workbook(data)["Ads Data"]
+    assert rows[1] == ["a & <b>", "x", True, 0.5, 1, pd.Timestamp("2025-06-01"), pd.Timestamp("2025-06-01 10:30")]
+    # Characters XML cannot carry are dropped; missing and infinite values leave the cell empty
+    assert rows[2] == ["bell and tab\t", None, False, None, None, None, pd.Timestamp("2025-06-02")]
+    assert rows[3] == [None, "y", True, None, 3, pd.Timestamp("2025-06-03"), None]
+
+    sheet = openpyxl.load_workbook(io.BytesIO(data))["Ads Data"]
+    assert sheet["F2"].number_format == "yyyy-mm-dd"
+    assert sheet["G2"].number_format == "yyyy-mm-dd hh:mm:ss"
+
+
+def test_progress_reaches_one_and_sheet_names_are_made_valid():
+    frame = pd.DataFrame({"no_of_ads": range(25)})
+    reported = []
+    summary = pd.DataFrame({"no_of_ads": [1]})
+    sheets = read_workbook(write_excel(
+        frame, progress=reported.append, chunk_rows=10, summary_sheets={"By: Date/Error [all]": summary},
+    ))
+    assert list(sheets) == ["Ads Data", "By_ Date_Error _all_"]
+    assert reported == sorted(reported) and reported[-1] == 1.0
+
+
+def test_empty_frame_writes_just_the_header():
+    sheets = read_workbook(write_excel(pd.DataFrame({"ad_id": pd.Series([], dtype="int64")})))
+    assert sheets == {"Ads Data": [["ad_id"]]}
+
+
+def test_splits_data_across_sheets_and_appends_summaries():
+    frame = pd.DataFrame({"no_of_ads": range(5)})
+    summary = pd.DataFrame({"no_of_ads": [10]}, index=pd.Index(["act_1"], name="ad_account_id"))
+    sheets = read_workbook(write_excel(frame, max_rows_per_sheet=2, summary_sheets={"By Account": summary}))
+
+    assert list(sheets) == ["Ads Data", "Ads Data (2)", "Ads Data (3)", "By Account"]
+    assert [row[0] for row in sheets["Ads Data (3)"]] == ["no_of_ads", 4]
+    assert sheets["By Account"] == [["ad_account_id", "no_of_ads"], ["act_1", 10]]
+
+
+def test_csv_keeps_ids_and_adds_virtual_columns():
+    data = write_csv(ads_frame(), virtual_columns={"ad_ref": lambda chunk: "ref-" + chunk["ad_id"].astype(str)})
+    frame = pd.read_csv(io.BytesIO(data), dtype={"ad_id": str})
+    assert frame["ad_id"].tolist() == ["120212345678901234", "120212345678901235"]
+    assert frame["ad_ref"].tolist() == ["ref-120212345678901234", "ref-120212345678901235"]
+
+
+def finished_job(manager, key, size):
+    job = manager.submit(key, lambda progress: b"x" * size)
+    assert job.finished.wait(5)
+    return job
+
+
+def test_oversize_export_is_kept_until_the_next_one_finishes():
+    manager = ExportManager(max_workers=1, max_bytes=1000)
+    big = finished_job(manager, "big", 2000)
+    assert manager.get("big") is big
+    assert big.error is None and len(big.data) == 2000
+
+    small = finished_job(manager, "small", 10)
+    assert manager.get("big") is None
+    assert manager.get("small") is small
+    assert manager.stats["evicted"] == 1
+
+
+def test_keeps_the_most_recent_jobs_within_max_entries():
+    manager = ExportManager(max_workers=1, max_entries=2)
+    for key in ("a", "b", "c"):
+        finished_job(manager, key, 10)
+    assert manager.get("a") is None
+    assert manager.get("b") is not None and manager.get("c") is not None
+
+
+def export_frame():
+    frame = make_ads(rows=1200)
+    return frame.drop(columns=["created_day", "status_change_day"])
+
+
+def test_parquet_round_trip_keeps_values_dtypes_and_metadata():
+    frame = export_frame()
+    reported = []
+    data = write_parquet(frame, progress=reported.append, chunk_rows=500, metadata={"ad_link_template": "t"})
+
+    restored = pd.read_parquet(io.BytesIO(data))
+    # Parquet has no second-resolution timestamps; the values are unchanged at millisecond resolution
+    dates = ["created_at", "status_change_date"]
+    pd.testing.assert_frame_equal(restored, frame.astype({column: restored[column].dtype for column in dates}))
+    assert all(isinstance(restored[column].dtype, pd.CategoricalDtype) for column in ("ad_status", "error_type"))
+    assert pq.ParquetFile(io.BytesIO(data)).metadata.num_row_groups == 3
+    assert pq.read_schema(io.BytesIO(data)).metadata[b"ad_link_template"] == b"t"
+    assert reported[-1] == 1.0
+
+
+def test_parquet_virtual_columns_are_text():
+    frame = export_frame()
+    data = write_parquet(frame, chunk_rows=500, virtual_columns={"ad_link": ad_links})
+    restored = pd.read_parquet(io.BytesIO(data))
+    assert restored["ad_link"].tolist() == ad_links(frame).tolist()
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_csv_round_trip(compression):
+    frame = export_frame()
+    data = write_csv(frame, chunk_rows=500, compression=compression)
+    if compression:
+        data = pa.input_stream(pa.py_buffer(data), compression=compression).read()
+
+    restored = pd.read_csv(
+        io.BytesIO(data),
+        dtype={"ad_id": str, "buid": str},
+        keep_default_na=False,
+        na_values=[""],
+        parse_dates=["created_at", "status_change_date"],
+    )
+    assert len(restored) == len(frame)
+    assert list(restored.columns) == list(frame.columns)
+    assert restored["ad_id"].tolist() == frame["ad_id"].astype(str).tolist()
+    for column in ("ad_account_id", "ad_status", "buid"):
+        assert restored[column].tolist() == frame[column].astype(str).tolist(), column
+    for column in ("created_at", "status_change_date"):
+        pd.testing.assert_series_equal(restored[column].astype("datetime64[ns]"), frame[column].astype("datetime64[ns]"))
+    # An empty string and a missing value both come back empty
+    assert (restored["error_type"].isna() == (frame["error_type"].astype(str) == "")).all()
@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+from ads_fixtures import TODAY, make_ads
+from ads_metrics import (
+    disapproval_cube,
+    filter_disapproval_cube,
+    recent_disapprovals,
+    rollup_disapprovals,
+    window_counts,
+)
+from ads_store import TimeIndex, apply_ads_schema, date_to_day
+
+
+def naive_window_counts(frame):
+    created = pd.to_datetime(frame["created_at"])
+    changed = pd.to_datetime(frame["status_change_date"])
+    rejected = frame["ad_status"] == "DISAPPROVED"
+    month_start = TODAY.replace(day=1)
+    windows = {
+        "lifetime": lambda days: days.notna() | days.isna(),
+        "last_30_days": lambda days: (days >= TODAY - pd.Timedelta(days=30)),
+        "last_month": lambda days: (days >= TODAY - pd.Timedelta(days=30)) & (days < month_start),
+        "current_month": lambda days: days >= month_start,
+        "yesterday": lambda days: days == TODAY - pd.Timedelta(days=1),
+        "today": lambda days: days == TODAY,
+    }
+    counts = {}
+    for window, select in windows.items():
+        counts[f"published_{window}"] = int(select(created).sum())
+        counts[f"rejected_{window}"] = int((select(changed) & rejected).sum())
+    return counts
+
+
+def test_window_counts_match_a_row_by_row_count():
+    frame = make_ads()
+    counts = window_counts(frame, today=TODAY)
+    for name, expected in naive_window_counts(frame).items():
+        assert counts[name] == expected, name
+
+
+def test_window_counts_respect_positions():
+    frame = make_ads()
+    positions = np.flatnonzero((frame["ad_account_id"] == "act_2").to_numpy())
+    counts = window_counts(frame, today=TODAY, positions=positions)
+    expected = naive_window_counts(frame.take(positions))
+    assert counts["published_last_30_days"] == expected["published_last_30_days"]
+    assert counts["rejected_current_month"] == expected["rejected_current_month"]
+
+
+GROUPED_KEYS = [
+    ["status_change_date"],
+    ["status_change_date", "error_type"],
+    ["ad_account_id"],
+    ["ad_account_id", "error_type"],
+    ["ad_account_id", "status_change_date"],
+    ["ad_account_id", "status_change_date", "error_type"],
+]
+
+
+def ads_with_missing_keys():
+    frame = make_ads(rows=3000, seed=5)
+    raw = frame.astype({"ad_account_id": object, "error_type": object})
+    raw.loc[::7, "error_type"] = None
+    raw.loc[::11, "ad_account_id"] = None
+    return apply_ads_schema(raw)
+
+
+def legacy_grouped(frame, keys):
+    """One of the six Grouped Analysis groupbys over the raw rows, as app.py used to run them"""
+    frame = frame.assign(status_change_date=frame["status_change_date"].dt.date)
+    return (
+        frame[frame["ad_status"] == "DISAPPROVED"]
+        .groupby(keys, observed=True)
+        .agg(no_of_ads=("ad_id", "count"))
+    )
+
+
+def assert_same_counts(rolled, legacy):
+    assert rolled.index.names == legacy.index.names
+    assert rolled["no_of_ads"].to_dict() == legacy["no_of_ads"].to_dict()
+    assert rolled.index.tolist() == sorted(rolled.index.tolist())
+
+
+def test_cube_rollups_match_the_six_groupbys():
+    frame = ads_with_missing_keys()
+    assert frame["error_type"].isna().any() and frame["ad_account_id"].isna().any()
+    cube = disapproval_cube(frame)
+    for keys in GROUPED_KEYS:
+        assert_same_counts(rollup_disapprovals(cube, keys), legacy_grouped(frame, keys))
+
+
+def test_filtered_cube_matches_groupbys_over_filtered_rows():
+    frame = ads_with_missing_keys()
+    start, end = TODAY - pd.Timedelta(days=20), TODAY - pd.Timedelta(days=5)
+    cube = filter_disapproval_cube(
+        disapproval_cube(frame),
+        ad_account_id="act_2",
+        day_range=(date_to_day(start), date_to_day(end)),
+        error_types=["MISLEADING_CLAIMS", ""],
+    )
+    selected = frame[
+        (frame["ad_account_id"] == "act_2")
+        & frame["status_change_date"].between(start, end)
+        & frame["error_type"].isin(["MISLEADING_CLAIMS", ""])
+    ]
+    assert len(selected) > 0
+    for keys in GROUPED_KEYS:
+        assert_same_counts(rollup_disapprovals(cube, keys), legacy_grouped(selected, keys))
+
+
+def test_cube_over_positions_matches_groupbys_over_those_rows():
+    frame = ads_with_missing_keys()
+    positions = np.flatnonzero((frame["effective_status"] == "PAUSED").to_numpy())
+    cube = disapproval_cube(frame, positions=positions)
+    for keys in GROUPED_KEYS:
+        assert_same_counts(rollup_disapprovals(cube, keys), legacy_grouped(frame.take(positions), keys))
+
+
+NOW = pd.Timestamp("2025-06-15 10:30", tz="UTC")
+HOUR = pd.Timedelta(hours=1)
+
+
+def changes_frame(times, statuses=None):
+    times = pd.to_datetime(pd.Series(times, dtype=object), format="ISO8601")
+    return pd.DataFrame({
+        "ad_account_id": ["act_1"] * len(times),
+        "ad_status": statuses or ["DISAPPROVED"] * len(times),
+        "error_type": ["MISLEADING_CLAIMS"] * len(times),
+        "status_change_date": times,
+    })
+
+
+def test_time_index_between_is_half_open_and_skips_missing_times():
+    frame = changes_frame(["2025-06-15 09:00", None, "2025-06-15 08:00", "2025-06-15 10:00", "2025-06-15 09:00"])
+    index = TimeIndex(frame)
+    assert index.between(pd.Timestamp("2025-06-15 08:00"), pd.Timestamp("2025-06-15 10:00")).tolist() == [2, 0, 4]
+    assert index.between(pd.Timestamp("2025-06-15 08:00:00.000000001"), pd.Timestamp("2025-06-15 10:00:00.000000001")).tolist() == [0, 4, 3]
+    assert index.between(pd.Timestamp("2025-06-16"), pd.Timestamp("2025-06-17")).tolist() == []
+    assert len(TimeIndex(frame, "missing").between(0, np.iinfo(np.int64).max)) == 0
+
+
+def test_time_index_reads_aware_columns_in_utc():
+    frame = changes_frame(["2025-06-15 09:00"])
+    frame["status_change_date"] = frame["status_change_date"].dt.tz_localize("Asia/Kolkata")
+    index = TimeIndex(frame)
+    # 09:00 IST is 03:30 UTC; naive bounds are taken as UTC
+    assert index.between(pd.Timestamp("2025-06-15 03:30"), pd.Timestamp("2025-06-15 03:31")).tolist() == [0]
+    assert index.between(pd.Timestamp("2025-06-15 09:00"), pd.Timestamp("2025-06-15 09:01")).tolist() == []
+
+
+def bucket_of_each_row(table):
+    """buckets_ago of each counted row, keyed by its position in `frame`"""
+    return dict(zip(table["first_row"], table["buckets_ago"]))
+
+
+def test_recent_disapprovals_bucket_boundaries():
+    times = [
+        "2025-06-15 06:30",  # exactly now - window: oldest bucket
+        "2025-06-15 06:29:59.999999",  # just before the window
+        "2025-06-15 09:30",  # exactly one bucket ago: bucket 0
+        "2025-06-15 09:29:59.999999",  # just before it: bucket 1
+        "2025-06-15 10:30",  # exactly now
+        "2025-06-15 10:59:59",  # after now, inside now's clock bucket
+        "2025-06-15 11:00",  # the next clock bucket
+        None,
+    ]
+    frame = changes_frame(times)
+    # One account/error type per row so every row is its own cell
+    frame["error_type"] = [f"E{i}" for i in range(len(times))]
+    expected = {0: 3, 2: 0, 3: 1, 4: -1, 5: -2}
+
+    for time_index in (None, TimeIndex(frame)):
+        table = recent_disapprovals(frame, NOW, window=4 * HOUR, bucket=HOUR, time_index=time_index)
+        assert bucket_of_each_row(table) == expected
+        assert table["no_of_ads"].tolist() == [1] * len(expected)
+        buckets = dict(zip(table["first_row"], table["bucket"]))
+        assert buckets[0] == pd.Timestamp("2025-06-15 06:00", tz="UTC")
+        assert buckets[5] == pd.Timestamp("2025-06-15 10:00", tz="UTC")
+
+
+def test_recent_disapprovals_counts_only_disapprovals_and_takes_naive_now_as_utc():
+    frame = changes_frame(
+        ["2025-06-15 10:00", "2025-06-15 10:05", "2025-06-15 10:10"],
+        statuses=["DISAPPROVED", "APPROVED", "DISAPPROVED"],
+    )
+    table = recent_disapprovals(frame, NOW.tz_localize(None), window=HOUR, bucket=pd.Timedelta(minutes=15))
+    assert table["no_of_ads"].sum() == 2
+    assert set(table["buckets_ago"]) == {1}
+    assert table["first_row"].min() == 0
+
+
+def test_recent_disapprovals_index_matches_a_full_scan():
+    frame = make_ads(rows=5000, seed=3)
+    index = TimeIndex(frame)
+    for window, bucket in ((pd.Timedelta(days=1), HOUR), (pd.Timedelta(days=40), pd.Timedelta(days=1))):
+        scanned = recent_disapprovals(frame, TODAY, window, bucket)
+        indexed = recent_disapprovals(frame, TODAY, window, bucket, time_index=index)
+        keys = ["buckets_ago", "bucket", "ad_account_id", "error_type"]
+        pd.testing.assert_frame_equal(
+            scanned.sort_values(keys).reset_index(drop=True),
+            indexed.sort_values(keys).reset_index(drop=True),
+        )
+        assert scanned["no_of_ads"].sum() > 0
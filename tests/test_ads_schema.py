@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from ads_store import apply_ads_schema, upsert_by_key
+
+
+def raw_ads(ad_ids, accounts=None, error_types=None):
+    return pd.DataFrame({
+        "ad_id": pd.Series(ad_ids, dtype=object),
+        "ad_account_id": accounts or ["act_1"] * len(ad_ids),
+        "error_type": error_types or [""] * len(ad_ids),
+    })
+
+
+def test_integer_ad_ids_are_downcast():
+    frame = apply_ads_schema(raw_ads(["120212345678901234", "5"]))
+    assert frame["ad_id"].dtype == np.int64
+    assert frame["ad_id"].tolist() == [120212345678901234, 5]
+    assert apply_ads_schema(raw_ads(["1", "2"]))["ad_id"].dtype == np.int8
+    assert isinstance(frame["ad_account_id"].dtype, pd.CategoricalDtype)
+
+
+def test_ad_ids_that_do_not_fit_a_signed_int64_stay_text():
+    for ad_ids in (
+        ["9223372036854775807", "9223372036854775808"],  # uint64 range
+        ["18446744073709551616", "1"],  # past uint64
+        ["12", "x12"],
+        ["1.0", "2"],
+        ["0123", "5"],
+        ["-", "5"],
+        [" 7", "5"],
+    ):
+        frame = apply_ads_schema(raw_ads(ad_ids))
+        assert frame["ad_id"].tolist() == ad_ids, ad_ids
+        assert not pd.api.types.is_numeric_dtype(frame["ad_id"].dtype), ad_ids
+
+
+def test_missing_ad_ids_stay_text():
+    frame = apply_ads_schema(raw_ads(["1", None]))
+    assert frame["ad_id"].tolist()[0] == "1"
+    assert pd.isna(frame["ad_id"].tolist()[1])
+
+
+def test_concatenated_frames_with_unseen_categories_keep_every_value():
+    first = apply_ads_schema(raw_ads(["1", "2"], accounts=["act_1", "act_2"]))
+    second = apply_ads_schema(raw_ads(["3"], accounts=["act_9"], error_types=["SPAM"]))
+    frame = apply_ads_schema(pd.concat([first, second], ignore_index=True))
+    assert frame["ad_account_id"].tolist() == ["act_1", "act_2", "act_9"]
+    assert list(frame["ad_account_id"].cat.categories) == ["act_1", "act_2", "act_9"]
+    assert frame["error_type"].tolist() == ["", "", "SPAM"]
+
+
+def test_upsert_keeps_categoricals_and_values_unseen_in_the_base():
+    base = apply_ads_schema(raw_ads(["1", "2"], accounts=["act_1", "act_2"]))
+    for delta in (
+        raw_ads([2, 3], accounts=["act_2", "act_9"], error_types=["SPAM", None]),
+        apply_ads_schema(raw_ads(["2", "3"], accounts=["act_2", "act_9"], error_types=["SPAM", None])),
+    ):
+        merged = upsert_by_key(base, delta)
+        assert merged["ad_id"].tolist() == [1, 2, 3]
+        assert merged["ad_account_id"].tolist() == ["act_1", "act_2", "act_9"]
+        assert merged["error_type"].tolist()[:2] == ["", "SPAM"]
+        assert pd.isna(merged["error_type"].iloc[2])
+        assert isinstance(merged["ad_account_id"].dtype, pd.CategoricalDtype)
+        assert isinstance(merged["error_type"].dtype, pd.CategoricalDtype)
+    # The base is left untouched
+    assert list(base["ad_account_id"].cat.categories) == ["act_1", "act_2"]
@@ -0,0 +1,109 @@
+import json
+import time
+import types
+
+import pytest
+from botocore.exceptions import ClientError
+
+import aws_secrets
+from aws_secrets import LocalSecretsManagerClient, SecretCache
+
+SECRET = {"db": "ads", "name": "reader", "passw": "old", "server": "localhost", "port": 5439}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(aws_secrets, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "secrets.json"
+    path.write_text(json.dumps({"G-streamlit-KAT": SECRET}))
+    return LocalSecretsManagerClient.from_file(str(path))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_file_backed_client_serves_secrets_and_rejects_unknown_names(client):
+    response = client.get_secret_value(SecretId="G-streamlit-KAT")
+    assert json.loads(response["SecretString"]) == SECRET
+    with pytest.raises(ClientError) as error:
+        client.get_secret_value(SecretId="missing")
+    assert error.value.response["Error"]["Code"] == "ResourceNotFoundException"
+
+
+def test_fetches_once_within_the_ttl(client, clock):
+    factory_calls = []
+    cache = SecretCache(lambda: factory_calls.append(1) or client, ttl=3600, refresh_ahead=300)
+
+    assert cache.get("G-streamlit-KAT") == SECRET
+    clock.now += 3000
+    assert cache.get("G-streamlit-KAT") == SECRET
+    assert client.calls == 1
+    assert len(factory_calls) == 1
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_refetches_after_the_ttl(client, clock):
+    cache = SecretCache(lambda: client, ttl=3600, refresh_ahead=0)
+    cache.get("G-streamlit-KAT")
+    client.put_secret_value(SecretId="G-streamlit-KAT", SecretString=json.dumps(dict(SECRET, passw="new")))
+
+    clock.now += 3600
+    assert cache.get("G-streamlit-KAT")["passw"] == "new"
+    assert client.calls == 2
+
+
+def test_refreshes_ahead_of_expiry_in_the_background(client, clock):
+    cache = SecretCache(lambda: client, ttl=3600, refresh_ahead=300)
+    cache.get("G-streamlit-KAT")
+    client.put_secret_value(SecretId="G-streamlit-KAT", SecretString=json.dumps(dict(SECRET, passw="new")))
+
+    # Inside the refresh-ahead window the cached value is served while the rotated one is fetched
+    clock.now += 3400
+    assert cache.get("G-streamlit-KAT")["passw"] == "old"
+    wait_for(lambda: cache.stats["background_refreshes"] == 1)
+    assert cache.get("G-streamlit-KAT")["passw"] == "new"
+    assert client.calls == 2
+
+
+def test_serves_the_expired_value_when_a_refresh_fails(client, clock):
+    cache = SecretCache(lambda: client, ttl=3600, refresh_ahead=0)
+    cache.get("G-streamlit-KAT")
+    del client._secrets["G-streamlit-KAT"]
+
+    clock.now += 4000
+    assert cache.get("G-streamlit-KAT") == SECRET
+    assert cache.stats["failures"] == 1
+
+
+def test_raises_when_nothing_is_cached(client, clock):
+    cache = SecretCache(lambda: client)
+    with pytest.raises(ClientError):
+        cache.get("missing")
+
+
+def test_invalidate_forces_a_fetch(client, clock):
+    cache = SecretCache(lambda: client)
+    cache.get("G-streamlit-KAT")
+    client.put_secret_value(SecretId="G-streamlit-KAT", SecretString=json.dumps(dict(SECRET, passw="new")))
+
+    cache.invalidate("G-streamlit-KAT")
+    assert cache.get("G-streamlit-KAT")["passw"] == "new"
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from ads_store import BackgroundRefresher
+
+
+def test_refresher_reloads_in_the_background_and_keeps_the_last_good_value():
+    attempts = []
+    parked = threading.Event()
+
+    def load(background=False):
+        attempts.append(background)
+        if len(attempts) == 2:
+            raise RuntimeError("redshift unavailable")
+        if len(attempts) > 3:
+            # Park the refresh thread once the test has seen what it needs
+            parked.wait()
+        return f"dataset {len(attempts)}"
+
+    refresher = BackgroundRefresher(load, ttl=0.05, lead=0, retry_after=0.05)
+    assert refresher.get() == "dataset 1"
+    deadline = time.monotonic() + 5
+    while refresher.get() != "dataset 3":
+        assert time.monotonic() < deadline, "background reload did not happen"
+        time.sleep(0.01)
+    assert attempts[1:3] == [True, True]
+    assert refresher.stats["failures"] == 1
+    assert refresher.last_error is None
+
+
+def test_refresher_reports_a_failed_warm_up():
+    refresher = BackgroundRefresher(lambda **kwargs: None)
+    assert refresher.get() is None
+    assert refresher.last_error == "load returned no data"
+    assert refresher._thread is None
@@ -0,0 +1,310 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+import db_utils
+from db_utils import PoolExhaustedError, RedshiftConnectionPool, RotatingConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query):
+        self.connection.health_checks += 1
+        self.connection.health_check_started.set()
+        self.connection.health_check_gate.wait(5)
+        if self.connection.dead:
+            raise psycopg2.OperationalError("server closed the connection")
+
+    def fetchone(self):
+        return (1,)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.dead = False
+        self.health_checks = 0
+        self.health_check_started = threading.Event()
+        self.health_check_gate = threading.Event()
+        self.health_check_gate.set()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    def connect(**kwargs):
+        connection = FakeConnection()
+        connection.password = kwargs["password"]
+        opened.append(connection)
+        return connection
+
+    monkeypatch.setattr(db_utils.psycopg2, "connect", connect)
+    return opened
+
+
+def make_pool(**kwargs):
+    kwargs.setdefault("min_size", 0)
+    return RedshiftConnectionPool("db", "user", "password", "host", 5439, **kwargs)
+
+
+def test_reuses_released_connection(connections):
+    pool = make_pool()
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert pool.stats()["created"] == 1
+    assert pool.stats()["reused"] == 1
+
+
+def test_health_check_runs_without_holding_the_lock(connections):
+    pool = make_pool(max_size=2, health_check_after=0)
+    stale = pool.acquire()
+    pool.release(stale)
+    stale.health_check_gate.clear()
+
+    checker = threading.Thread(target=pool.acquire)
+    checker.start()
+    assert stale.health_check_started.wait(5)
+
+    # While the first acquire is stuck in SELECT 1, the pool still serves other threads
+    started = time.monotonic()
+    other = pool.acquire()
+    assert time.monotonic() - started < 1
+    assert other is not stale
+    pool.release(other)
+
+    stale.health_check_gate.set()
+    checker.join(5)
+    assert pool.stats()["in_use"] == 1
+
+
+def test_dead_connection_is_replaced(connections):
+    pool = make_pool(health_check_after=0)
+    dead = pool.acquire()
+    pool.release(dead)
+    dead.dead = True
+
+    connection = pool.acquire()
+    assert connection is not dead
+    assert dead.closed
+    stats = pool.stats()
+    assert stats["health_check_failures"] == 1
+    assert stats["discarded"] == 1
+    assert stats["in_use"] == 1
+
+
+def test_respects_max_size_under_concurrency(connections):
+    pool = make_pool(max_size=3)
+    peak = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(20):
+            with pool.connection():
+                with lock:
+                    peak.append(pool.stats()["in_use"])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) <= 3
+    assert len(connections) <= 3
+    assert pool.stats()["in_use"] == 0
+
+
+def test_acquire_times_out_when_exhausted(connections):
+    pool = make_pool(max_size=1, acquire_timeout=0.1)
+    pool.acquire()
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_broken_connection_is_not_returned_to_the_pool(connections):
+    pool = make_pool()
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection():
+            raise psycopg2.OperationalError("lost connection")
+    assert pool.stats()["idle"] == 0
+    assert connections[0].closed
+
+
+def test_rotated_credentials_get_a_new_pool_and_retire_the_old_one(connections):
+    secret = {"dbname": "db", "user": "user", "password": "old", "host": "host", "port": 5439}
+    pools = RotatingConnectionPool(lambda: dict(secret), min_size=0)
+
+    old_pool = pools.get()
+    idle = old_pool.acquire()
+    borrowed = old_pool.acquire()
+    old_pool.release(idle)
+    assert pools.get() is old_pool
+
+    secret["password"] = "new"
+    new_pool = pools.get()
+    assert new_pool is not old_pool
+    assert pools.rotations == 1
+    assert idle.closed
+    with new_pool.connection() as connection:
+        assert connection.password == "new"
+
+    # A connection checked out before the rotation is closed when it comes back
+    old_pool.release(borrowed)
+    assert borrowed.closed
+    assert old_pool.stats()["idle"] == 0
+
+
+class FakeServerCursor:
+    """A named cursor: description is only known after the first fetch"""
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+        self.description = None
+        self.fetch_sizes = []
+        self.closed = False
+
+    def execute(self, query):
+        self.position = 0
+
+    def fetchmany(self, size):
+        self.description = [(name,) for name in self.columns]
+        self.fetch_sizes.append(size)
+        rows = self.rows[self.position:self.position + size]
+        self.position += size
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStreamingConnection:
+    def __init__(self, columns, rows):
+        self.server_cursor = FakeServerCursor(columns, rows)
+
+    def cursor(self, name=None):
+        assert name, "streaming needs a server-side (named) cursor"
+        return self.server_cursor
+
+
+def test_chunked_fetch_concatenates_chunks_and_reports_progress():
+    rows = [(i, f"ad_{i}", None if i % 3 else "SPAM") for i in range(7)]
+    connection = FakeStreamingConnection(["ad_id", "name", "error_type"], rows)
+    progress = []
+
+    frame = db_utils.fetch_dataframe_chunked(connection, "select", chunk_size=3, on_chunk=progress.append)
+
+    assert list(frame.columns) == ["ad_id", "name", "error_type"]
+    assert frame["ad_id"].tolist() == list(range(7))
+    assert frame["ad_id"].dtype == "int64"
+    assert frame["name"].tolist() == [f"ad_{i}" for i in range(7)]
+    assert frame["error_type"].isna().tolist() == [bool(i % 3) for i in range(7)]
+    assert frame["error_type"].dropna().tolist() == ["SPAM"] * 3
+    assert progress == [3, 6, 7]
+    assert connection.server_cursor.fetch_sizes == [3, 3, 3, 3]
+    assert connection.server_cursor.closed
+
+
+def test_chunked_fetch_of_an_empty_result_keeps_the_columns():
+    connection = FakeStreamingConnection(["ad_id", "ad_status"], [])
+    progress = []
+    frame = db_utils.fetch_dataframe_chunked(connection, "select", on_chunk=progress.append)
+    assert frame.empty
+    assert list(frame.columns) == ["ad_id", "ad_status"]
+    assert progress == []
+
+
+def test_chunked_fetch_closes_the_cursor_on_errors():
+    connection = FakeStreamingConnection(["ad_id"], [(1,)])
+
+    def fail(query):
+        raise psycopg2.OperationalError("lost connection")
+
+    connection.server_cursor.execute = fail
+    with pytest.raises(psycopg2.OperationalError):
+        db_utils.fetch_dataframe_chunked(connection, "select")
+    assert connection.server_cursor.closed
+
+
+class FakeCopyCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def copy_expert(self, sql, buffer):
+        self.connection.copy_sql = sql
+        buffer.write(self.connection.output.encode("utf-8"))
+
+
+class FakeCopyConnection:
+    def __init__(self, output):
+        # What Postgres writes for COPY ... (FORMAT csv, HEADER true, NULL '\N')
+        self.output = output
+        self.copy_sql = None
+
+    def cursor(self):
+        return FakeCopyCursor(self)
+
+
+def test_copy_fetch_keeps_empty_strings_apart_from_nulls():
+    connection = FakeCopyConnection(
+        "ad_id,error_type,error_description\n"
+        "120212345678901234,SPAM,\n"
+        "2,\\N,\"Bad, very bad\"\n"
+        "3,,\\N\n"
+    )
+    frame = db_utils.fetch_dataframe_copy(connection, "select * from ads;", dtype={"ad_id": str, "error_type": str})
+
+    assert "COPY (\nselect * from ads\n) TO STDOUT" in connection.copy_sql
+    assert "NULL '\\N'" in connection.copy_sql
+    assert frame["ad_id"].tolist() == ["120212345678901234", "2", "3"]
+    assert frame["error_type"].iloc[0] == "SPAM"
+    assert pd.isna(frame["error_type"].iloc[1])
+    assert frame["error_type"].iloc[2] == ""
+    assert frame["error_description"].iloc[0] == ""
+    assert frame["error_description"].iloc[1] == "Bad, very bad"
+    assert pd.isna(frame["error_description"].iloc[2])
+
+
+def test_copy_fetch_parses_only_the_date_columns_the_result_has():
+    connection = FakeCopyConnection(
+        "ad_id,created_at\n"
+        "1,2025-06-01 10:00:00\n"
+        "2,\\N\n"
+    )
+    frame = db_utils.fetch_dataframe_copy(connection, "select", parse_dates=["created_at", "status_change_date"])
+    assert pd.api.types.is_datetime64_any_dtype(frame["created_at"])
+    assert frame["created_at"].iloc[0] == pd.Timestamp("2025-06-01 10:00")
+    assert pd.isna(frame["created_at"].iloc[1])
+    assert "status_change_date" not in frame.columns
@@ -0,0 +1,47 @@
+import numpy as np
+
+from ads_store import DerivedResultCache, derived_result_key
+
+
+def test_derived_result_cache_evicts_least_recently_used():
+    cache = DerivedResultCache(max_entries=2)
+    cache.get("a", lambda: "a")
+    cache.get("b", lambda: "b")
+    cache.get("a", lambda: "unused")
+    cache.get("c", lambda: "c")
+
+    assert cache.get("a", lambda: "rebuilt") == "a"
+    assert cache.get("b", lambda: "rebuilt") == "rebuilt"
+    assert cache.stats["evictions"] == 2
+
+
+def test_derived_result_cache_stays_within_max_bytes():
+    cache = DerivedResultCache(max_entries=10, max_bytes=10_000)
+    cache.get("a", lambda: np.zeros(500))
+    cache.get("b", lambda: (np.zeros(500), {"rows": np.zeros(100)}))
+    assert cache.nbytes == 4000 + 4800
+
+    cache.get("c", lambda: np.zeros(500))
+    assert cache.get("a", lambda: "rebuilt") == "rebuilt"
+    assert cache.nbytes <= 10_000
+
+    # A result over the whole budget is still kept until the next one is stored
+    big = cache.get("big", lambda: np.zeros(5000))
+    assert cache.get("big", lambda: "rebuilt") is big
+    assert cache.nbytes == 40_000
+    cache.get("d", lambda: np.zeros(10))
+    assert cache.get("big", lambda: "rebuilt") == "rebuilt"
+
+
+def test_none_results_are_cached():
+    cache = DerivedResultCache()
+    calls = []
+    assert cache.get("all_rows", lambda: calls.append(1)) is None
+    assert cache.get("all_rows", lambda: calls.append(1)) is None
+    assert calls == [1]
+
+
+def test_derived_result_key_ignores_multiselect_order():
+    assert derived_result_key(1, "rows", error_type=["B", "A"]) == derived_result_key(1, "rows", error_type=["A", "B"])
+    assert derived_result_key(1, "rows", error_type=[]) == derived_result_key(1, "rows", error_type=None)
+    assert derived_result_key(1, "rows") != derived_result_key(2, "rows")
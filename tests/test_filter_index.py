@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from ads_fixtures import TODAY, make_ads
+from ads_store import AdsFilterIndex, date_to_day
+
+
+def test_filter_index_matches_boolean_masks():
+    frame = make_ads()
+    index = AdsFilterIndex(frame)
+    start, end = date_to_day(TODAY - pd.Timedelta(days=20)), date_to_day(TODAY)
+
+    positions = index.resolve(
+        ad_account_id="act_1",
+        day_ranges={"status_change_day": (start, end)},
+        values={"error_type": ["MISLEADING_CLAIMS"]},
+    )
+    days = frame["status_change_day"]
+    mask = (
+        (frame["ad_account_id"] == "act_1")
+        & (days >= start) & (days <= end)
+        & (frame["error_type"] == "MISLEADING_CLAIMS")
+    )
+    assert positions.tolist() == np.flatnonzero(mask.to_numpy()).tolist()
+    # No filter: None stands for every row instead of an arange over the frame
+    assert index.resolve() is None
+    assert index.resolve(values={"error_type": []}) is None
+    assert len(index.resolve(ad_account_id="act_missing")) == 0
+    assert sorted(index.options("ad_status")) == ["APPROVED", "DISAPPROVED"]
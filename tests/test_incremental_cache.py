@@ -0,0 +1,145 @@
+import pandas as pd
+
+from ads_fixtures import make_ads
+from ads_store import IncrementalAdsCache, read_snapshot, write_snapshot
+
+
+class FakeSource:
+    """The ads table behind fetch_ads: full loads and deltas edited on or after a watermark"""
+
+    def __init__(self, rows):
+        self.rows = pd.DataFrame(rows)
+        self.full_loads = 0
+        self.deltas = []
+        self.fail = False
+
+    def load_full(self):
+        self.full_loads += 1
+        return None if self.fail else self.rows.copy()
+
+    def load_delta(self, since):
+        self.deltas.append(since)
+        if self.fail:
+            return None
+        return self.rows[self.rows["status_change_date"] >= since].reset_index(drop=True)
+
+    def upsert(self, ad_id, **values):
+        values = dict(values, ad_id=ad_id)
+        match = self.rows["ad_id"] == ad_id
+        if match.any():
+            for column, value in values.items():
+                self.rows.loc[match, column] = value
+        else:
+            self.rows = pd.concat([self.rows, pd.DataFrame([values])], ignore_index=True)
+
+
+def make_source():
+    return FakeSource({
+        "ad_id": ["1", "2", "3"],
+        "ad_account_id": ["act_1", "act_1", "act_2"],
+        "ad_status": ["APPROVED", "APPROVED", "DISAPPROVED"],
+        "status_change_date": pd.to_datetime(["2025-06-13", "2025-06-14", "2025-06-15 09:00"], format="ISO8601"),
+    })
+
+
+def by_ad_id(frame):
+    return frame.sort_values("ad_id").reset_index(drop=True)
+
+
+def test_delta_upserts_updated_and_new_ads_like_a_full_load():
+    source = make_source()
+    cache = IncrementalAdsCache(ttl=0)
+    first = cache.get(source.load_full, source.load_delta)
+    assert len(first) == 3
+    assert cache.watermark == pd.Timestamp("2025-06-15 09:00")
+
+    source.upsert("2", ad_status="DISAPPROVED", status_change_date=pd.Timestamp("2025-06-15 10:00"))
+    source.upsert("4", ad_account_id="act_3", ad_status="APPROVED", status_change_date=pd.Timestamp("2025-06-15 11:00"))
+    refreshed = cache.get(source.load_full, source.load_delta)
+
+    assert source.full_loads == 1
+    assert source.deltas == [pd.Timestamp("2025-06-15 09:00")]
+    pd.testing.assert_frame_equal(by_ad_id(refreshed), by_ad_id(source.load_full()))
+    assert cache.watermark == pd.Timestamp("2025-06-15 11:00")
+
+
+def test_serves_the_cached_frame_within_the_ttl():
+    source = make_source()
+    cache = IncrementalAdsCache(ttl=3600)
+    first = cache.get(source.load_full, source.load_delta)
+    assert cache.get(source.load_full, source.load_delta) is first
+    assert source.full_loads == 1
+    assert source.deltas == []
+
+
+def test_full_reload_purges_deleted_ads_once_due():
+    source = make_source()
+    cache = IncrementalAdsCache(ttl=0, full_refresh_after=0)
+    cache.get(source.load_full, source.load_delta)
+
+    source.rows = source.rows[source.rows["ad_id"] != "1"].reset_index(drop=True)
+    refreshed = cache.get(source.load_full, source.load_delta)
+    assert source.full_loads == 2
+    assert source.deltas == []
+    assert sorted(refreshed["ad_id"]) == ["2", "3"]
+
+
+def test_falls_back_to_a_full_load_without_a_watermark():
+    source = make_source()
+    source.rows["status_change_date"] = pd.NaT
+    cache = IncrementalAdsCache(ttl=0)
+    cache.get(source.load_full, source.load_delta)
+    assert cache.watermark is None
+
+    cache.get(source.load_full, source.load_delta)
+    assert source.full_loads == 2
+    assert source.deltas == []
+
+
+def test_failed_loads_keep_serving_the_previous_frame():
+    source = make_source()
+    cache = IncrementalAdsCache(ttl=0)
+    first = cache.get(source.load_full, source.load_delta)
+
+    source.fail = True
+    assert cache.get(source.load_full, source.load_delta) is first
+    assert cache.watermark == pd.Timestamp("2025-06-15 09:00")
+
+    # A failed first load has nothing to serve
+    assert IncrementalAdsCache(ttl=0).get(source.load_full, source.load_delta) is None
+
+
+def test_snapshot_round_trip_keeps_dtypes_categories_and_missing_values(tmp_path):
+    frame = make_ads(rows=500)
+    path = str(tmp_path / "df_ads.arrow")
+    write_snapshot(frame, path, {"loaded_at": 123.5, "query_hash": "abc"})
+
+    restored, metadata = read_snapshot(path)
+    pd.testing.assert_frame_equal(restored, frame)
+    assert restored["status_change_date"].isna().sum() == frame["status_change_date"].isna().sum() > 0
+    assert list(restored["ad_account_id"].cat.categories) == list(frame["ad_account_id"].cat.categories)
+    assert metadata == {"loaded_at": "123.5", "query_hash": "abc"}
+
+
+def test_unreadable_or_missing_snapshots_are_ignored(tmp_path):
+    path = tmp_path / "df_ads.arrow"
+    assert read_snapshot(str(path)) is None
+    path.write_bytes(b"not an arrow file")
+    assert read_snapshot(str(path)) is None
+
+
+def test_snapshot_from_another_query_is_not_served(tmp_path):
+    path = str(tmp_path / "df_ads.arrow")
+    source = make_source()
+    IncrementalAdsCache(snapshot_path=path, query="select 1").get(source.load_full, source.load_delta)
+    assert source.full_loads == 1
+
+    # Same query: a new process serves the snapshot without querying
+    warm = IncrementalAdsCache(snapshot_path=path, query="select 1")
+    pd.testing.assert_frame_equal(warm.get(source.load_full, source.load_delta), source.rows)
+    assert warm.watermark == pd.Timestamp("2025-06-15 09:00")
+    assert source.full_loads == 1
+
+    # Changed query: the snapshot is stale and a full load runs instead
+    IncrementalAdsCache(snapshot_path=path, query="select 2").get(source.load_full, source.load_delta)
+    assert source.full_loads == 2
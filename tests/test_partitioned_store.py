@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+from ads_store import PartitionedAdsStore
+
+TODAY = date(2025, 6, 30)
+
+
+def ads(ad_ids, days_ago, status="APPROVED"):
+    return pd.DataFrame({
+        "ad_id": ad_ids,
+        "status_change_date": [TODAY - timedelta(days=days) for days in days_ago],
+        "ad_status": status,
+    })
+
+
+def make_store(root):
+    return PartitionedAdsStore(str(root), hot_days=7, ttl=0, query="SELECT 1")
+
+
+def partition_files(root):
+    return sorted(name for name in os.listdir(root) if name.endswith(".arrow"))
+
+
+def test_hot_refresh_moves_reedited_ads_out_of_frozen_days(tmp_path):
+    store = make_store(tmp_path)
+    assert store.refresh(lambda since: ads([1, 2, 3], [30, 20, 1]), today=TODAY)
+
+    # Ad 1 was edited again today; the refresh only fetches the hot days
+    assert store.refresh(lambda since: ads([1, 3], [0, 1], status="DISAPPROVED"), today=TODAY)
+
+    frame = store.load().sort_values("ad_id").reset_index(drop=True)
+    assert frame["ad_id"].tolist() == [1, 2, 3]
+    assert frame["status_change_date"].tolist() == [TODAY, TODAY - timedelta(days=20), TODAY - timedelta(days=1)]
+    assert len(partition_files(tmp_path)) == len(store.manifest["partitions"])
+
+
+def test_refresh_never_removes_files_a_running_load_still_needs(tmp_path):
+    store = make_store(tmp_path)
+    store.refresh(lambda since: ads([1, 2, 3], [30, 3, 1]), today=TODAY)
+
+    first_read = threading.Event()
+    resume = threading.Event()
+    read_partition = store._read_partition
+
+    def slow_read_partition(day, manifest, columns=None):
+        frame = read_partition(day, manifest, columns)
+        if columns is None and threading.current_thread().name == "reader":
+            first_read.set()
+            resume.wait(5)
+        return frame
+
+    store._read_partition = slow_read_partition
+    loaded = {}
+    reader = threading.Thread(target=lambda: loaded.update(frame=store.load()), name="reader")
+    reader.start()
+    assert first_read.wait(5)
+
+    refresher = threading.Thread(
+        target=store.refresh, args=(lambda since: ads([2, 3], [0, 0]),), kwargs={"today": TODAY}
+    )
+    refresher.start()
+    refresher.join(0.3)
+    # The refresh has swapped the manifest but waits for the reader before deleting anything
+    assert refresher.is_alive()
+
+    resume.set()
+    reader.join(5)
+    refresher.join(5)
+    assert sorted(loaded["frame"]["ad_id"]) == [1, 2, 3]
+    assert sorted(store.load()["ad_id"]) == [1, 2, 3]
+    assert len(partition_files(tmp_path)) == len(store.manifest["partitions"])
+
+
+def test_refresh_survives_missing_and_leftover_files(tmp_path):
+    store = make_store(tmp_path)
+    store.refresh(lambda since: ads([1, 2], [30, 1]), today=TODAY)
+
+    # An interrupted refresh can leave a hot partition deleted and an unreferenced file behind
+    hot_day = (TODAY - timedelta(days=1)).isoformat()
+    os.remove(os.path.join(tmp_path, store.manifest["files"][hot_day]))
+    open(os.path.join(tmp_path, f"status_change_date={hot_day}.123.arrow"), "wb").close()
+
+    assert store.refresh(lambda since: ads([2], [0]), today=TODAY)
+    assert sorted(store.load()["ad_id"]) == [1, 2]
+    assert len(partition_files(tmp_path)) == 2
+
+
+def test_reads_manifest_written_before_generations(tmp_path):
+    store = make_store(tmp_path)
+    store.refresh(lambda since: ads([1, 2], [30, 1]), today=TODAY)
+    manifest = dict(store.manifest)
+    for day, name in manifest.pop("files").items():
+        os.replace(os.path.join(tmp_path, name), os.path.join(tmp_path, f"status_change_date={day}.arrow"))
+    del manifest["generation"]
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    store = make_store(tmp_path)
+    assert sorted(store.load()["ad_id"]) == [1, 2]
+    assert store.refresh(lambda since: ads([2], [0]), today=TODAY)
+    assert sorted(store.load()["ad_id"]) == [1, 2]
+    assert len(partition_files(tmp_path)) == 2
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from ads_fixtures import make_ads
+from ads_store import search_mask, sort_order
+
+
+def naive_search(frame, text, columns):
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in columns:
+        values = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            values = values.dt.strftime("%Y-%m-%d")
+        mask |= values.astype(object).map(lambda value: pd.notna(value) and text.lower() in str(value).lower()).to_numpy(dtype=bool)
+    return mask
+
+
+def test_search_ignores_case_and_matches_like_a_per_row_check():
+    frame = make_ads(rows=500)
+    columns = ["ad_account_id", "error_type", "ad_id"]
+    for text in ("ACT_2", "misleading", "4", "Claims"):
+        assert (search_mask(frame, text, columns) == naive_search(frame, text, columns)).all(), text
+    assert search_mask(frame, "act_2", ["ad_account_id"]).sum() > 0
+
+
+def test_search_never_matches_missing_values():
+    frame = pd.DataFrame({
+        "error_type": pd.Categorical(["SPAM", None, "nan"]),
+        "error_description": ["Bad ad", np.nan, None],
+        "status_change_date": pd.to_datetime(["2025-06-01", None, "2025-06-03"]),
+    })
+    assert search_mask(frame, "nan").tolist() == [False, False, True]
+    assert search_mask(frame, "none").tolist() == [False, False, False]
+    assert search_mask(frame, "nat").tolist() == [False, False, False]
+    assert search_mask(frame, "2025-06-0").tolist() == [True, False, True]
+    assert search_mask(frame, "BAD", ["error_description"]).tolist() == [True, False, False]
+
+
+def test_search_treats_text_literally():
+    frame = pd.DataFrame({"error_description": ["cost (per) result", "cost per result", "a.b"]})
+    assert search_mask(frame, "(per)").tolist() == [True, False, False]
+    assert search_mask(frame, ".").tolist() == [False, False, True]
+
+
+def test_sort_order_is_stable_on_categoricals_with_missing_values_last():
+    frame = pd.DataFrame({
+        "error_type": pd.Categorical(["B", None, "A", "B", "A", None], categories=["B", "A"]),
+        "ad_id": ["1", "2", "3", "4", "5", "6"],
+    }, index=[50, 40, 30, 20, 10, 0])
+    # Categoricals sort in category order; ties keep their row order either way
+    assert sort_order(frame, "error_type").tolist() == [0, 3, 2, 4, 1, 5]
+    assert sort_order(frame, "error_type", ascending=False).tolist() == [2, 4, 0, 3, 1, 5]
+
+
+def test_sort_order_is_a_stable_descending_order_with_missing_values_last():
+    frame = make_ads(rows=500)
+    for column in ("ad_account_id", "status_change_date", "ad_id"):
+        order = sort_order(frame, column, ascending=False)
+        assert sorted(order.tolist()) == list(range(len(frame)))
+        values = frame[column].take(order).reset_index(drop=True)
+        missing = values.isna().to_numpy()
+        n_present = len(values) - missing.sum()
+        assert not missing[:n_present].any() and missing[n_present:].all(), column
+        present = values.iloc[:n_present]
+        if isinstance(present.dtype, pd.CategoricalDtype):
+            present = present.cat.codes
+        keys = present.to_numpy()
+        assert (keys[:-1] >= keys[1:]).all(), column
+        ties = keys[:-1] == keys[1:]
+        assert (order[:n_present][:-1][ties] < order[:n_present][1:][ties]).all(), column
@@ -0,0 +1,56 @@
+import gc
+import weakref
+
+import pandas as pd
+
+from ads_store import SharedDatasetCache
+
+
+def test_prepares_each_source_once():
+    cache = SharedDatasetCache()
+    prepared = []
+
+    def prepare(source):
+        prepared.append(source)
+        return source.assign(doubled=source["value"] * 2)
+
+    source = pd.DataFrame({"value": [1, 2, 3]})
+    first = cache.publish(source, prepare=prepare)
+    assert cache.publish(source, prepare=prepare) is first
+    assert len(prepared) == 1
+    assert first.version == 1
+
+    second = cache.publish(pd.DataFrame({"value": [4]}), prepare=prepare)
+    assert second is not first
+    assert second.version == 2
+    assert len(prepared) == 2
+
+
+def test_does_not_keep_the_source_alive():
+    cache = SharedDatasetCache()
+    source = pd.DataFrame({"value": [1, 2, 3]})
+    dataset = cache.publish(source, prepare=lambda frame: frame.copy())
+    source_ref = weakref.ref(source)
+
+    del source
+    gc.collect()
+    assert source_ref() is None
+    assert cache.current is dataset
+    assert dataset.frame["value"].tolist() == [1, 2, 3]
+
+    # A new source, even one reusing the freed object's id, is prepared again
+    assert cache.publish(pd.DataFrame({"value": [1, 2, 3]}), prepare=lambda frame: frame.copy()).version == 2
+
+
+def test_derived_builds_once_per_dataset():
+    cache = SharedDatasetCache()
+    dataset = cache.publish(pd.DataFrame({"value": [1, 2, 3]}))
+    builds = []
+
+    def build(frame):
+        builds.append(1)
+        return frame["value"].sum()
+
+    assert dataset.derived("total", build) == 6
+    assert dataset.derived("total", build) == 6
+    assert len(builds) == 1
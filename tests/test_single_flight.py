@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ads_store import BackgroundRefresher, DerivedResultCache, SingleFlight, derived_result_key
+
+
+def run_concurrently(function, callers):
+    """Call `function()` from `callers` threads released at the same moment"""
+    barrier = threading.Barrier(callers)
+
+    def call(_):
+        barrier.wait()
+        return function()
+
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        return list(executor.map(call, range(callers)))
+
+
+def test_single_flight_shares_one_run():
+    flights = SingleFlight()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        time.sleep(0.2)
+        return object()
+
+    results = run_concurrently(lambda: flights.do("query", slow), 10)
+    assert len(runs) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.stats["runs"] == 1
+    assert flights.stats["shared"] == 9
+    assert not flights._in_flight
+
+
+def test_single_flight_shares_errors_and_then_retries():
+    flights = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("query failed")
+
+    def call():
+        try:
+            flights.do("query", failing)
+        except ValueError as e:
+            return str(e)
+
+    assert run_concurrently(call, 5) == ["query failed"] * 5
+    assert flights.stats["errors"] == 1
+    assert flights.do("query", lambda: "ok") == "ok"
+
+
+def test_derived_result_cache_builds_concurrent_misses_once():
+    cache = DerivedResultCache(max_entries=2)
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.2)
+        return len(builds)
+
+    key = derived_result_key(1, "overview", ad_account_id="act_1")
+    assert run_concurrently(lambda: cache.get(key, build), 10) == [1] * 10
+    assert len(builds) == 1
+    assert cache.get(key, build) == 1
+
+
+def test_refresher_warm_up_loads_once_for_concurrent_callers():
+    loads = []
+
+    def load(background=False):
+        loads.append(background)
+        time.sleep(0.2)
+        return f"dataset {len(loads)}"
+
+    refresher = BackgroundRefresher(load, ttl=3600, lead=300)
+    assert run_concurrently(refresher.get, 8) == ["dataset 1"] * 8
+    assert loads == [False]
+    assert refresher.warm_up_stats["shared"] == 7
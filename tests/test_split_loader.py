@@ -0,0 +1,101 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from ads_store import SplitAdsLoader, account_buid_map
+
+DIMENSION_QUERIES = {name: name for name in ("accounts", "business_managers", "business_owners")}
+
+
+def make_tables():
+    return {
+        "accounts": pd.DataFrame({"ad_account_id": ["act_1", "act_2", "act_3"], "app_business_manager_id": [10, 20, None]}),
+        "business_managers": pd.DataFrame({"id": [10, 20], "app_business_id": [100, 200]}),
+        "business_owners": pd.DataFrame({"id": [100], "buid": ["5001"]}),
+        "facts": pd.DataFrame({"ad_account_id": ["act_1", "act_2", "act_3", "act_1"], "ad_id": [1, 2, 3, 4]}),
+    }
+
+
+class FakeFetch:
+    def __init__(self, tables, delay=0.0):
+        self.tables = tables
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query, on_chunk=None):
+        with self._lock:
+            self.calls.append(query)
+        time.sleep(self.delay)
+        table = self.tables.get(query)
+        # Like fetch_query under single-flight, every caller gets the same object
+        return table
+
+
+def test_account_buid_map_matches_left_joins():
+    tables = make_tables()
+    account_buids = account_buid_map(tables["accounts"], tables["business_managers"], tables["business_owners"])
+    assert account_buids.get("act_1") == "5001"
+    assert pd.isna(account_buids.get("act_2"))
+    assert pd.isna(account_buids.get("act_3"))
+
+
+def test_load_attaches_buid_without_modifying_the_fetched_frame():
+    tables = make_tables()
+    fetch = FakeFetch(tables)
+    loader = SplitAdsLoader(DIMENSION_QUERIES)
+
+    first = loader.load("facts", fetch)
+    second = loader.load("facts", fetch)
+    assert list(first.columns) == ["buid", "ad_account_id", "ad_id"]
+    assert first["buid"].tolist()[0] == "5001"
+    assert second.equals(first)
+    assert list(tables["facts"].columns) == ["ad_account_id", "ad_id"]
+
+
+def test_concurrent_loads_share_one_dimension_load():
+    fetch = FakeFetch(make_tables(), delay=0.05)
+    loader = SplitAdsLoader(DIMENSION_QUERIES)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: loader.load("facts", fetch), range(8)))
+
+    assert all(result is not None and result["buid"].iloc[0] == "5001" for result in results)
+    assert sorted(query for query in fetch.calls if query != "facts") == sorted(DIMENSION_QUERIES)
+    assert loader.stats["dimension_loads"] == 1
+    assert loader.stats["fact_loads"] == 8
+
+
+def test_unknown_account_reloads_the_map_early():
+    tables = make_tables()
+    fetch = FakeFetch(tables)
+    loader = SplitAdsLoader(DIMENSION_QUERIES)
+    loader.load("facts", fetch)
+
+    tables["accounts"] = pd.concat([tables["accounts"], pd.DataFrame({"ad_account_id": ["act_4"], "app_business_manager_id": [10]})])
+    tables["facts"] = pd.DataFrame({"ad_account_id": ["act_4"], "ad_id": [5]})
+    result = loader.load("facts", fetch)
+
+    assert result["buid"].tolist() == ["5001"]
+    assert loader.stats["early_dimension_loads"] == 1
+    assert loader.stats["dimension_loads"] == 2
+
+
+def test_failed_dimension_reload_keeps_the_previous_map():
+    tables = make_tables()
+    fetch = FakeFetch(tables)
+    loader = SplitAdsLoader(DIMENSION_QUERIES, dimension_ttl=0)
+    loader.load("facts", fetch)
+
+    del tables["business_owners"]
+    result = loader.load("facts", fetch)
+    assert result["buid"].iloc[0] == "5001"
+    assert loader.stats["dimension_failures"] == 1
+
+
+def test_first_load_fails_without_dimensions():
+    tables = make_tables()
+    del tables["accounts"]
+    assert SplitAdsLoader(DIMENSION_QUERIES).load("facts", FakeFetch(tables)) is None